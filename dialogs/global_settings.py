@@ -83,6 +83,8 @@ class GlobalSettingsDialog(QtWidgets.QDialog):
     cross_section = bnd.bind("cross_section_radios")
  
     save_window_geometries = bnd.bind("window_geom_chkbox")
+    tofe_list_in_process = bnd.bind("tofe_list_in_process_chkbox")
+    espe_in_process = bnd.bind("espe_in_process_chkbox")
 
     settings_updated = QtCore.pyqtSignal(GlobalSettings)
 
@@ -173,6 +175,8 @@ class GlobalSettingsDialog(QtWidgets.QDialog):
         self.comp_y = self.settings.get_tofe_compression_y()
 
         self.depth_iters = self.settings.get_num_iterations()
+        self.tofe_list_in_process = self.settings.is_tofe_list_in_process()
+        self.espe_in_process = self.settings.is_espe_in_process()
 
         self.presim_ions = self.settings.get_min_presim_ions()
         self.sim_ions = self.settings.get_min_simulation_ions()
@@ -245,6 +249,8 @@ class GlobalSettingsDialog(QtWidgets.QDialog):
         self.settings.set_tofe_compression_x(self.comp_x)
         self.settings.set_tofe_compression_y(self.comp_y)
         self.settings.set_num_iterations(self.depth_iters)
+        self.settings.set_tofe_list_in_process(self.tofe_list_in_process)
+        self.settings.set_espe_in_process(self.espe_in_process)
         self.settings.set_min_presim_ions(self.presim_ions)
         self.settings.set_min_simulation_ions(self.sim_ions)
         self.settings.set_ion_division(self.ion_division)
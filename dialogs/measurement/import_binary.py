@@ -34,6 +34,7 @@ import struct
 import dialogs.dialog_functions as df
 import widgets.gui_utils as gutils
 import dialogs.file_dialogs as fdialogs
+import modules.event_store as event_store
 
 from widgets.gui_utils import StatusBarHandler
 from widgets.icon_manager import IconManager
@@ -129,6 +130,7 @@ class ImportDialogBinary(QtWidgets.QDialog):
             output_file = df.import_new_measurement(
                 self.request, self.parent, item)
             self.__convert_file(input_file, output_file)
+            event_store.remove_cache_file(output_file)
 
             sbh.reporter.report(10 + (i + 1 / root_child_count) * 90)
 
@@ -32,6 +32,7 @@ import re
 
 import dialogs.dialog_functions as df
 import modules.general_functions as gf
+import modules.event_store as event_store
 import widgets.gui_utils as gutils
 
 from collections import OrderedDict
@@ -184,6 +185,7 @@ class ImportMeasurementsDialog(QtWidgets.QDialog):
                      timing=timing,
                      columns=columns,
                      nevents=self.spin_eventcount.value())
+            event_store.remove_cache_file(output_file)
 
             sbh.reporter.report(10 + (i + 1) / root_child_count * 90)
 
@@ -365,6 +365,9 @@ class OptimizationDialog(QtWidgets.QDialog, PropertySavingWidget,
 
         self.close()
 
+        in_process_espe = \
+            elem_sim.request.global_settings.is_espe_in_process()
+
         # TODO move following code to the result widget
         if self.current_method == OptimizationMethod.NSGAII:
             if self.current_mode == OptimizationType.RECOIL:
@@ -378,7 +381,8 @@ class OptimizationDialog(QtWidgets.QDialog, PropertySavingWidget,
                 element_simulation=elem_sim, measurement=measurement,
                 cut_file=cut, ch=self.ch, **params,
                 use_efficiency=self.use_efficiency,
-                optimize_by_area=optimize_by_area, verbose=self.verbose)
+                optimize_by_area=optimize_by_area, verbose=self.verbose,
+                in_process_espe=in_process_espe)
         else:
             if self.current_mode == OptimizationType.RECOIL:
                 params = self.linear_recoil_widget.get_properties()
@@ -388,7 +392,8 @@ class OptimizationDialog(QtWidgets.QDialog, PropertySavingWidget,
             optimizer = LinearOptimization(
                 element_simulation=elem_sim, measurement=measurement,
                 cut_file=cut, ch=self.ch, **params,
-                use_efficiency=self.use_efficiency, verbose=self.verbose)
+                use_efficiency=self.use_efficiency, verbose=self.verbose,
+                in_process_espe=in_process_espe)
 
         # Optimization running thread
         ct = CancellationToken()
@@ -27,7 +27,27 @@ multithreaded or multiprocessing operations.
 __author__ = "Juhani Sundell"
 __version__ = "2.0"
 
+import heapq
+import itertools
+import os
+import platform
+import subprocess
 import sys
+import threading
+
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import wait
+from concurrent.futures import FIRST_EXCEPTION
+from typing import Callable
+from typing import Iterable
+from typing import List
+from typing import Optional
+from typing import TypeVar
+
+from .observing import ProgressReporter
+
+T = TypeVar("T")
+R = TypeVar("R")
 
 
 class CancellationToken:
@@ -69,3 +89,260 @@ class CancellationToken:
         """
         if self.is_cancellation_requested():
             other.request_cancellation()
+
+
+def run_in_threads(
+        func: Callable[[T, Optional[ProgressReporter]], R],
+        items: Iterable[T],
+        progress: Optional[ProgressReporter] = None,
+        cancellation_token: Optional[CancellationToken] = None,
+        max_workers: Optional[int] = None,
+        poll_interval: float = 0.1) -> List[Optional[R]]:
+    """Calls func for each item in a thread pool and returns the results in
+    the same order as the items.
+
+    Each call is given a ProgressReporter of its own. Progress of the calls is
+    collected and reported through the given progress reporter as an average
+    of all items. Aggregated progress is always reported from the calling
+    thread so progress reporters that update the GUI can be used.
+
+    Items that have not been started when cancellation is requested are
+    skipped and their result is None. If any of the calls raises an
+    exception, remaining items are skipped and the exception is raised
+    once the running calls have finished.
+
+    Args:
+        func: function that takes an item and a ProgressReporter (or None)
+            as its parameters.
+        items: items to process.
+        progress: ProgressReporter for the whole operation.
+        cancellation_token: token that is checked before each call.
+        max_workers: maximum number of threads. Defaults to the number of
+            CPUs.
+        poll_interval: how often (in seconds) the calling thread reports
+            progress.
+
+    Return:
+        list of results.
+    """
+    items = list(items)
+    if not items:
+        if progress is not None:
+            progress.report(100)
+        return []
+
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    max_workers = max(1, min(max_workers, len(items)))
+
+    if cancellation_token is None:
+        cancellation_token = CancellationToken()
+    error_token = CancellationToken()
+
+    item_progress = [0.0] * len(items)
+    lock = threading.Lock()
+
+    def set_progress(index: int, value: float) -> float:
+        with lock:
+            item_progress[index] = value
+        return value
+
+    def run(index: int, item: T) -> Optional[R]:
+        if cancellation_token.is_cancellation_requested() or \
+                error_token.is_cancellation_requested():
+            return None
+        if progress is not None:
+            sub_progress = ProgressReporter(
+                lambda x: set_progress(index, x))
+        else:
+            sub_progress = None
+        try:
+            return func(item, sub_progress)
+        except BaseException:
+            error_token.request_cancellation()
+            raise
+        finally:
+            set_progress(index, 100)
+
+    def report_progress():
+        if progress is not None:
+            with lock:
+                value = sum(item_progress) / len(item_progress)
+            progress.report(value)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [
+            executor.submit(run, i, item) for i, item in enumerate(items)
+        ]
+        not_done = futures
+        while not_done:
+            _, not_done = wait(
+                not_done, timeout=poll_interval, return_when=FIRST_EXCEPTION)
+            report_progress()
+
+    results = [future.result() for future in futures]
+    if progress is not None:
+        progress.report(100)
+    return results
+
+
+def get_physical_core_count() -> int:
+    """Returns the number of physical CPU cores. Returns the number of
+    logical CPUs if the number of physical cores cannot be determined.
+    """
+    logical_count = os.cpu_count() or 1
+    system = platform.system()
+    if system == "Linux":
+        cores = set()
+        physical_id, core_id = None, None
+        try:
+            with open("/proc/cpuinfo") as cpuinfo:
+                for line in cpuinfo:
+                    key, _, value = line.partition(":")
+                    key = key.strip()
+                    if key == "physical id":
+                        physical_id = value.strip()
+                    elif key == "core id":
+                        core_id = value.strip()
+                    elif not line.strip():
+                        # Processors are separated by empty lines
+                        if core_id is not None:
+                            cores.add((physical_id, core_id))
+                        physical_id, core_id = None, None
+        except OSError:
+            return logical_count
+        if core_id is not None:
+            cores.add((physical_id, core_id))
+        count = len(cores)
+    elif system == "Darwin":
+        try:
+            count = int(subprocess.run(
+                ("sysctl", "-n", "hw.physicalcpu"), capture_output=True,
+                text=True, check=True).stdout)
+        except (OSError, ValueError, subprocess.SubprocessError):
+            return logical_count
+    else:
+        return logical_count
+    if count < 1:
+        return logical_count
+    return min(count, logical_count)
+
+
+class JobSlot:
+    """Slot that a job holds in a JobScheduler while it is running.
+    """
+
+    def __init__(self, scheduler: "JobScheduler"):
+        """Initializes a new JobSlot.
+
+        Args:
+            scheduler: JobScheduler that the slot belongs to
+        """
+        self._scheduler = scheduler
+        self._released = False
+        self._lock = threading.Lock()
+
+    def release(self):
+        """Releases the slot so that the next job can start. Calling this
+        more than once has no effect.
+        """
+        with self._lock:
+            if self._released:
+                return
+            self._released = True
+        self._scheduler._release()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.release()
+
+
+class JobScheduler:
+    """Limits the number of jobs, such as MCERD processes, that run at the
+    same time.
+
+    Jobs wait for a slot in a priority queue. Jobs with smaller priority
+    values are started first, and jobs with the same priority are started
+    in the order they were queued.
+    """
+
+    def __init__(self, max_jobs: Optional[int] = None):
+        """Initializes a new JobScheduler.
+
+        Args:
+            max_jobs: maximum number of jobs that run at the same time.
+                Defaults to the number of physical CPU cores.
+        """
+        self._max_jobs = max_jobs or get_physical_core_count()
+        self._condition = threading.Condition()
+        self._queue = []
+        self._counter = itertools.count()
+        self._running_count = 0
+
+    @property
+    def max_jobs(self) -> int:
+        """Maximum number of jobs that run at the same time.
+        """
+        return self._max_jobs
+
+    @max_jobs.setter
+    def max_jobs(self, value: int):
+        with self._condition:
+            self._max_jobs = max(1, value)
+            self._condition.notify_all()
+
+    @property
+    def running_count(self) -> int:
+        """Number of jobs that hold a slot.
+        """
+        with self._condition:
+            return self._running_count
+
+    @property
+    def waiting_count(self) -> int:
+        """Number of jobs that are waiting for a slot.
+        """
+        with self._condition:
+            return len(self._queue)
+
+    def acquire(self, priority: int = 0,
+                cancellation_token: Optional[CancellationToken] = None,
+                poll_interval: float = 0.2) -> Optional[JobSlot]:
+        """Waits until the job can start and returns its slot.
+
+        Args:
+            priority: priority of the job. Smaller values start first.
+            cancellation_token: token that is checked while waiting
+            poll_interval: how often (in seconds) the cancellation token is
+                checked
+
+        Return:
+            JobSlot that must be released when the job finishes, or None if
+            cancellation was requested before the job could start.
+        """
+        entry = (priority, next(self._counter))
+        with self._condition:
+            heapq.heappush(self._queue, entry)
+            while self._running_count >= self._max_jobs or \
+                    self._queue[0] != entry:
+                if cancellation_token is not None and \
+                        cancellation_token.is_cancellation_requested():
+                    self._queue.remove(entry)
+                    heapq.heapify(self._queue)
+                    # Next job in the queue may be able to start now
+                    self._condition.notify_all()
+                    return None
+                self._condition.wait(poll_interval)
+            heapq.heappop(self._queue)
+            self._running_count += 1
+            self._condition.notify_all()
+        return JobSlot(self)
+
+    def _release(self):
+        """Frees a slot. Called by JobSlot.release.
+        """
+        with self._condition:
+            self._running_count -= 1
+            self._condition.notify_all()
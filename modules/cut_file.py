@@ -31,11 +31,14 @@ __version__ = "2.0"
 
 import itertools
 
+import numpy as np
+
 from pathlib import Path
 from typing import List
 from typing import Dict
 from typing import Optional
 from typing import Any
+from typing import Union
 
 from .element import Element
 from . import file_paths as fp
@@ -77,12 +80,13 @@ class CutFile:
         if cut_file_path is not None:
             self.load_file(cut_file_path)
     
-    def set_info(self, selection, data: List[Any]):
+    def set_info(self, selection, data: Union[List[Any], np.ndarray]):
         """Set selection information and data into CutFile.
         
         Args:
             selection: Selection class object.
-            data: Lists of data points.
+            data: Lists of data points or a two dimensional array of event
+                rows (see EventStore.rows).
         """
         self.data = data
         self.element = selection.element
@@ -143,7 +147,48 @@ class CutFile:
                 else:
                     self.data.append([int(i) for i in line.split()])
     
-    def save(self, element_count=0):
+    def get_file_path(self, element_count=0) -> Optional[Path]:
+        """Returns the path of the cut file for given element count.
+
+        Args:
+            element_count: Integer representing which selection was used of
+                total count of same element and isotope selection.
+
+        Return:
+            path to the cut file or None if the cut file has no element or
+            directory.
+        """
+        if not self.element or not self.directory:
+            return None
+        measurement_name, element, suffix = self.__get_name_parts()
+        if self.is_elem_loss:
+            return Path(
+                self.directory,
+                "{0}.{1}.{2}.{3}.{4}.cut".format(
+                    measurement_name, element, suffix, element_count,
+                    self.split_number))
+        return Path(
+            self.directory,
+            f"{measurement_name}.{element}.{suffix}.{element_count}.cut")
+
+    def __get_name_parts(self):
+        """Returns the measurement name, element and type suffix that are
+        used in the cut file name.
+        """
+        measurement_name_with_prefix = self.directory.parents[1]
+        # First "-" is in sample name, second in measurement name
+        # NOT IF THERE ARE - IN NAME PART!!
+        name_with_number = measurement_name_with_prefix.name.split(
+            "Measurement_")[1]
+        measurement_name = name_with_number.split('-', 1)[1]
+        element = str(self.element)
+        if self.type == "RBS":
+            suffix = f"RBS_{self.element_scatter}"
+        else:
+            suffix = "ERD"
+        return measurement_name, element, suffix
+
+    def save(self, element_count=0, overwrite=False):
         """Save cut file_path.
         
         Saves data points into cut file_path with meta information.
@@ -153,31 +198,17 @@ class CutFile:
             total count of same element and isotope selection. This is so
             that we do not overwrite first 2H selection with other
             2H selection.
+            overwrite: whether to overwrite the file given by element_count
+                (see get_file_path) instead of finding the next available
+                file name.
         """
-        element = self.element
-        if element and self.directory and self.data:
-            measurement_name_with_prefix = self.directory.parents[1]
-            # First "-" is in sample name, second in measurement name
-            # NOT IF THERE ARE - IN NAME PART!!
-            name_with_number = measurement_name_with_prefix.name.split(
-                "Measurement_")[1]
-            measurement_name = name_with_number.split('-', 1)[1]
-            if element != "":
-                element = str(element)
-            if self.type == "RBS":
-                suffix = f"RBS_{self.element_scatter}"
-            else:
-                suffix = "ERD"
-
+        if self.element and self.directory and len(self.data):
             self.directory.mkdir(exist_ok=True, parents=True)
 
-            if self.is_elem_loss:
-                file = Path(
-                    self.directory,
-                    "{0}.{1}.{2}.{3}.{4}.cut".format(
-                        measurement_name, element, suffix, element_count,
-                        self.split_number))
+            if self.is_elem_loss or overwrite:
+                file = self.get_file_path(element_count)
             else:
+                measurement_name, element, suffix = self.__get_name_parts()
                 file = self._find_available_cut_file_name(
                     measurement_name, element, suffix, element_count)
             if self.element_scatter != "":
@@ -195,9 +226,12 @@ class CutFile:
                 my_file.write(f"Split count: {self.split_count}\n")
                 my_file.write("\n")
                 my_file.write("ToF, Energy, Event number\n")
-                for p in self.data:  # Write all points
-                    my_file.write(" ".join(map(str, p)))
-                    my_file.write("\n")
+                if isinstance(self.data, np.ndarray):
+                    np.savetxt(my_file, self.data, fmt="%d")
+                else:
+                    for p in self.data:  # Write all points
+                        my_file.write(" ".join(map(str, p)))
+                        my_file.write("\n")
          
     def split(self, reference_cut, splits=10, save=True):
         """Splits cut file into X splits based on reference cut.
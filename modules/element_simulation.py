@@ -23,7 +23,6 @@ __author__ = "Severi Jääskeläinen \n Samuel Kaiponen \n Heta Rekilä \n" \
              "Sinikka Siironen \n Juhani Sundell \n Tuomas Pitkänen"
 __version__ = "2.0"
 
-import functools
 import itertools
 import json
 import os
@@ -31,6 +30,7 @@ import time
 from collections import deque
 from pathlib import Path
 from threading import Event
+from threading import Lock
 from typing import Any
 from typing import Dict
 from typing import Iterable
@@ -49,13 +49,18 @@ from .base import AdjustableSettings
 from .base import MCERDParameterContainer
 from .base import Serializable
 from .concurrency import CancellationToken
+from .concurrency import JobScheduler
 from .detector import Detector
 from .element import Element
 from .enums import IonDivision
+from .enums import JobPriority
 from .enums import OptimizationType
 from .enums import SimulationMode
 from .enums import SimulationState
 from .enums import SimulationType
+from .espe_engine import EspeEngine
+from .espe_engine import SpectrumAccumulator
+from .espe_engine import get_distribution
 from .get_espe import GetEspe
 from .mcerd import MCERD
 from .observing import Observable
@@ -774,7 +779,8 @@ class ElementSimulation(Observable, Serializable, AdjustableSettings,
               use_old_erd_files=True, optimization_type=None,
               ion_division=IonDivision.NONE,
               ct: Optional[CancellationToken] = None,
-              start_interval=1, status_check_interval=1,
+              start_interval=0, status_check_interval=1,
+              priority: Optional[JobPriority] = None,
               **kwargs) -> Optional[rx.Observable]:
         """
         Start the simulation.
@@ -788,10 +794,13 @@ class ElementSimulation(Observable, Serializable, AdjustableSettings,
                 divided per process
             ct: CancellationToken that can be used to stop
                 the start process
-            start_interval: seconds between the start of each simulation
-                (ensures that MCERD's startup files are not being
-                overwritten by later processes)
+            start_interval: seconds between the start of each simulation.
+                Processes write their files into separate working
+                directories, so they can be started at the same time.
             status_check_interval: seconds between each observed atoms count.
+            priority: priority of the MCERD processes in the scheduler of
+                the request. Defaults to OPTIMIZATION for optimizations and
+                SIMULATION otherwise.
             kwargs: keyword arguments passed down to MCERD's run method
         Return:
             observable stream
@@ -827,6 +836,12 @@ class ElementSimulation(Observable, Serializable, AdjustableSettings,
         if number_of_processes < 1:
             number_of_processes = 1
 
+        # No process of the recoil is running, so working directories that
+        # are left in the simulation directory are from a run that crashed.
+        MCERD.remove_stale_work_dirs(
+            self.directory, recoil,
+            optimize_fluence=optimization_type is OptimizationType.FLUENCE)
+
         # Update ion counts depending on the ion_division mode
         presim_ions, sim_ions = ion_division.get_ion_counts(
             settings["number_of_ions_in_presimu"], settings["number_of_ions"],
@@ -845,11 +860,20 @@ class ElementSimulation(Observable, Serializable, AdjustableSettings,
         if ct is None:
             ct = CancellationToken()
 
+        if priority is None:
+            if optimization_type is None:
+                priority = JobPriority.SIMULATION
+            else:
+                priority = JobPriority.OPTIMIZATION
+
         self._cts.add(ct)
 
-        # New MCERD process is started every second until number of
+        # New MCERD process is started every start_interval until number of
         # processes is reached or cancellation has been requested.
-        # Seed is incremented for each new process.
+        # Seed is incremented for each new process. Processes wait for a
+        # free slot in the scheduler of the request before they start, so
+        # the next process is queued only after the previous one has
+        # started.
         return rx.timer(0, start_interval).pipe(
             ops.take_while(
                 lambda _: not ct.is_cancellation_requested()),
@@ -857,7 +881,7 @@ class ElementSimulation(Observable, Serializable, AdjustableSettings,
             ops.scan(lambda acc, _: acc + 1, seed=seed_number - 1),
             ops.map(lambda next_seed: self._start(
                 recoil, next_seed, optimization_type, dict(settings),
-                ct, **kwargs)),
+                ct, priority, **kwargs)),
             ops.flat_map(lambda x: x),
             ops.scan(lambda acc, x: {
                 **x,
@@ -885,9 +909,44 @@ class ElementSimulation(Observable, Serializable, AdjustableSettings,
         )
 
     def _start(self, recoil, seed_number, optimization_type, settings, ct,
-               **kwargs) -> rx.Observable:
-        """Inner method that creates an MCERD instance and runs it.
-        Returns an observable stream of MCERD output.
+               priority=JobPriority.SIMULATION, **kwargs) -> rx.Observable:
+        """Inner method that waits for a slot in the MCERD scheduler,
+        creates an MCERD instance and runs it. Returns an observable stream
+        of MCERD output, or an empty stream if cancellation was requested
+        before the process could start.
+        """
+        slot = self.get_mcerd_scheduler().acquire(priority, ct)
+        if slot is None:
+            return rx.empty()
+        try:
+            observable = self._run_mcerd(
+                recoil, seed_number, optimization_type, settings, ct,
+                niceness=priority.get_niceness(), **kwargs)
+        except BaseException:
+            slot.release()
+            raise
+
+        def release_if_not_running(x):
+            if not x[MCERD.IS_RUNNING]:
+                slot.release()
+
+        return observable.pipe(
+            ops.do_action(
+                on_next=release_if_not_running,
+                on_error=lambda _: slot.release(),
+                on_completed=slot.release),
+            ops.finally_action(slot.release)
+        )
+
+    def get_mcerd_scheduler(self) -> JobScheduler:
+        """Returns the scheduler that limits the number of MCERD processes
+        running at the same time.
+        """
+        return self.request.mcerd_scheduler
+
+    def _run_mcerd(self, recoil, seed_number, optimization_type, settings,
+                   ct, **kwargs) -> rx.Observable:
+        """Creates an MCERD instance and runs it.
         """
         new_erd_file = fp.get_erd_file_name(
             recoil, seed_number, optim_mode=optimization_type)
@@ -906,7 +965,7 @@ class ElementSimulation(Observable, Serializable, AdjustableSettings,
             seed_number, settings, self.get_full_name(),
             optimize_fluence=optimization_type is OptimizationType.FLUENCE)
 
-        return mcerd.run(ct=ct, **kwargs)
+        return mcerd.run(ct=ct, logger=self.simulation, **kwargs)
 
     def _set_flags(self, b: bool, optim_mode=None):
         """Sets the boolean flags that indicate the state of
@@ -1054,7 +1113,8 @@ class ElementSimulation(Observable, Serializable, AdjustableSettings,
             fluence: Optional[float] = None,
             optimization_type: Optional[OptimizationType] = None,
             write_to_file: bool = True,
-            remove_recoil_file: bool = False) -> Tuple[List, Optional[Path]]:
+            remove_recoil_file: bool = False,
+            recoil_dir: Optional[Path] = None) -> Tuple[List, Optional[Path]]:
         """Calculate the energy spectrum from the MCERD result file.
 
         Args:
@@ -1066,17 +1126,14 @@ class ElementSimulation(Observable, Serializable, AdjustableSettings,
             write_to_file: Whether spectrum is written to file
             remove_recoil_file: Whether to remove temporary .recoil file
                 after getting the energy spectrum.
+            recoil_dir: Directory where the temporary .recoil file is
+                written. Defaults to the directory of the simulation.
 
         Return:
             tuple consisting of spectrum data and espe file
         """
         suffix = self.simulation_type.get_recoil_suffix()
 
-        if optimization_type is OptimizationType.RECOIL:
-            recoil = self.optimization_recoils[0]
-        else:
-            recoil = self.get_main_recoil()
-
         if optimization_type is OptimizationType.FLUENCE:
             output_file = f"{recoil_element.prefix}-optfl.simu"
             recoil_file = f"{recoil_element.prefix}-optfl.{suffix}"
@@ -1084,15 +1141,13 @@ class ElementSimulation(Observable, Serializable, AdjustableSettings,
             output_file = f"{recoil_element.get_full_name()}.simu"
             recoil_file = f"{recoil_element.get_full_name()}.{suffix}"
 
-        erd_file = Path(
-            self.directory,
-            fp.get_erd_file_name(recoil, "*", optim_mode=optimization_type))
+        erd_file = self.get_espe_erd_file_pattern(optimization_type)
 
         if write_to_file:
             output_file = Path(self.directory, output_file)
         else:
             output_file = None
-        recoil_file = Path(self.directory, recoil_file)
+        recoil_file = Path(recoil_dir or self.directory, recoil_file)
 
         with recoil_file.open("w") as rec_file:
             rec_file.write("\n".join(recoil_element.get_mcerd_params()))
@@ -1126,6 +1181,75 @@ class ElementSimulation(Observable, Serializable, AdjustableSettings,
         #   False
         return spectrum, output_file
 
+    def get_espe_erd_file_pattern(
+            self, optimization_type: Optional[OptimizationType] = None) \
+            -> Path:
+        """Returns the glob pattern of the ERD files that energy spectra
+        are calculated from.
+        """
+        if optimization_type is OptimizationType.RECOIL:
+            recoil = self.optimization_recoils[0]
+        else:
+            recoil = self.get_main_recoil()
+        return Path(
+            self.directory,
+            fp.get_erd_file_name(recoil, "*", optim_mode=optimization_type))
+
+    def get_espe_engine(
+            self,
+            recoil_element: RecoilElement,
+            ch: Optional[float] = None,
+            optimization_type: Optional[OptimizationType] = None) \
+            -> EspeEngine:
+        """Returns an EspeEngine that calculates energy spectra from the
+        current ERD files in-process. The engine is calibrated with a
+        spectrum that get_espe calculates for the given recoil element.
+
+        Args:
+            recoil_element: recoil element used for calibration. Its
+                distribution must cover the depths of the simulated events.
+            ch: Channel width to use.
+            optimization_type: Either recoil, fluence or None
+
+        Return:
+            EspeEngine
+        """
+        ch = ch or self.channel_width
+        _, run, detector = self.get_mcerd_params()
+        pattern = self.get_espe_erd_file_pattern(optimization_type)
+        erd_files = sorted(pattern.parent.glob(pattern.name))
+        engine = EspeEngine.from_erd_files(
+            erd_files, detector, ch, fluence=run.fluence)
+        espe, _ = self.calculate_espe(
+            recoil_element, ch=ch, optimization_type=optimization_type,
+            write_to_file=False)
+        engine.calibrate(*get_distribution(recoil_element), espe)
+        return engine
+
+    def get_spectrum_accumulator(
+            self,
+            recoil_element: RecoilElement,
+            ch: Optional[float] = None,
+            optimization_type: Optional[OptimizationType] = None) \
+            -> SpectrumAccumulator:
+        """Returns a SpectrumAccumulator that calculates the spectrum of the
+        given recoil element from the ERD files while they are being
+        written. The accumulator is not calibrated.
+
+        Args:
+            recoil_element: recoil element whose distribution is used
+            ch: Channel width to use.
+            optimization_type: Either recoil, fluence or None
+
+        Return:
+            SpectrumAccumulator
+        """
+        ch = ch or self.channel_width
+        _, _, detector = self.get_mcerd_params()
+        return SpectrumAccumulator(
+            self.get_espe_erd_file_pattern(optimization_type), detector, ch,
+            *get_distribution(recoil_element))
+
     def get_mcerd_params(self) -> Tuple[Dict, Run, Detector]:
         """Returns the parameters for MCERD simulations.
         """
@@ -1241,6 +1365,72 @@ class ElementSimulation(Observable, Serializable, AdjustableSettings,
         self.on_completed(self.get_current_status())
 
 
+class _LineCounter:
+    """Counts the lines of a file that is being appended to. Each count only
+    reads the bytes that have been appended since the previous count.
+    """
+    __slots__ = "file", "_lock", "_file_id", "_offset", "_newlines", \
+        "_partial_line", "_counted"
+
+    _CHUNK_SIZE = 2 ** 20
+
+    def __init__(self, file: Path):
+        """Initializes a new _LineCounter.
+
+        Args:
+            file: path to the file
+        """
+        self.file = file
+        self._lock = Lock()
+        self._counted = False
+        self._reset()
+
+    def _reset(self, file_id=None):
+        self._file_id = file_id
+        self._offset = 0
+        self._newlines = 0
+        self._partial_line = False
+
+    def _get_count(self) -> int:
+        return self._newlines + int(self._partial_line)
+
+    def count(self) -> int:
+        """Returns the number of lines in the file, or 0 if the file does
+        not exist. The last line is counted even if it does not end in a
+        newline. If the file has been replaced or truncated since the
+        previous count, it is counted from the start.
+        """
+        with self._lock:
+            self._counted = True
+            try:
+                with open(self.file, "rb") as file:
+                    stat = os.fstat(file.fileno())
+                    file_id = stat.st_dev, stat.st_ino
+                    if file_id != self._file_id or \
+                            stat.st_size < self._offset:
+                        self._reset(file_id)
+                    file.seek(self._offset)
+                    while True:
+                        chunk = file.read(self._CHUNK_SIZE)
+                        if not chunk:
+                            break
+                        self._offset += len(chunk)
+                        self._newlines += chunk.count(b"\n")
+                        self._partial_line = not chunk.endswith(b"\n")
+            except FileNotFoundError:
+                self._reset()
+            return self._get_count()
+
+    def get_cached_count(self) -> int:
+        """Returns the number of lines from the previous count. The file is
+        only counted if it has not been counted before.
+        """
+        with self._lock:
+            if self._counted:
+                return self._get_count()
+        return self.count()
+
+
 class ERDFileHandler:
     """Helper class to handle ERD files that belong to the ElementSimulation
     Handles counting atoms and getting seeds.
@@ -1256,6 +1446,7 @@ class ERDFileHandler:
         """
         self.recoil_element = recoil_element
         self.__active_files = {}
+        self.__line_counters = {}
 
         self.__old_files = {
             file: seed
@@ -1329,15 +1520,16 @@ class ERDFileHandler:
         return max((seed for _, seed, _ in self), default=None)
 
     def get_active_atom_count(self) -> int:
-        """Returns the number of atoms in currently active .erd files.
+        """Returns the number of atoms in currently active .erd files. Only
+        the lines that have been appended since the previous count are read.
         """
-        return sum(self.__get_atom_count(file)
+        return sum(self.__get_line_counter(file).count()
                    for file in self.__active_files)
 
     def get_old_atom_count(self) -> int:
         """Returns the number of atoms in already simulated .erd files.
         """
-        return sum(self.__get_atom_count_cached(file)
+        return sum(self.__get_line_counter(file).get_cached_count()
                    for file in self.__old_files)
 
     def get_total_atom_count(self) -> int:
@@ -1345,18 +1537,17 @@ class ERDFileHandler:
         """
         return self.get_active_atom_count() + self.get_old_atom_count()
 
-    @staticmethod
-    def __get_atom_count(erd_file: Path):
-        """Returns the number of counted atoms in given ERD file.
+    def __get_line_counter(self, erd_file: Path) -> _LineCounter:
+        """Returns the line counter of the given ERD file.
         """
-        return gf.count_lines_in_file(erd_file, check_file_exists=True)
-
-    @functools.lru_cache(128)
-    def __get_atom_count_cached(self, erd_file: Path):
-        """Cached version of the atom counter. If the atoms in the
-        ERD file have already been counted, a cached result is returned.
-        """
-        return self.__get_atom_count(erd_file)
+        counter = self.__line_counters.get(erd_file)
+        if counter is None:
+            counter = _LineCounter(erd_file)
+            self.__line_counters = {
+                **self.__line_counters,
+                erd_file: counter
+            }
+        return counter
 
     def update(self):
         """Moves all files from active file collection to already simulated
@@ -1364,18 +1555,23 @@ class ERDFileHandler:
         """
         # TODO check if the name of the RecoilElement has changed and update
         #   file references if necessary
+        active_files = self.__active_files
         self.__old_files = {
             **self.__old_files,
-            **self.__active_files
+            **active_files
         }
         self.__active_files = {}
+        # Count the lines that were written after the previous count, so that
+        # the cached counts of old files are up to date.
+        for file in active_files:
+            self.__get_line_counter(file).count()
 
     def clear(self):
         """Removes existing ERD files from handler.
         """
         self.__active_files = {}
         self.__old_files = {}
-        self.__get_atom_count_cached.cache_clear()
+        self.__line_counters = {}
 
     def results_exist(self) -> bool:
         """Returns True if ERD files exist.
@@ -40,16 +40,27 @@ import numpy as np
 
 from . import general_functions as gf
 from . import subprocess_utils as sutils
+from . import tofe_list as tl
 from .base import Espe
+from .concurrency import run_in_threads
 from .element import Element
 from .enums import SumSpectrumType
 from .measurement import Measurement
 from .observing import ProgressReporter
 from .parsing import ToFListParser
+from .spectrum_cache import CACHE_DIR_NAME
+from .spectrum_cache import SpectrumCache
 from .ui_log_handlers import Logger
 
 TofListData = List[Tuple[float, float, float, int, float, str, float, int]]
 
+# tofe_list data is cached as a structured array. The type column is stored
+# as a fixed length string as object columns cannot be saved without pickling.
+_TOFE_LIST_CACHE_DTYPE = np.dtype([
+    (name, "U16" if name == "type" else dtype)
+    for name, (dtype, _) in tl.TOFE_LIST_DTYPE.fields.items()
+])
+
 
 # TODO rename and refactor functions
 
@@ -81,6 +92,8 @@ class EnergySpectrum:
         self._cut_files = cut_files
         self._spectrum_width = spectrum_width
         self._directory_es = measurement.get_energy_spectra_dir()
+        self._cache = SpectrumCache(self._directory_es / CACHE_DIR_NAME)
+        self._input_keys: Dict[str, Optional[str]] = {}
         self._tofe_listed_files = self._load_cuts(
             no_foil=no_foil, progress=progress, verbose=verbose)
 
@@ -132,18 +145,27 @@ class EnergySpectrum:
         """
         return EnergySpectrum._calculate_spectrum(
             self._tofe_listed_files, self._spectrum_width, self._measurement,
-            self._directory_es, use_efficiency=use_efficiency, no_foil=no_foil)
+            self._directory_es, use_efficiency=use_efficiency, no_foil=no_foil,
+            cache=self._cache, input_keys=self._input_keys)
 
     def _load_cuts(
             self,
             no_foil: bool = False,
             progress: Optional[ProgressReporter] = None,
-            verbose: bool = True) -> Dict[str, TofListData]:
+            verbose: bool = True,
+            max_workers: Optional[int] = None) \
+            -> Dict[str, Union[TofListData, np.ndarray]]:
         """Loads cut files through tofe_list into list.
 
+        Results are cached by the contents of the cut file, tof.in and
+        efficiency files. Cached results are returned as structured arrays.
+
         Args:
             no_foil: whether foil thickness is set to 0 when running tofe_list
             progress: ProgressReporter object
+            verbose: whether tofe_list's stderr is printed to console
+            max_workers: maximum number of tofe_list processes that are run
+                at the same time. Defaults to the number of CPUs.
 
         Return:
             Returns list of cut files' tofe_list results.
@@ -156,11 +178,10 @@ class EnergySpectrum:
             else:
                 directory = None
 
-            count = len(self._cut_files)
-
             self._directory_es.mkdir(exist_ok=True)
 
-            for i, cut_file in enumerate(self._cut_files):
+            keys = []
+            for cut_file in self._cut_files:
                 # TODO move cut file handling to cut_file module
                 filename_split = cut_file.name.split('.')
                 element = Element.from_string(filename_split[1])
@@ -169,15 +190,46 @@ class EnergySpectrum:
                     raise ValueError(
                         f"Could not parse cut file name: {cut_file}")
 
-                key = ".".join([str(element), *filename_split[2:-1]])
+                keys.append(".".join([str(element), *filename_split[2:-1]]))
 
-                cut_dict[key] = EnergySpectrum.tofe_list(
+            in_process = self._global_settings.is_tofe_list_in_process()
+
+            def run_tofe_list(cut_file, _):
+                input_key = EnergySpectrum._get_input_key(
+                    cut_file, tof_in, in_process)
+                if input_key is not None:
+                    cached = self._cache.get(input_key, mmap=True)
+                    if cached is not None:
+                        if directory is not None:
+                            EnergySpectrum._write_tofe_list_file(
+                                cached, directory, cut_file, no_foil)
+                        return input_key, cached
+
+                tofe_list_data = EnergySpectrum.tofe_list(
                     cut_file, directory, no_foil=no_foil,
                     logger=self._measurement,
-                    tof_in=tof_in, verbose=verbose)
-
-                if progress is not None:
-                    progress.report(i / count * 90)
+                    tof_in=tof_in, verbose=verbose,
+                    in_process=in_process)
+                # Empty results are not cached as they are also returned
+                # when tofe_list fails.
+                if input_key is not None and tofe_list_data:
+                    self._cache.put(input_key, np.array(
+                        [tuple(row) for row in tofe_list_data],
+                        dtype=_TOFE_LIST_CACHE_DTYPE))
+                return input_key, tofe_list_data
+
+            # tofe_list is run for each cut file in parallel. Results are
+            # returned in the same order as the cut files.
+            if progress is not None:
+                sub_progress = progress.get_sub_reporter(lambda x: 0.9 * x)
+            else:
+                sub_progress = None
+            results = run_in_threads(
+                run_tofe_list, self._cut_files, progress=sub_progress,
+                max_workers=max_workers)
+            for key, (input_key, tofe_list_data) in zip(keys, results):
+                self._input_keys[key] = input_key
+                cut_dict[key] = tofe_list_data
         except Exception as e:
             msg = f"Could not calculate Energy Spectrum: {e}."
             self._measurement.log_error(msg)
@@ -193,7 +245,8 @@ class EnergySpectrum:
             no_foil: bool = False,
             logger: Optional[Logger] = None,
             tof_in: Path = Path("tof.in"),
-            verbose: bool = True) -> TofListData:
+            verbose: bool = True,
+            in_process: bool = False) -> TofListData:
         """tofe_list
 
        tofe_list interface for Python.
@@ -207,6 +260,9 @@ class EnergySpectrum:
             logger: optional Logger entity used for logging
             tof_in: path to tof_in_file
             verbose: whether tofe_list's stderr is printed to console
+            in_process: whether the conversion is done with the in-process
+                implementation (see tofe_list module) instead of running the
+                external program
 
         Returns:
             Returns cut file as list transformed through tofe_list
@@ -215,27 +271,39 @@ class EnergySpectrum:
         if not cut_file:
             return []
 
-        tof_parser = ToFListParser()
-        cmd = EnergySpectrum.get_command(tof_in, cut_file)
-        stderr = None if verbose else subprocess.DEVNULL
+        if directory is not None:
+            tofe_list_file = EnergySpectrum.get_tofe_list_file_name(
+                directory, cut_file, no_foil=no_foil)
+        else:
+            tofe_list_file = None
 
         try:
+            if in_process:
+                tofe_list_data = tl.tofe_list(cut_file, tof_in).tolist()
+                if tofe_list_file is not None:
+                    directory.mkdir(exist_ok=True)
+                    with tofe_list_file.open("w") as file:
+                        file.writelines(
+                            EnergySpectrum._tofe_list_line(row)
+                            for row in tofe_list_data)
+                return tofe_list_data
+
+            tof_parser = ToFListParser()
+            cmd = EnergySpectrum.get_command(tof_in, cut_file)
+            stderr = None if verbose else subprocess.DEVNULL
+
             with subprocess.Popen(
                     cmd, cwd=gf.get_bin_dir(), stdout=subprocess.PIPE,
                     universal_newlines=True, stderr=stderr) as tofe_list:
 
                 if directory is not None:
                     directory.mkdir(exist_ok=True)
-                    tofe_list_file = EnergySpectrum.get_tofe_list_file_name(
-                        directory, cut_file, no_foil=no_foil)
-                else:
-                    tofe_list_file = None
 
                 tofe_list_data = sutils.process_output(
                     tofe_list,
                     tof_parser.parse_str,
                     file=tofe_list_file,
-                    text_func=lambda x: f"{' '.join(str(col) for col in x)}\n"
+                    text_func=EnergySpectrum._tofe_list_line
                 )
                 return tofe_list_data
         except Exception as e:
@@ -246,6 +314,53 @@ class EnergySpectrum:
                 print(msg)
             return []
 
+    @staticmethod
+    def _get_input_key(cut_file: Path, tof_in: Path, in_process: bool) \
+            -> Optional[str]:
+        """Returns the cache key of the inputs of tofe_list or None if the
+        cut file does not exist.
+        """
+        if not cut_file.is_file():
+            return None
+        efficiency_dir = tl.read_tof_in(tof_in).get("Efficiency directory")
+        if efficiency_dir:
+            efficiency_files = sorted(Path(efficiency_dir).glob("*.eff"))
+        else:
+            efficiency_files = []
+        if in_process:
+            implementation = "in_process"
+        else:
+            # Results are recalculated if tofe_list is recompiled
+            executable = gf.get_bin_dir() / EnergySpectrum.get_command(
+                tof_in, cut_file)[0]
+            try:
+                stat = executable.stat()
+                implementation = (stat.st_size, stat.st_mtime_ns)
+            except OSError:
+                implementation = None
+        return SpectrumCache.get_key(
+            "tofe_list", implementation, cut_file, tof_in, *efficiency_files)
+
+    @staticmethod
+    def _write_tofe_list_file(
+            tofe_list_data: np.ndarray, directory: Path, cut_file: Path,
+            no_foil: bool):
+        """Writes cached tofe_list data to a .tofe_list file. An existing
+        file is overwritten, as it may have been written with other inputs.
+        """
+        tofe_list_file = EnergySpectrum.get_tofe_list_file_name(
+            directory, cut_file, no_foil=no_foil)
+        with tofe_list_file.open("w") as file:
+            file.writelines(
+                EnergySpectrum._tofe_list_line(row)
+                for row in tofe_list_data.tolist())
+
+    @staticmethod
+    def _tofe_list_line(row: Sequence) -> str:
+        """Returns a row of tofe_list data as a line of a .tofe_list file.
+        """
+        return f"{' '.join(str(col) for col in row)}\n"
+
     @staticmethod
     def get_command(tof_in: Path, cut_file: Path) -> Tuple[str, str, str]:
         """Returns the command for running tofe_list.
@@ -289,7 +404,10 @@ class EnergySpectrum:
             measurement: Measurement,
             directory_es: Path,
             use_efficiency: bool = False,
-            no_foil: bool = False) -> Dict[str, Espe]:
+            no_foil: bool = False,
+            cache: Optional[SpectrumCache] = None,
+            input_keys: Optional[Dict[str, Optional[str]]] = None) \
+            -> Dict[str, Espe]:
         """Calculate energy spectrum data from .tofe_list files and writes the
         results to .hist files.
 
@@ -303,6 +421,8 @@ class EnergySpectrum:
                 spectra is calculated
             no_foil: whether foil thickness was set to 0 or not. This also
                 affects the file name
+            cache: optional cache for histogrammed spectra
+            input_keys: cache keys of the tofe_list inputs of each spectrum
 
         Returns:
             contents of .hist files as a dict
@@ -314,10 +434,25 @@ class EnergySpectrum:
             y_col = None
 
         keys = []
+        if input_keys is None:
+            input_keys = {}
         for key, tofe_list_data in tofe_listed_files.items():
-            espe = gf.hist(
-                tofe_list_data, col=2, weight_col=y_col,
-                width=spectrum_width)
+            input_key = input_keys.get(key)
+            if cache is not None and input_key is not None:
+                espe_key = SpectrumCache.get_key(
+                    "espe", input_key, float(spectrum_width), use_efficiency)
+                cached = cache.get(espe_key)
+            else:
+                espe_key, cached = None, None
+
+            if cached is not None:
+                espe = [tuple(row) for row in cached.tolist()]
+            else:
+                espe = gf.hist(
+                    tofe_list_data, col=2, weight_col=y_col,
+                    width=spectrum_width)
+                if espe_key is not None and espe:
+                    cache.put(espe_key, np.array(espe, dtype=float))
 
             if not espe:
                 espes[key] = espe
@@ -125,6 +125,23 @@ class IonDivision(IntEnum):
         return int(presim), int(sim)
 
 
+@enum.unique
+class JobPriority(IntEnum):
+    """Priority of MCERD processes that wait for a slot in a JobScheduler.
+    Processes with smaller values are started first.
+    """
+    OPTIMIZATION = 1
+    SIMULATION = 2
+
+    def get_niceness(self) -> int:
+        """Returns the amount by which the scheduling priority of processes
+        is lowered.
+        """
+        if self is JobPriority.OPTIMIZATION:
+            return 0
+        return 5
+
+
 @enum.unique
 class DetectorType(str, Enum):
     TOF = "TOF"
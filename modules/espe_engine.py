@@ -0,0 +1,507 @@
+# coding=utf-8
+"""
+Created on 17.10.2026
+
+Potku is a graphical user interface for analyzation and
+visualization of measurement data collected from a ToF-ERD
+telescope. For physics calculations Potku uses external
+analyzation components.
+Copyright (C) 2026 Potku developers
+
+This program is free software; you can redistribute it and/or
+modify it under the terms of the GNU General Public License
+as published by the Free Software Foundation; either version 2
+of the License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program (file named 'LICENCE').
+
+In-process calculation of simulated energy spectra for optimization.
+
+get_espe weights each recoil event of the ERD files by the concentration of
+the recoil distribution at the depth of the event. As only the distribution
+changes between optimization candidates, the events are loaded once and the
+spectrum of each candidate is calculated by reweighting them.
+
+Detector resolution is applied as a Gaussian spread of each event over the
+channels instead of the random broadening that get_espe uses, and the
+intensity is calibrated with a single get_espe run.
+"""
+__version__ = "2.0"
+
+import io
+import math
+import os
+
+import numpy as np
+from scipy import sparse
+from scipy.special import ndtr
+
+from pathlib import Path
+from typing import Dict
+from typing import Iterable
+from typing import Optional
+from typing import Tuple
+
+from . import general_functions as gf
+from .base import Espe
+from .detector import Detector
+from .enums import DetectorType
+from .recoil_element import RecoilElement
+
+# Columns of ERD files that are used
+ERD_DTYPE = np.dtype([
+    ("type", "U1"),
+    ("energy", float),
+    ("mass", float),
+    ("depth", float),
+    ("weight", float),
+    ("tof", float),
+])
+_ERD_COLUMNS = (0, 3, 5, 6, 7, 8)
+
+# Conversion from FWHM to standard deviation
+_FWHM_TO_SIGMA = 1 / (2 * math.sqrt(2 * math.log(2)))
+# Events are spread over channels within this many standard deviations
+_SPREAD_SIGMAS = 4
+# Smaller fractions of an event are not spread to a channel
+_MIN_FRACTION = 1e-6
+# Number of events whose response is calculated at a time
+_RESPONSE_CHUNK_SIZE = 10000
+
+
+def read_erd_files(erd_files: Iterable[Path]) -> np.ndarray:
+    """Reads the events of ERD files.
+
+    Args:
+        erd_files: paths to ERD files
+
+    Return:
+        structured array with ERD_DTYPE
+    """
+    arrays = [np.empty(0, dtype=ERD_DTYPE)]
+    for erd_file in erd_files:
+        if not Path(erd_file).stat().st_size:
+            continue
+        arrays.append(np.loadtxt(
+            erd_file, dtype=ERD_DTYPE, usecols=_ERD_COLUMNS, ndmin=1))
+    return np.concatenate(arrays)
+
+
+def get_distribution(recoil_element: RecoilElement) \
+        -> Tuple[np.ndarray, np.ndarray]:
+    """Returns the depth distribution of a recoil element as it is written
+    to the recoil file that get_espe reads.
+
+    Args:
+        recoil_element: RecoilElement
+
+    Return:
+        depths (nm) and concentrations as arrays
+    """
+    values = "\n".join(recoil_element.get_mcerd_params()).split()
+    distribution = np.array(values, dtype=float).reshape(-1, 2)
+    return distribution[:, 0], distribution[:, 1]
+
+
+def get_energies(events: np.ndarray, detector: Detector,
+                 mass: Optional[float] = None) \
+        -> Tuple[np.ndarray, np.ndarray]:
+    """Returns the detected energies of ERD events and their resolutions.
+
+    Energies are calculated from the time of flight when a ToF detector is
+    used.
+
+    Args:
+        events: structured array with ERD_DTYPE
+        detector: Detector used in the simulation
+        mass: mass (u) used to convert times of flight into energies.
+            Defaults to the average mass of the events.
+
+    Return:
+        energies (MeV) and their standard deviations (MeV) as arrays
+    """
+    if detector.detector_type == DetectorType.TOF and len(events):
+        times = events["tof"] * 1e-9
+        if mass is None:
+            mass = float(np.mean(events["mass"]))
+        mass = gf.convert_amu_to_kg(mass)
+        energies = 0.5 * mass * (detector.calculate_tof_length() /
+                                 times) ** 2
+        energies /= gf.convert_mev_to_joule(1.0)
+        sigma_t = detector.timeres * 1e-12 * _FWHM_TO_SIGMA
+        resolutions = 2 * energies * sigma_t / times
+    else:
+        energies = events["energy"]
+        resolutions = np.full(
+            len(events), detector.energyres * 1e-3 * _FWHM_TO_SIGMA)
+    return energies, resolutions
+
+
+class EspeEngine:
+    """Calculates simulated energy spectra of a recoil element from ERD
+    events that have been loaded into memory.
+    """
+
+    def __init__(self, depths: np.ndarray, weights: np.ndarray,
+                 energies: np.ndarray, resolutions: np.ndarray,
+                 channel_width: float, fluence: float = 1.0,
+                 scale: float = 1.0):
+        """Initializes a new EspeEngine.
+
+        Args:
+            depths: depths (nm) of the recoil events
+            weights: weights of the recoil events
+            energies: detected energies (MeV) of the recoil events
+            resolutions: standard deviations (MeV) of the detected energies
+            channel_width: channel width (MeV) of the spectra
+            fluence: fluence that the scale corresponds to
+            scale: factor that converts weights into counts
+        """
+        self.depths = np.asarray(depths, dtype=float)
+        self.weights = np.asarray(weights, dtype=float)
+        self.channel_width = channel_width
+        self.fluence = fluence
+        self.scale = scale
+        self._first_channel, self._response = self._get_response(
+            np.asarray(energies, dtype=float),
+            np.asarray(resolutions, dtype=float), channel_width)
+
+    @classmethod
+    def from_erd_files(cls, erd_files: Iterable[Path], detector: Detector,
+                       channel_width: float, **kwargs) -> "EspeEngine":
+        """Returns an EspeEngine for the recoil events of ERD files.
+
+        Only events of the type 'R' are taken into account, like get_espe
+        does. Energies are calculated from the time of flight with the
+        average mass of the events when a ToF detector is used.
+
+        Args:
+            erd_files: paths to ERD files
+            detector: Detector used in the simulation
+            channel_width: channel width (MeV) of the spectra
+            kwargs: keyword arguments passed down to EspeEngine
+
+        Return:
+            EspeEngine
+        """
+        events = read_erd_files(erd_files)
+        events = events[events["type"] == "R"]
+        energies, resolutions = get_energies(events, detector)
+        return cls(events["depth"], events["weight"], energies, resolutions,
+                   channel_width, **kwargs)
+
+    @staticmethod
+    def _get_response(energies: np.ndarray, resolutions: np.ndarray,
+                      channel_width: float,
+                      chunk_size: int = _RESPONSE_CHUNK_SIZE) \
+            -> Tuple[int, sparse.csr_matrix]:
+        """Returns the first channel and a matrix that spreads the events
+        over the channels.
+
+        Events are processed in chunks of chunk_size events so that the
+        temporary arrays stay small when there are a lot of events.
+        """
+        channels = np.rint(energies / channel_width).astype(np.int64)
+        if not len(channels):
+            return 0, sparse.csr_matrix((0, 0))
+
+        spread = math.ceil(
+            _SPREAD_SIGMAS * float(np.max(resolutions)) / channel_width)
+        offsets = np.arange(-spread, spread + 1)
+        first_channel = int(channels.min()) - spread
+        channel_count = int(channels.max()) + spread - first_channel + 1
+
+        blocks = []
+        for start in range(0, len(channels), chunk_size):
+            chunk = slice(start, start + chunk_size)
+            blocks.append(EspeEngine._get_response_block(
+                energies[chunk], resolutions[chunk], channels[chunk],
+                offsets, first_channel, channel_count, channel_width))
+        return first_channel, sparse.hstack(blocks, format="csr")
+
+    @staticmethod
+    def _get_response_block(energies: np.ndarray, resolutions: np.ndarray,
+                            channels: np.ndarray, offsets: np.ndarray,
+                            first_channel: int, channel_count: int,
+                            channel_width: float) -> sparse.csc_matrix:
+        """Returns the columns of the response matrix for a chunk of
+        events.
+        """
+        rows = channels[:, None] + offsets
+        # Fraction of the Gaussian that falls into each channel. Channel n
+        # is centered at n * channel_width.
+        with np.errstate(divide="ignore", invalid="ignore"):
+            sigmas = resolutions[:, None]
+            upper = ndtr(((rows + 0.5) * channel_width -
+                          energies[:, None]) / sigmas)
+            lower = ndtr(((rows - 0.5) * channel_width -
+                          energies[:, None]) / sigmas)
+        fractions = upper - lower
+        no_spread = resolutions <= 0
+        fractions[no_spread] = offsets == 0
+        kept = fractions >= _MIN_FRACTION
+
+        columns = np.broadcast_to(
+            np.arange(len(channels))[:, None], rows.shape)
+        return sparse.csc_matrix(
+            (fractions[kept], (rows[kept] - first_channel, columns[kept])),
+            shape=(channel_count, len(channels)))
+
+    def get_counts(self, depths: np.ndarray, concentrations: np.ndarray,
+                   fluence: Optional[float] = None) -> np.ndarray:
+        """Returns the counts in each channel for a depth distribution.
+
+        Args:
+            depths: depths (nm) of the distribution points
+            concentrations: concentrations at the distribution points
+            fluence: fluence of the simulated spectrum. Defaults to the
+                fluence of the engine.
+
+        Return:
+            counts starting from the first channel
+        """
+        if fluence is None:
+            fluence = self.fluence
+        event_concentrations = np.interp(
+            self.depths, depths, concentrations, left=0.0, right=0.0)
+        factor = self.scale * fluence / self.fluence
+        return self._response @ (self.weights * event_concentrations * factor)
+
+    def calculate_distribution(
+            self, depths: np.ndarray, concentrations: np.ndarray,
+            fluence: Optional[float] = None) -> Espe:
+        """Calculates the spectrum of a depth distribution.
+
+        Args:
+            depths: depths (nm) of the distribution points
+            concentrations: concentrations at the distribution points
+            fluence: fluence of the simulated spectrum. Defaults to the
+                fluence of the engine.
+
+        Return:
+            spectrum as a list of (energy, counts) tuples. Like get_espe
+            output, it starts and ends with an empty channel.
+        """
+        counts = self.get_counts(depths, concentrations, fluence=fluence)
+        return _to_espe(self._first_channel, counts, self.channel_width)
+
+    def calculate_spectrum(self, recoil_element: RecoilElement,
+                           fluence: Optional[float] = None) -> Espe:
+        """Calculates the spectrum of a recoil element.
+
+        Args:
+            recoil_element: RecoilElement whose distribution is used
+            fluence: fluence of the simulated spectrum. Defaults to the
+                fluence of the engine.
+
+        Return:
+            spectrum as a list of (energy, counts) tuples
+        """
+        return self.calculate_distribution(
+            *get_distribution(recoil_element), fluence=fluence)
+
+    def calibrate(self, depths: np.ndarray, concentrations: np.ndarray,
+                  reference_espe: Espe) -> float:
+        """Sets the scale so that the total counts of a distribution are
+        the same as in a reference spectrum calculated by get_espe with the
+        fluence of the engine.
+
+        Args:
+            depths: depths (nm) of the distribution points
+            concentrations: concentrations at the distribution points
+            reference_espe: spectrum calculated by get_espe
+
+        Return:
+            the new scale
+        """
+        self.scale = 1.0
+        total = float(np.sum(self.get_counts(depths, concentrations)))
+        reference_total = sum(y for _, y in reference_espe)
+        if total <= 0 or reference_total <= 0:
+            raise ValueError(
+                "Spectrum engine could not be calibrated as the spectrum "
+                "is empty.")
+        self.scale = reference_total / total
+        return self.scale
+
+
+class SpectrumAccumulator:
+    """Accumulates the simulated spectrum of a recoil element from ERD files
+    while MCERD is still writing them.
+
+    Each update only reads the events that have been appended to the files
+    since the previous update and adds their counts to the spectrum. Events
+    are weighted and spread over the channels like in EspeEngine.
+    """
+
+    def __init__(self, erd_pattern: Path, detector: Detector,
+                 channel_width: float, depths: np.ndarray,
+                 concentrations: np.ndarray, scale: float = 1.0):
+        """Initializes a new SpectrumAccumulator.
+
+        Args:
+            erd_pattern: glob pattern of the ERD files
+            detector: Detector used in the simulation
+            channel_width: channel width (MeV) of the spectrum
+            depths: depths (nm) of the recoil distribution
+            concentrations: concentrations of the recoil distribution
+            scale: factor that converts weights into counts
+        """
+        self.erd_pattern = Path(erd_pattern)
+        self.detector = detector
+        self.channel_width = channel_width
+        self.depths = np.asarray(depths, dtype=float)
+        self.concentrations = np.asarray(concentrations, dtype=float)
+        self.scale = scale
+        self._mass = None
+        self._tails: Dict[Path, _ErdTail] = {}
+
+    def update(self) -> int:
+        """Reads the events that have been appended to the ERD files since
+        the previous update. Files that have been replaced or truncated are
+        read again from the start.
+
+        Return:
+            number of new recoil events
+        """
+        erd_files = self.erd_pattern.parent.glob(self.erd_pattern.name)
+        tails = {}
+        event_count = 0
+        for erd_file in sorted(erd_files):
+            tail = self._tails.get(erd_file) or _ErdTail()
+            try:
+                with open(erd_file, "rb") as file:
+                    stat = os.fstat(file.fileno())
+                    file_id = stat.st_dev, stat.st_ino
+                    if file_id != tail.file_id or stat.st_size < tail.offset:
+                        tail = _ErdTail(file_id)
+                    file.seek(tail.offset)
+                    data = file.read()
+            except FileNotFoundError:
+                continue
+            # The last line may still be incomplete
+            data = data[:data.rfind(b"\n") + 1]
+            tail.offset += len(data)
+            event_count += self._add_events(tail, data)
+            tails[erd_file] = tail
+        self._tails = tails
+        return event_count
+
+    def _add_events(self, tail: "_ErdTail", data: bytes) -> int:
+        """Adds the counts of the recoil events in the given lines to the
+        tail. Returns the number of recoil events.
+        """
+        if not data:
+            return 0
+        events = np.loadtxt(io.BytesIO(data), dtype=ERD_DTYPE,
+                            usecols=_ERD_COLUMNS, ndmin=1)
+        events = events[events["type"] == "R"]
+        if not len(events):
+            return 0
+        if self._mass is None:
+            # Same mass is used for all events so that new events do not
+            # shift the energies of the previous ones.
+            self._mass = float(np.mean(events["mass"]))
+        energies, resolutions = get_energies(
+            events, self.detector, mass=self._mass)
+        first_channel, response = EspeEngine._get_response(
+            energies, resolutions, self.channel_width)
+        event_concentrations = np.interp(
+            events["depth"], self.depths, self.concentrations, left=0.0,
+            right=0.0)
+        tail.add_counts(first_channel,
+                        response @ (events["weight"] * event_concentrations))
+        return len(events)
+
+    def get_counts(self) -> Tuple[int, np.ndarray]:
+        """Returns the first channel and the counts in each channel.
+        """
+        tails = [tail for tail in self._tails.values() if tail.counts.size]
+        if not tails:
+            return 0, np.zeros(0)
+        first = min(tail.first_channel for tail in tails)
+        last = max(tail.first_channel + tail.counts.size for tail in tails)
+        counts = np.zeros(last - first)
+        for tail in tails:
+            start = tail.first_channel - first
+            counts[start:start + tail.counts.size] += tail.counts
+        return first, counts * self.scale
+
+    def get_espe(self) -> Espe:
+        """Returns the accumulated spectrum as a list of (energy, counts)
+        tuples. Like get_espe output, it starts and ends with an empty
+        channel.
+        """
+        return _to_espe(*self.get_counts(), self.channel_width)
+
+    def calibrate(self, reference_espe: Espe) -> float:
+        """Sets the scale so that the total counts are the same as in a
+        reference spectrum that get_espe has calculated from the same ERD
+        files.
+
+        Args:
+            reference_espe: spectrum calculated by get_espe
+
+        Return:
+            the new scale
+        """
+        self.scale = 1.0
+        total = float(np.sum(self.get_counts()[1]))
+        reference_total = sum(y for _, y in reference_espe)
+        if total <= 0 or reference_total <= 0:
+            raise ValueError(
+                "Spectrum accumulator could not be calibrated as the "
+                "spectrum is empty.")
+        self.scale = reference_total / total
+        return self.scale
+
+
+class _ErdTail:
+    """Read position and counts of a single ERD file.
+    """
+    __slots__ = "file_id", "offset", "first_channel", "counts"
+
+    def __init__(self, file_id=None):
+        self.file_id = file_id
+        self.offset = 0
+        self.first_channel = 0
+        self.counts = np.zeros(0)
+
+    def add_counts(self, first_channel: int, counts: np.ndarray):
+        """Adds counts that start from the given channel.
+        """
+        if not self.counts.size:
+            self.first_channel, self.counts = first_channel, counts
+            return
+        first = min(self.first_channel, first_channel)
+        last = max(self.first_channel + self.counts.size,
+                   first_channel + counts.size)
+        if first != self.first_channel or last - first != self.counts.size:
+            total = np.zeros(last - first)
+            start = self.first_channel - first
+            total[start:start + self.counts.size] = self.counts
+            self.first_channel, self.counts = first, total
+        start = first_channel - self.first_channel
+        self.counts[start:start + counts.size] += counts
+
+
+def _to_espe(first_channel: int, counts: np.ndarray,
+             channel_width: float) -> Espe:
+    """Returns counts that start from the given channel as a list of
+    (energy, counts) tuples. Empty channels at both ends are left out, except
+    for a single empty channel at each end.
+    """
+    nonzero = np.flatnonzero(counts)
+    if not len(nonzero):
+        return []
+    counts = np.concatenate(
+        ([0.0], counts[nonzero[0]:nonzero[-1] + 1], [0.0]))
+    channels = np.arange(len(counts)) + first_channel + nonzero[0] - 1
+    energies = np.round(channels * channel_width, 6)
+    return list(zip(energies.tolist(), counts.tolist()))
@@ -0,0 +1,399 @@
+# coding=utf-8
+"""
+Created on 17.10.2026
+
+Potku is a graphical user interface for analyzation and
+visualization of measurement data collected from a ToF-ERD
+telescope. For physics calculations Potku uses external
+analyzation components.
+Copyright (C) 2026 Potku developers
+
+This program is free software; you can redistribute it and/or
+modify it under the terms of the GNU General Public License
+as published by the Free Software Foundation; either version 2
+of the License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program (file named 'LICENCE').
+
+Event store module holds the columnar in-memory representation of the
+events of a measurement.
+"""
+__version__ = "2.0"
+
+import hashlib
+import json
+import os
+import platform
+import warnings
+
+from pathlib import Path
+from typing import Any
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+import numpy as np
+
+
+class EventStore:
+    """Columnar storage for the events of a measurement.
+
+    Each event has a time-of-flight and an energy channel, an optional third
+    ADC channel and a running event number. Event number is the (1-based)
+    line number of the event in the .asc file it was read from.
+    """
+    __slots__ = "tof", "energy", "adc", "event_number"
+
+    # Size of the blocks that are read from the .asc file at a time
+    CHUNK_SIZE = 2 ** 24
+
+    def __init__(self, tof: np.ndarray, energy: np.ndarray,
+                 event_number: np.ndarray, adc: Optional[np.ndarray] = None):
+        """Initializes a new EventStore.
+
+        Args:
+            tof: time-of-flight channels
+            energy: energy channels
+            event_number: event numbers
+            adc: values of the optional third ADC column
+        """
+        self.tof = np.asarray(tof, dtype=np.int32)
+        self.energy = np.asarray(energy, dtype=np.int32)
+        self.event_number = np.asarray(event_number, dtype=np.uint32)
+        if adc is not None:
+            adc = np.asarray(adc, dtype=np.int32)
+        self.adc = adc
+
+        if not len(self.tof) == len(self.energy) == len(self.event_number):
+            raise ValueError("Event columns must have equal lengths.")
+        if self.adc is not None and len(self.adc) != len(self.tof):
+            raise ValueError("Event columns must have equal lengths.")
+
+    @classmethod
+    def empty(cls) -> "EventStore":
+        """Returns an EventStore that contains no events.
+        """
+        return cls([], [], [])
+
+    @classmethod
+    def from_asc_file(cls, file: Path,
+                      chunk_size: Optional[int] = None) -> "EventStore":
+        """Reads events from an .asc file.
+
+        Lines with two (ToF, energy) or three (ToF, energy, ADC) columns are
+        read as events. Other lines are skipped, but they still increment
+        the event number.
+
+        Args:
+            file: path to the .asc file
+            chunk_size: number of bytes that are read and parsed at a time
+
+        Return:
+            EventStore
+        """
+        return cls._read_asc_file(file, chunk_size)[0]
+
+    @classmethod
+    def _read_asc_file(cls, file: Path, chunk_size: Optional[int] = None) \
+            -> Tuple["EventStore", str]:
+        """Reads events from an .asc file and calculates the MD5 checksum of
+        the file while reading it.
+        """
+        if chunk_size is None:
+            chunk_size = cls.CHUNK_SIZE
+        chunks = []
+        line_count = 0
+        remainder = b""
+        md5 = hashlib.md5()
+        with Path(file).open("rb") as fp:
+            while True:
+                block = fp.read(chunk_size)
+                if not block:
+                    break
+                md5.update(block)
+                block = remainder + block
+                end = block.rfind(b"\n") + 1
+                remainder = block[end:]
+                if end:
+                    chunk, lines = _parse_asc_block(block[:end], line_count)
+                    chunks.append(chunk)
+                    line_count += lines
+            if remainder:
+                chunk, lines = _parse_asc_block(remainder, line_count)
+                chunks.append(chunk)
+
+        return cls._from_chunks(chunks), md5.hexdigest()
+
+    @classmethod
+    def _from_chunks(cls, chunks: List[Tuple[np.ndarray, ...]]) \
+            -> "EventStore":
+        """Concatenates parsed blocks into a single EventStore.
+        """
+        if not chunks:
+            return cls.empty()
+        tof, energy, adc, event_number, has_adc = zip(*chunks)
+        return cls(
+            np.concatenate(tof), np.concatenate(energy),
+            np.concatenate(event_number),
+            adc=np.concatenate(adc) if any(has_adc) else None)
+
+    @classmethod
+    def from_cache_file(cls, file: Path) -> "EventStore":
+        """Opens events from a binary cache file written by to_cache_file.
+        Columns are memory mapped, except on Windows where mapped files
+        cannot be removed while they are open.
+
+        Args:
+            file: path to the cache file
+
+        Return:
+            EventStore
+        """
+        header = read_cache_header(file)
+        shape = (header["columns"], header["count"])
+        if platform.system() == "Windows":
+            with Path(file).open("rb") as fp:
+                fp.seek(_CACHE_HEADER_SIZE)
+                data = np.fromfile(
+                    fp, dtype=np.int32, count=shape[0] * shape[1])
+            data = data.reshape(shape)
+        elif shape[1]:
+            data = np.memmap(file, dtype=np.int32, mode="r",
+                             offset=_CACHE_HEADER_SIZE, shape=shape)
+        else:
+            # Empty files cannot be memory mapped
+            data = np.empty(shape, dtype=np.int32)
+        return cls(data[0], data[1], data[-1].view(np.uint32),
+                   adc=data[2] if header["columns"] == 4 else None)
+
+    def to_cache_file(self, file: Path, source: Dict[str, Any]):
+        """Writes events into a binary cache file. The file consists of a
+        fixed size header and the event columns.
+
+        Args:
+            file: path to the cache file
+            source: information about the file that the events were read from
+        """
+        columns = [self.tof, self.energy]
+        if self.has_adc():
+            columns.append(self.adc)
+        columns.append(self.event_number)
+        header = {
+            **source,
+            "count": len(self),
+            "columns": len(columns),
+        }
+        file = Path(file)
+        tmp_file = file.with_name(f"{file.name}.tmp")
+        with tmp_file.open("wb") as fp:
+            fp.write(_encode_cache_header(header))
+            for column in columns:
+                column.astype(np.int32, copy=False).tofile(fp)
+        os.replace(tmp_file, file)
+
+    def __len__(self):
+        return len(self.tof)
+
+    def has_adc(self) -> bool:
+        """Whether events have the third ADC column.
+        """
+        return self.adc is not None
+
+    def get_columns(self, transposed: bool = False) \
+            -> Tuple[np.ndarray, np.ndarray]:
+        """Returns ToF and energy columns as the (x, y) axes of the ToF-E
+        histogram. Columns are returned as views, no data is copied.
+
+        Args:
+            transposed: whether energy is on the x axis
+        """
+        if transposed:
+            return self.energy, self.tof
+        return self.tof, self.energy
+
+    def rows(self, mask: Optional[np.ndarray] = None) -> np.ndarray:
+        """Returns events as rows in the same column order that is used in
+        .cut files (ToF, energy, [ADC,] event number).
+
+        Args:
+            mask: boolean mask or index array that selects the events to be
+                returned. If None, all events are returned.
+
+        Return:
+            two dimensional integer array
+        """
+        columns = [self.tof, self.energy]
+        if self.has_adc():
+            columns.append(self.adc)
+        columns.append(self.event_number)
+        if mask is not None:
+            columns = [column[mask] for column in columns]
+        return np.column_stack(columns).astype(np.int64)
+
+
+_CACHE_MAGIC = b"POTKUEVT"
+_CACHE_HEADER_SIZE = 256
+
+
+def get_cache_file(asc_file: Path) -> Path:
+    """Returns the path of the binary cache file of an .asc file.
+    """
+    return asc_file.with_suffix(".events")
+
+
+def remove_cache_file(asc_file: Path):
+    """Removes the binary cache file of an .asc file so that the .asc file
+    is parsed again when it is next loaded.
+    """
+    try:
+        get_cache_file(asc_file).unlink()
+    except FileNotFoundError:
+        pass
+
+
+def load_asc_file(asc_file: Path) -> EventStore:
+    """Loads events of an .asc file.
+
+    If the binary cache file next to the .asc file is valid, events are
+    opened from it. Otherwise the .asc file is parsed and the cache file is
+    written for subsequent loads. Cache file is valid if the size of the
+    .asc file is the same as when the cache was written and either the
+    modification time or the MD5 checksum of the .asc file is the same.
+
+    Args:
+        asc_file: path to the .asc file
+
+    Return:
+        EventStore
+    """
+    cache_file = get_cache_file(asc_file)
+    stat = asc_file.stat()
+    try:
+        header = read_cache_header(cache_file)
+    except (OSError, ValueError):
+        header = None
+
+    if header is not None and header["size"] == stat.st_size:
+        if header["mtime_ns"] == stat.st_mtime_ns:
+            return EventStore.from_cache_file(cache_file)
+        if header["md5"] == _md5_for_file(asc_file):
+            # Contents are unchanged (the file was copied or touched), only
+            # the stored modification time needs updating
+            header["mtime_ns"] = stat.st_mtime_ns
+            with cache_file.open("r+b") as fp:
+                fp.write(_encode_cache_header(header))
+            return EventStore.from_cache_file(cache_file)
+
+    events, md5 = EventStore._read_asc_file(asc_file)
+    source = {
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "md5": md5,
+    }
+    try:
+        events.to_cache_file(cache_file, source)
+    except OSError:
+        # Caching is optional, the events are still usable
+        pass
+    return events
+
+
+def read_cache_header(file: Path) -> Dict[str, Any]:
+    """Reads the header of a binary cache file.
+
+    Raises ValueError if the file is not a valid cache file.
+    """
+    with Path(file).open("rb") as fp:
+        raw = fp.read(_CACHE_HEADER_SIZE)
+    if len(raw) != _CACHE_HEADER_SIZE or not raw.startswith(_CACHE_MAGIC):
+        raise ValueError(f"{file} is not an event cache file.")
+    try:
+        header = json.loads(raw[len(_CACHE_MAGIC):].decode("utf-8"))
+        expected_size = _CACHE_HEADER_SIZE + \
+            4 * header["columns"] * header["count"]
+    except (UnicodeDecodeError, json.JSONDecodeError, KeyError,
+            TypeError) as e:
+        raise ValueError(f"Could not read cache header: {e}") from e
+    if Path(file).stat().st_size != expected_size:
+        raise ValueError(f"{file} is truncated.")
+    return header
+
+
+def _encode_cache_header(header: Dict[str, Any]) -> bytes:
+    """Encodes the header into a fixed size block of bytes.
+    """
+    raw = _CACHE_MAGIC + json.dumps(header).encode("utf-8")
+    if len(raw) > _CACHE_HEADER_SIZE:
+        raise ValueError("Cache header is too long.")
+    return raw.ljust(_CACHE_HEADER_SIZE, b" ")
+
+
+def _md5_for_file(file: Path, block_size: int = 2 ** 24) -> str:
+    """Calculates the MD5 checksum of a binary file.
+    """
+    md5 = hashlib.md5()
+    with file.open("rb") as fp:
+        for block in iter(lambda: fp.read(block_size), b""):
+            md5.update(block)
+    return md5.hexdigest()
+
+
+def _parse_asc_block(block: bytes, first_line: int) \
+        -> Tuple[Tuple[np.ndarray, ...], int]:
+    """Parses a block of .asc lines.
+
+    Args:
+        block: bytes containing whole lines
+        first_line: number of lines that precede this block in the file
+
+    Return:
+        tuple of parsed columns and the number of lines in the block
+    """
+    buf = np.frombuffer(block, dtype=np.uint8)
+    # All bytes up to and including space are treated as separators
+    is_space = buf <= 32
+    token_start = ~is_space
+    token_start[1:] &= is_space[:-1]
+    starts = np.flatnonzero(token_start)
+
+    newlines = np.flatnonzero(buf == ord("\n"))
+    line_count = len(newlines)
+    if len(buf) and buf[-1] != ord("\n"):
+        line_count += 1
+
+    is_sign = (buf == ord("-")) | (buf == ord("+"))
+    is_digit = (buf >= ord("0")) & (buf <= ord("9"))
+    if not np.all(is_space | is_digit | is_sign & token_start):
+        raise ValueError("Measurement data contains non-integer values.")
+    if len(starts):
+        with warnings.catch_warnings():
+            # Parse errors are detected by comparing the value count to the
+            # token count below
+            warnings.simplefilter("ignore", DeprecationWarning)
+            values = np.fromstring(block, dtype=np.int64, sep=" ")
+    else:
+        values = np.empty(0, dtype=np.int64)
+    if len(values) != len(starts):
+        raise ValueError("Measurement data contains non-integer values.")
+
+    tokens_per_line = np.bincount(np.searchsorted(newlines, starts),
+                                  minlength=line_count)
+    offsets = np.cumsum(tokens_per_line) - tokens_per_line
+
+    events = np.flatnonzero((tokens_per_line == 2) | (tokens_per_line == 3))
+    idx = offsets[events]
+    three_columns = tokens_per_line[events] == 3
+
+    adc = np.zeros(len(events), dtype=np.int64)
+    adc[three_columns] = values[idx[three_columns] + 2]
+
+    parsed = (values[idx], values[idx + 1], adc, first_line + events + 1,
+              bool(three_columns.any()))
+    return parsed, line_count
@@ -44,6 +44,8 @@ import time
 import functools
 import sys
 
+import numpy as np
+
 from timeit import default_timer as timer
 from pathlib import Path
 from decimal import Decimal
@@ -197,8 +199,13 @@ def hist(data, col=0, weight_col=None, width=1.0):
     Python version of Arstila's hist code. This purpose is to format data's
     column at certain widths so the graph won't include all information.
 
+    Bins are [a - width, a) where a starts from int(min / width) * width and
+    is incremented by width. Each bin is returned as (a - width, sum of
+    weights). Weights are summed in the order of the data, so the sums may
+    differ in the last bits from summing them in sorted order.
+
     Args:
-        data: List representation of data.
+        data: list of rows, 2D array or structured array.
         col: column that contains the values to be histogrammed
         weight_col: column that contains weights for each row of data
         width: width of histogrammed bins.
@@ -206,27 +213,57 @@ def hist(data, col=0, weight_col=None, width=1.0):
     Return:
         Returns formatted list to use in graphs.
     """
-    if not data:
+    if len(data) == 0:
         return []
-    data_sliced = tuple(
-        (float(row[col]), float(row[weight_col])
-         if weight_col is not None else 1)
-        for row in data)
-    data_sliced = sorted(data_sliced, key=lambda x: x[0], reverse=False)
-    data_length = len(data_sliced)
-
-    a = int(data_sliced[0][0] / width) * width
-    i = 0
-    hist_list = []
-    while i < data_length:
-        b = 0.0
-        while i < data_length and data_sliced[i][0] < a:
-            b += data_sliced[i][1]
-            i += 1
-        hist_list.append((a - width, b))
-        a += width
-
-    return hist_list
+    values = _get_column(data, col)
+    min_value, max_value = values.min(), values.max()
+
+    start = int(min_value / width) * width
+    # Edges are accumulated one width at a time like the original loop did,
+    # so they are identical down to floating point rounding.
+    edge_type = int if isinstance(start, (int, np.integer)) else float
+    count = int((max_value - start) / width) + 3
+    while True:
+        steps = np.full(count, width, dtype=edge_type)
+        steps[0] = start
+        edges = np.add.accumulate(steps)
+        if edges[-1] > max_value:
+            break
+        count *= 2
+
+    # Index of the first edge that is greater than the value. The estimate
+    # is corrected against the edges as they may differ from
+    # start + n * width by rounding.
+    indices = np.floor((values - start) / width).astype(np.int64) + 1
+    np.clip(indices, 0, len(edges) - 1, out=indices)
+    while True:
+        too_small = values >= edges[indices]
+        too_large = values < edges[np.maximum(indices - 1, 0)]
+        too_large &= indices > 0
+        if not (too_small.any() or too_large.any()):
+            break
+        indices += too_small
+        indices -= too_large
+    bin_count = int(indices.max()) + 1
+    if weight_col is None:
+        sums = np.bincount(indices, minlength=bin_count).astype(float)
+    else:
+        sums = np.bincount(
+            indices, weights=_get_column(data, weight_col),
+            minlength=bin_count)
+
+    return list(zip((edges[:bin_count] - width).tolist(), sums.tolist()))
+
+
+def _get_column(data, col: int) -> np.ndarray:
+    """Returns a column of rows as an array of floats.
+    """
+    if isinstance(data, np.ndarray):
+        if data.dtype.names is not None:
+            return data[data.dtype.names[col]].astype(float)
+        return data[:, col].astype(float)
+    return np.fromiter(
+        (float(row[col]) for row in data), dtype=float, count=len(data))
 
 
 def copy_file_to_temp(file: Path) -> Path:
@@ -276,7 +313,8 @@ def convert_amu_to_kg(mass_in_amus: float) -> float:
     return float(mass_in_amus) * amu
 
 
-def carbon_stopping(element, isotope, energy, carbon_thickness, carbon_density):
+def carbon_stopping(element, isotope, energy, carbon_thickness, carbon_density,
+                    verbose: bool = True):
     """Calculate stopping of a particle in a carbon foil
 
     Args:
@@ -285,6 +323,7 @@ def carbon_stopping(element, isotope, energy, carbon_thickness, carbon_density):
         energy: Energy of the incident particle in MeVs (e.g. 2.0)
         carbon_thickness: Thickness of the carbon foil in nm. (e.g. 13.0)
         carbon_density: Density of the carbon foil in g/cm3. (e.g. 2.27)
+        verbose: whether the arguments and output of jibaltool are printed
 
     Returns:
         Energy loss of particle in a carbon foil of some thickness in Joules
@@ -300,14 +339,16 @@ def carbon_stopping(element, isotope, energy, carbon_thickness, carbon_density):
             jibaltool = './jibaltool'
 
         args = [jibaltool, "stop", '-l', 'C', '-t', "{0}tfu".format(areal_density_tfu), "{0}{1}".format(isotope, element), str(energy),]
-        print(args)
+        if verbose:
+            print(args)
         p = subprocess.Popen(
             args, cwd=bin_dir, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
             stderr=subprocess.PIPE)
         stdout, unused_stderr = p.communicate()
         output = stdout.decode()
-        print(unused_stderr.decode())
-        print(output)
+        if verbose:
+            print(unused_stderr.decode())
+            print(output)
         energy_loss = 0.0
         for line in output.split("\n"):
             try:
@@ -471,42 +512,6 @@ def find_nearest(x, lst):
         return before
 
 
-def uniform_espe_lists(espe1, espe2, channel_width=0.025):
-    """Modify given energy spectra lists to have the same amount of items.
-
-    Return:
-        Modified lists.
-    """
-    first = espe1
-    second = espe2
-    # check if first x values don't match
-    # add zero values to the one missing the x values
-    if second[0][0] < first[0][0]:
-        x = first[0][0] - channel_width
-        while round(x, 4) >= second[0][0]:
-            first.insert(0, (round(x, 4), 0))
-            x -= channel_width
-    elif first[0][0] < second[0][0]:
-        x = second[0][0] - channel_width
-        while round(x, 4) >= first[0][0]:
-            second.insert(0, (round(x, 4), 0))
-            x -= channel_width
-
-    # do the same for the last values
-    if second[-1][0] < first[-1][0]:
-        x = second[-1][0] + channel_width
-        while round(x, 4) <= first[-1][0]:
-            second.append((round(x, 4), 0))
-            x += channel_width
-    elif first[-1][0] < second[-1][0]:
-        x = first[-1][0] + channel_width
-        while round(x, 4) <= second[-1][0]:
-            first.append((round(x, 4), 0))
-            x += channel_width
-
-    return first, second
-
-
 def format_to_binary(var, length):
     """Format given integer into binary of a certain length.
 
@@ -29,6 +29,7 @@ import platform
 import subprocess
 from pathlib import Path
 from typing import Iterable
+from typing import List
 from typing import Optional
 from typing import Tuple
 
@@ -159,29 +160,48 @@ class GetEspe:
                 espe_cmd, cwd=bin_dir, stdin=subprocess.PIPE,
                 stdout=subprocess.PIPE, universal_newlines=True,
                 stderr=stderr) as espe_process:
-            with espe_process.stdin as stdin:
-                for line in self.read_erd_files():
-                    stdin.write(line)
-
-            espe = sutils.process_output(
-                espe_process,
-                parse_func=self._output_parser.parse_str,
-                file=output_file,
-                text_func=lambda x: f"{x[0]} {x[1]}\n")
+            # ERD files are written to stdin on another thread while the
+            # output is processed so neither side waits for the other.
+            writer = sutils.StdinWriter(espe_process, self.get_erd_files())
+            writer.start()
+            try:
+                espe = sutils.process_output(
+                    espe_process,
+                    parse_func=self._output_parser.parse_str,
+                    file=output_file,
+                    text_func=lambda x: f"{x[0]} {x[1]}\n")
+            except BaseException:
+                sutils.kill_process(espe_process)
+                writer.join()
+                raise
+            writer.wait()
 
         return espe
 
+    def get_erd_files(self) -> List[Path]:
+        """Returns the ERD files that match the erd_file pattern.
+        """
+        return [Path(f) for f in glob.glob(str(self.erd_file))]
+
     def read_erd_files(self) -> Iterable[str]:
         """Yields lines from ERD files.
         Yield:
             each line as a string
         """
         # TODO this could be a function in some utility module
-        for f in glob.glob(str(self.erd_file)):
+        for f in self.get_erd_files():
             with open(f, "r") as file:
                 for line in file:
                     yield line
 
+    @staticmethod
+    def get_executable() -> Path:
+        """Returns the path to the get_espe executable.
+        """
+        if platform.system() == "Windows":
+            return gf.get_bin_dir() / "get_espe.exe"
+        return gf.get_bin_dir() / "get_espe"
+
     def get_command(self) -> Tuple[str, ...]:
         """Returns the command to run get_espe executable.
         Return: command as a tuple of strings
@@ -216,7 +236,7 @@ class GetEspe:
         #         -density average atomic density of the first 10 nm layer
         #                  (at./cm^3)
         if platform.system() == "Windows":
-            executable = str(gf.get_bin_dir() / "get_espe.exe")
+            executable = str(GetEspe.get_executable())
         else:
             executable = "./get_espe"
 
@@ -297,6 +297,46 @@ class GlobalSettings:
         """
         self._config[self._DEFAULT]["es_output"] = str(flag)
 
+    @handle_exceptions(return_value=False)
+    def is_tofe_list_in_process(self) -> bool:
+        """Whether energy spectra are calculated with the in-process
+        implementation of tofe_list instead of the external program.
+
+        Return:
+            Returns a boolean.
+        """
+        return self._config.getboolean(self._DEFAULT, "tofe_list_in_process")
+
+    def set_tofe_list_in_process(self, flag: bool):
+        """Set whether energy spectra are calculated with the in-process
+        implementation of tofe_list.
+
+        Args:
+            flag: A boolean representing whether the in-process
+                implementation is used.
+        """
+        self._config[self._DEFAULT]["tofe_list_in_process"] = str(flag)
+
+    @handle_exceptions(return_value=False)
+    def is_espe_in_process(self) -> bool:
+        """Whether simulated spectra of optimization solutions are
+        calculated in Potku instead of running get_espe for each solution.
+
+        Return:
+            Returns a boolean.
+        """
+        return self._config.getboolean(self._DEFAULT, "espe_in_process")
+
+    def set_espe_in_process(self, flag: bool):
+        """Set whether simulated spectra of optimization solutions are
+        calculated in Potku.
+
+        Args:
+            flag: A boolean representing whether spectra are calculated in
+                Potku.
+        """
+        self._config[self._DEFAULT]["espe_in_process"] = str(flag)
+
     @handle_exceptions(return_value=False)
     def get_tofe_transposed(self) -> bool:
         """Get boolean if the ToF-E Histogram is transposed.
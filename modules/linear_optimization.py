@@ -26,23 +26,29 @@ __author__ = "Tuomas Pitkänen"
 __version__ = "2.0"
 
 import copy
+import itertools
 import subprocess
 from collections import namedtuple
 from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
 from typing import Tuple, List, Optional, Callable, Union
 
 import numpy as np
 from scipy import signal
 
-from . import general_functions as gf
-from . import math_functions as mf
+from . import concurrency
+from . import file_paths as fp
 from . import optimization as opt
 from .base import Espe
+from .concurrency import CancellationToken
 from .element_simulation import ElementSimulation
 from .enums import OptimizationState, IonDivision
 from .enums import OptimizationType
+from .get_espe import GetEspe
 from .point import Point
 from .recoil_element import RecoilElement
+from .spectrum_cache import CACHE_DIR_NAME
+from .spectrum_cache import SpectrumCache
 
 
 SolutionOrStr = Union["BaseSolution", str]
@@ -58,6 +64,11 @@ class LinearOptimization(opt.BaseOptimizer):
     """Class that handles linear optimization for Optimize Recoils or
     Fluence.
     """
+    # Recoil types and solution sizes that starting solutions are formed
+    # from when several starts are fitted
+    STARTING_SHAPES = (("box", 5), ("box", 7), ("two-peak", 9),
+                       ("two-peak", 11))
+
     def __init__(self, element_simulation: ElementSimulation = None,
                  sol_size=5, upper_limits=None, lower_limits=None,
                  optimization_type=OptimizationType.RECOIL, recoil_type="box",
@@ -66,7 +77,8 @@ class LinearOptimization(opt.BaseOptimizer):
                  check_min=0, skip_simulation=False, use_efficiency=False,
                  optimize_by_area=False, verbose=False,
                  sample_count=12, sample_width=3.0, sample_polynomial_degree=2,
-                 fitting_iteration_count=2, is_skewed=False):
+                 fitting_iteration_count=2, is_skewed=False,
+                 in_process_espe=False, start_count=1, max_workers=None):
         """Initialize the linear optimizer.
 
         Only LinearOptimization-specific arguments are documented here. See
@@ -82,6 +94,13 @@ class LinearOptimization(opt.BaseOptimizer):
                 MeV -> nm conversion
             fitting_iteration_count: number of fitting iterations
             is_skewed: whether solution shape can be non-rectangular
+            start_count: number of starting solutions that are fitted.
+                Starting solutions other than the initial one are formed
+                from the other shapes in STARTING_SHAPES and then by
+                scaling the widths and heights of the peaks of the initial
+                one. The best fit is kept.
+            max_workers: maximum number of threads used to fit the starting
+                solutions. Defaults to the number of CPUs.
         """
         opt.BaseOptimizer.__init__(
             self,
@@ -101,7 +120,8 @@ class LinearOptimization(opt.BaseOptimizer):
             skip_simulation=skip_simulation,
             use_efficiency=use_efficiency,
             verbose=verbose,
-            optimize_by_area=optimize_by_area  # TODO: remove
+            optimize_by_area=optimize_by_area,  # TODO: remove
+            in_process_espe=in_process_espe
         )
         self.element_simulation = element_simulation
 
@@ -112,11 +132,15 @@ class LinearOptimization(opt.BaseOptimizer):
         self.sample_polynomial_degree = sample_polynomial_degree
         self.is_skewed = is_skewed
         self.fitting_iteration_count = fitting_iteration_count
+        self.start_count = start_count
+        self.max_workers = max_workers
 
         self.measured_espe_x = None
         self.measured_espe_y = None
 
         self._mev_to_nm_function: Optional[Callable] = None
+        # MeV, nm and prominence of each sample used to fit the function
+        self.mev_to_nm_samples: Optional[np.ndarray] = None
 
         self.measured_peak_info: Optional[PeakInfo] = None
         self.measured_peaks_mev: Optional[List[Tuple[float]]] = None
@@ -140,6 +164,10 @@ class LinearOptimization(opt.BaseOptimizer):
         polynomial for MeV -> nm conversion. Peak prominences are used as
         statistical weights.
 
+        The samples and the polynomial are stored in a cache in the
+        directory of the element simulation. They are reused as long as the
+        ERD files, get_espe parameters and sampling parameters stay the same.
+
         Raises:
             ValueError: if interpolation function could not be generated
         """
@@ -153,6 +181,76 @@ class LinearOptimization(opt.BaseOptimizer):
 
         smoothing_width = round(self.measured_espe_x.shape[0] / 30)
 
+        cache = SpectrumCache(
+            Path(self.element_simulation.directory, CACHE_DIR_NAME))
+        key = self._get_mev_to_nm_key(smoothing_width)
+        coefficients_key = SpectrumCache.get_key(key, "coefficients")
+        samples_key = SpectrumCache.get_key(key, "samples")
+
+        coefficients = cache.get(coefficients_key)
+        samples = cache.get(samples_key)
+        if coefficients is None or samples is None:
+            samples = self._sample_mev_to_nm(nm_points, smoothing_width)
+            mevs, nms, prominences = samples
+            coefficients = np.polyfit(
+                mevs, nms, deg=self.sample_polynomial_degree, w=prominences)
+            cache.put(samples_key, samples)
+            cache.put(coefficients_key, coefficients)
+
+        self.mev_to_nm_samples = samples
+        self._mev_to_nm_function = lambda x: np.polyval(coefficients, x)
+
+    def _get_mev_to_nm_key(self, smoothing_width: int) -> str:
+        """Returns the cache key of the MeV-to-nm conversion. The key
+        depends on everything that affects the simulated sample spectra.
+        """
+        _, run, detector = self.element_simulation.get_mcerd_params()
+        target = self.element_simulation.simulation.target
+        recoil = self.element_simulation.get_main_recoil()
+
+        # Same ERD files that get_espe reads
+        erd_pattern = Path(
+            self.element_simulation.directory,
+            fp.get_erd_file_name(
+                recoil, "*", optim_mode=self.optimization_type))
+        erd_files = sorted(erd_pattern.parent.glob(erd_pattern.name))
+
+        if self.in_process_espe:
+            implementation = "in_process"
+        else:
+            # Samples are recalculated if get_espe is recompiled
+            try:
+                stat = GetEspe.get_executable().stat()
+                implementation = (stat.st_size, stat.st_mtime_ns)
+            except OSError:
+                implementation = None
+
+        return SpectrumCache.get_key(
+            "mev_to_nm", implementation, str(recoil.element),
+            run.beam.ion.get_prefix(), float(run.beam.energy),
+            float(run.fluence), float(detector.detector_theta),
+            float(detector.timeres), float(detector.energyres),
+            str(detector.detector_type),
+            float(detector.calculate_tof_length()),
+            float(detector.calculate_solid()), float(target.target_theta),
+            float(target.reference_density.get_value()),
+            float(self.channel_width),
+            tuple(float(x) for x in self.lower_limits),
+            tuple(float(x) for x in self.upper_limits),
+            self.sample_count, float(self.sample_width),
+            self.sample_polynomial_degree, smoothing_width, *erd_files)
+
+    def _sample_mev_to_nm(self, nm_points: np.ndarray,
+                          smoothing_width: int) -> np.ndarray:
+        """Simulates a thin peak at each point and returns the MeV values,
+        centered nm values and prominences of the simulated peaks.
+
+        Raises:
+            ValueError: if there are not enough significant peaks
+
+        Returns:
+            array with rows for MeV values, nm values and prominences
+        """
         solutions = [
             get_solution6(nm, nm + self.sample_width, self.lower_limits, self.upper_limits)
             for nm in nm_points]
@@ -188,13 +286,7 @@ class LinearOptimization(opt.BaseOptimizer):
                              f" Not enough significant data points."
                              f" {len_mevs} found.")
 
-        mevs = np.array(mevs)
-        nms = np.array(nms)
-        prominences = np.array(prominences)
-
-        coefficients = np.polyfit(
-            mevs, nms, deg=self.sample_polynomial_degree, w=prominences)
-        self._mev_to_nm_function = lambda x: np.polyval(coefficients, x)
+        return np.array([mevs, nms, prominences], dtype=float)
 
     def _convert_mev_to_nm(self, mev: float) -> float:
         """Interpolate/extrapolate a depth from MeV to nm.
@@ -489,22 +581,15 @@ class LinearOptimization(opt.BaseOptimizer):
 
         self.optimize_by_area defines which result to get.
         """
-        # Make spectra the same size
-        optim_espe, measured_espe = gf.uniform_espe_lists(
-            optim_espe, self.measured_espe,
-            channel_width=self.element_simulation.channel_width)
+        measured_grid = self.get_measured_grid()
 
         # Find the area between simulated and measured energy spectra
         if self.optimize_by_area:
-            return mf.calculate_area(optim_espe, measured_espe)
+            return measured_grid.get_area(optim_espe)
 
         # Find the mean squared error between simulated and measured
         # energy spectra y values
-        diff = [(opt_p[1] - mesu_p[1])**2
-                for opt_p, mesu_p in zip(optim_espe, measured_espe)]
-        sum_diff = sum(diff) / len(diff)
-
-        return sum_diff
+        return measured_grid.get_mean_squared_error(optim_espe)
 
     def form_recoil(self, current_solution: "BaseSolution", name="") -> RecoilElement:
         """Create a recoil element based on given solution.
@@ -621,6 +706,12 @@ class LinearOptimization(opt.BaseOptimizer):
             recoil_elements = [self.form_recoil(sol, f"thread-{i}")
                                for i, sol in enumerate(solutions)]
 
+            if self.in_process_espe:
+                engine = self.get_espe_engine(
+                    self.element_simulation.optimization_recoils[0])
+                return [engine.calculate_spectrum(rec)
+                        for rec in recoil_elements]
+
             # TODO: Splitting the solutions over fewer threads (more than one
             #  solution per thread) may be slightly faster than this
             with ThreadPoolExecutor(max_workers=len(solutions)) as executor:
@@ -644,15 +735,26 @@ class LinearOptimization(opt.BaseOptimizer):
 
         return espes
 
-    def _run_solution(self, solution: "BaseSolution") -> Espe:
-        """Form a recoil based on the given solution and return its espe."""
+    def _run_solution(self, solution: "BaseSolution", name="") -> Espe:
+        """Form a recoil based on the given solution and return its espe.
+
+        Args:
+            solution: solution to run
+            name: name of the recoil. Solutions that are run at the same
+                time must have different names so that their recoil files
+                do not collide. Recoils with a name are not stored as
+                optimization recoils.
+        """
         if self.optimization_type is OptimizationType.RECOIL:
-            self.element_simulation.optimization_recoils = [
-                self.form_recoil(solution)
-            ]
+            recoil = self.form_recoil(solution, name)
+            if not name:
+                self.element_simulation.optimization_recoils = [recoil]
+
+            if self.in_process_espe:
+                return self.get_espe_engine(recoil).calculate_spectrum(recoil)
 
             espe, _ = self.element_simulation.calculate_espe(
-                self.element_simulation.optimization_recoils[0],
+                recoil,
                 verbose=self.verbose,
                 optimization_type=self.optimization_type,
                 ch=self.channel_width,
@@ -666,11 +768,10 @@ class LinearOptimization(opt.BaseOptimizer):
 
         return espe
 
-    # TODO: Unused, remove if not needed for fluence optimization
-    def evaluate_solution(self, solution: "BaseSolution") -> float:
+    def evaluate_solution(self, solution: "BaseSolution", name="") -> float:
         """Evaluate solution based on its difference from measured espe.
         """
-        espe = self._run_solution(solution)
+        espe = self._run_solution(solution, name)
 
         if self.optimization_type is OptimizationType.RECOIL:
             objective_value = self._get_spectra_difference(espe)
@@ -737,7 +838,7 @@ class LinearOptimization(opt.BaseOptimizer):
 
         return resized_x, resized_y
 
-    def _fit_simulation(self, solution: "BaseSolution"):
+    def _fit_simulation(self, solution: "BaseSolution", name=""):
         """Fit solution to simulation.
 
         Fitting scales peak and valley heights, and widens peaks.
@@ -745,11 +846,12 @@ class LinearOptimization(opt.BaseOptimizer):
 
         Args:
             solution: starting point for fitting. solution is mutated.
+            name: name of the recoil that is used to run the solution
 
         Returns:
             Fitted solution
         """
-        espe = self._run_solution(solution)
+        espe = self._run_solution(solution, name)
         espe_x, espe_y = split_espe(espe)
 
         resized_espe_x, resized_espe_y = self._resize_simulated_espe(espe_x, espe_y)
@@ -902,16 +1004,23 @@ class LinearOptimization(opt.BaseOptimizer):
 
         return solution_corrected
 
-    def _optimize(self) -> Tuple[SolutionOrStr, Optional[SolutionOrStr], Optional[str]]:
+    def _optimize(self, solution: Optional["BaseSolution"] = None, name=""
+                  ) -> Tuple[SolutionOrStr, Optional[SolutionOrStr], Optional[str]]:
         """Run _fit_simulation several times.
 
+        Args:
+            solution: starting solution. Defaults to self.solution.
+            name: name of the recoil that is used to run the solutions
+
         Returns:
             Solution or error message * 2, additional error message
         """
-        solution = copy.deepcopy(self.solution)
+        if solution is None:
+            solution = self.solution
+        solution = copy.deepcopy(solution)
 
         try:
-            optimized_middle = self._fit_simulation(solution)
+            optimized_middle = self._fit_simulation(solution, name)
         except (ValueError, IndexError) as e:
             return str(e), None, None
 
@@ -919,7 +1028,7 @@ class LinearOptimization(opt.BaseOptimizer):
         optimized_last_successful = None
         try:
             for i in range(self.fitting_iteration_count - 1):
-                optimized_last = self._fit_simulation(optimized_last)
+                optimized_last = self._fit_simulation(optimized_last, name)
                 optimized_last_successful = copy.deepcopy(optimized_last)
         except (ValueError, IndexError) as e:
             if optimized_last_successful is not None:
@@ -930,6 +1039,132 @@ class LinearOptimization(opt.BaseOptimizer):
 
         return optimized_middle, optimized_last, None
 
+    def _get_shape_optimizer(self, rec_type: str, sol_size: int
+                             ) -> "LinearOptimization":
+        """Returns a copy of the optimizer that fits solutions of the given
+        shape.
+
+        The copy shares the simulation, the MeV-to-nm conversion and the
+        in-process espe engine with this optimizer. Measured peaks and
+        valleys are found again for the number of peaks in the shape.
+
+        Args:
+            rec_type: recoil type of the shape
+            sol_size: solution size of the shape
+
+        Raises:
+            ValueError: if the measured espe does not have the peaks of the
+                shape
+
+        Returns:
+            LinearOptimization
+        """
+        optimizer = copy.copy(self)
+        optimizer.rec_type = rec_type
+        optimizer.sol_size = sol_size
+        optimizer.peak_count = 2 if rec_type == "two-peak" else 1
+        optimizer._find_measured_peaks()
+        optimizer._find_measured_valleys()
+        return optimizer
+
+    def _get_starting_solutions(
+            self) -> List[Tuple["LinearOptimization", "BaseSolution"]]:
+        """Returns self.solution and start_count - 1 other starting
+        solutions, each with the optimizer that fits it.
+
+        Other starting solutions are first formed from the shapes in
+        STARTING_SHAPES other than the one of this optimizer, in that
+        order. Shapes whose peaks are not found in the measured espe are
+        left out. Remaining starts scale the widths and heights of all
+        peaks of self.solution by the same factors. Variations that cannot
+        be fixed to fit the limits are left out.
+        """
+        starts = [(self, self.solution)]
+        for rec_type, sol_size in self.STARTING_SHAPES:
+            if len(starts) >= self.start_count:
+                return starts
+            if (rec_type, sol_size) == (self.rec_type, self.sol_size):
+                continue
+            try:
+                optimizer = self._get_shape_optimizer(rec_type, sol_size)
+                solution = optimizer.initialize_solution()
+                optimizer._fix_and_check_solution(solution)
+            except (ValueError, IndexError):
+                continue
+            starts.append((optimizer, solution))
+
+        factors = itertools.product((1.0, 0.75, 1.25), repeat=2)
+        next(factors)  # Skip (1.0, 1.0), which is self.solution
+        for width_factor, height_factor in factors:
+            if len(starts) >= self.start_count:
+                break
+            solution = copy.deepcopy(self.solution)
+            for peak in solution.peaks:
+                peak.scale_width(width_factor)
+                peak.scale_height(height_factor)
+            try:
+                self._fix_and_check_solution(solution)
+            except ValueError:
+                continue
+            starts.append((self, solution))
+        return starts
+
+    def _optimize_starting_solutions(
+            self, cancellation_token: Optional[CancellationToken] = None
+    ) -> Tuple["BaseSolution", SolutionOrStr, Optional[SolutionOrStr],
+               Optional[str], List[float]]:
+        """Runs _optimize for each starting solution in a thread pool.
+
+        All starts share the MeV-to-nm conversion that was computed in
+        _prepare_optimization. Each fit is scored by running the solution
+        that it returns: the last fitted solution, or the middle one if
+        the last fitting iteration failed.
+
+        Args:
+            cancellation_token: token for cancelling the optimization.
+                Starts that have not begun when cancellation is requested
+                are skipped.
+
+        Returns:
+            starting solution of the best fit, results of _optimize for the
+            best fit and objective values of all fits (inf for failed or
+            skipped fits)
+        """
+        if self.in_process_espe and \
+                self.optimization_type is OptimizationType.RECOIL:
+            # Create the engine before it is shared with the optimizers of
+            # other shapes and any worker threads need it
+            self.get_espe_engine(self.form_recoil(self.solution))
+        starts = self._get_starting_solutions()
+
+        def optimize(item: Tuple[int, Tuple["LinearOptimization",
+                                             "BaseSolution"]], _):
+            i, (optimizer, solution) = item
+            name = f"start-{i}"
+            results = optimizer._optimize(solution, name)
+            fitted = [sol for sol in results[1::-1] if hasattr(sol, "points")]
+            if not fitted:
+                return results, np.inf
+            try:
+                return results, optimizer.evaluate_solution(fitted[0], name)
+            except (ValueError, IndexError):
+                return results, np.inf
+
+        outcomes = concurrency.run_in_threads(
+            optimize, enumerate(starts),
+            cancellation_token=cancellation_token,
+            max_workers=self.max_workers)
+
+        objective_values = [
+            outcome[1] if outcome is not None else np.inf
+            for outcome in outcomes
+        ]
+        best = int(np.argmin(objective_values))
+        if outcomes[best] is None:
+            # Every start was skipped
+            return self.solution, "cancelled", None, None, objective_values
+        return (starts[best][1], *outcomes[best][0], objective_values)
+
     # TODO: Change starting_solutions to starting_solution
     def start_optimization(self, starting_solutions=None,
                            cancellation_token=None,
@@ -955,10 +1190,16 @@ class LinearOptimization(opt.BaseOptimizer):
 
         self.on_next(self._get_message(OptimizationState.RUNNING))
 
-        result1, result2, extra_message = self._optimize()
+        first_sol = self.solution
+        start_objective_values = None
+        if self.start_count > 1:
+            first_sol, result1, result2, extra_message, \
+                start_objective_values = self._optimize_starting_solutions(
+                    cancellation_token)
+        else:
+            result1, result2, extra_message = self._optimize()
         completed_msg = None
         if self.optimization_type is OptimizationType.RECOIL:
-            first_sol = self.solution
             med_sol = result1
             last_sol = result2
 
@@ -995,7 +1236,8 @@ class LinearOptimization(opt.BaseOptimizer):
         self.element_simulation.optimization_results_to_file(self.cut_file)
 
         self.on_completed(self._get_message(
-            OptimizationState.FINISHED, error=completed_msg))
+            OptimizationState.FINISHED, error=completed_msg,
+            start_objective_values=start_objective_values))
 
 
 class Peak:
@@ -1230,8 +1472,8 @@ class SolutionPeak10(BaseSolution):
                      prev_point=points[0], next_point=points[5])
         valley2 = Valley(ll=points[4], rl=points[5],
                          prev_point=points[3], next_point=points[6])
-        peak2 = Peak(ll=points[4], lh=points[5], rh=points[6], rl=points[7],
-                     prev_point=points[3], next_point=points[8])
+        peak2 = Peak(ll=points[5], lh=points[6], rh=points[7], rl=points[8],
+                     prev_point=points[4], next_point=points[9])
         valley3 = Valley(ll=points[8], rl=points[9],
                          prev_point=points[7], next_point=None)
 
@@ -29,6 +29,8 @@ __version__ = "2.0"
 
 import math
 
+import numpy as np
+
 from decimal import Decimal
 from typing import Tuple
 from shapely.geometry import Polygon
@@ -331,7 +333,7 @@ def _calculate_bin_count(lst, comp, min_count, max_count, data_sorted):
         raise ValueError("Minimum bin count was bigger than maximum")
     if comp <= 0:
         raise ValueError("Compression must be non-negative.")
-    if not lst:
+    if not len(lst):
         return int(min_count), None
 
     if data_sorted:
@@ -352,6 +354,8 @@ def _calculate_bin_count(lst, comp, min_count, max_count, data_sorted):
 def get_min_and_max(lst):
     """Returns both minimum and maximum values from a list.
     """
+    if isinstance(lst, np.ndarray):
+        return lst.min(), lst.max()
     return min(lst), max(lst)
 
 
@@ -383,6 +387,73 @@ def point_inside_polygon(point, poly):
     return inside
 
 
+def points_inside_polygon(x: np.ndarray, y: np.ndarray, poly) -> np.ndarray:
+    """Finds out which points (x, y) are inside a polygon "poly".
+
+    Vectorized ray casting for event data with integer valued y coordinates.
+    Each polygon edge crosses the rows y for which min(y1, y2) <= y <
+    max(y1, y2). Point is inside if an odd number of crossings in its row
+    are to the left of it and it is to the left of the rightmost crossing.
+
+    Args:
+        x: x coordinates of the points
+        y: integer y coordinates of the points
+        poly: polygon as a list of (x, y) pairs
+
+    Return:
+        boolean mask that is True for points inside the polygon
+    """
+    inside = np.zeros(len(x), dtype=bool)
+    if len(poly) < 2:
+        return inside
+
+    poly_x = [p[0] for p in poly]
+    poly_y = [p[1] for p in poly]
+    row_min = math.ceil(min(poly_y))
+    row_max = math.ceil(max(poly_y))
+    if row_min >= row_max:
+        return inside
+
+    # Calculate the crossings of each row
+    rows, crossings = [], []
+    p1x, p1y = poly[-1]
+    for p2x, p2y in poly:
+        if p1y != p2y:
+            edge_rows = np.arange(math.ceil(min(p1y, p2y)),
+                                  math.ceil(max(p1y, p2y)))
+            rows.append(edge_rows - row_min)
+            crossings.append(
+                (edge_rows - p1y) * (p2x - p1x) / (p2y - p1y) + p1x)
+        p1x, p1y = p2x, p2y
+    rows = np.concatenate(rows)
+    crossings = np.concatenate(crossings)
+
+    # Sort crossings by row and x, and pad them into a table with a row for
+    # each y coordinate
+    order = np.lexsort((crossings, rows))
+    rows, crossings = rows[order], crossings[order]
+    row_count = row_max - row_min
+    counts = np.bincount(rows, minlength=row_count)
+    row_starts = np.cumsum(counts) - counts
+    table = np.full((row_count, counts.max()), np.inf)
+    table[rows, np.arange(len(rows)) - row_starts[rows]] = crossings
+    x_max = np.full(row_count, -np.inf)
+    x_max[counts > 0] = table[counts > 0, counts[counts > 0] - 1]
+
+    # Only points within the bounding box can have crossings on both sides
+    candidates = np.flatnonzero(
+        (y >= row_min) & (y < row_max) &
+        (x > min(poly_x)) & (x < max(poly_x)))
+    cx, cy = x[candidates], y[candidates] - row_min
+
+    left_crossings = np.zeros(len(candidates), dtype=np.int64)
+    for column in table.T:
+        left_crossings += column[cy] < cx
+
+    inside[candidates] = (left_crossings % 2 == 1) & (cx < x_max[cy])
+    return inside
+
+
 def distance(p0, p1):
     """Distance between points
 
@@ -28,14 +28,14 @@ __author__ = "Severi Jääskeläinen \n Samuel Kaiponen \n Heta Rekilä \n" \
              "Sinikka Siironen \n Juhani Sundell"
 __version__ = "2.0"
 
+import os
 import platform
+import shutil
 import subprocess
 import re
-import multiprocessing
 import reactivex as rx
 
 from . import general_functions as gf
-from . import subprocess_utils as sutils
 from . import observing
 
 from typing import Optional
@@ -45,10 +45,15 @@ from typing import Mapping
 from typing import Any
 from pathlib import Path
 from reactivex import operators as ops
-from reactivex.scheduler import ThreadPoolScheduler
+from reactivex.subject import BehaviorSubject
 
 from .layer import Layer
 from .concurrency import CancellationToken
+from .recoil_element import RecoilElement
+from .ui_log_handlers import Logger
+from .process_supervisor import ProcessCancelledError
+from .process_supervisor import ProcessSupervisor
+from .process_supervisor import get_default_supervisor
 from .base import StrTuple
 
 
@@ -58,8 +63,8 @@ class MCERD:
     files it needs.
     """
     __slots__ = "_settings", "_rec_filename", "_filename", \
-                "recoil_file", "sim_dir", "result_file", "target_file", \
-                "command_file", "detector_file", "foils_file", \
+                "recoil_file", "sim_dir", "work_dir", "result_file", \
+                "target_file", "command_file", "detector_file", "foils_file", \
                 "presimulation_file", "_seed"
 
     # These are the keys that exist in the parsed output from MCERD
@@ -85,6 +90,9 @@ class MCERD:
     _FINAL_STARTS = "Opening target file "
     _FINAL_ENDS = "angave "
 
+    # Suffix of the working directories of MCERD processes
+    WORK_DIR_SUFFIX = ".mcerd"
+
     def __init__(self, seed: int, settings: Mapping, file_prefix: str,
                  optimize_fluence: bool = False):
         """Create an MCERD object.
@@ -98,12 +106,8 @@ class MCERD:
         self._seed = seed
         self._settings = settings
 
-        rec_elem = self._settings["recoil_element"]
-
-        if optimize_fluence:
-            self._rec_filename = f"{rec_elem.prefix}-optfl"
-        else:
-            self._rec_filename = rec_elem.get_full_name()
+        self._rec_filename = MCERD.get_recoil_filename(
+            self._settings["recoil_element"], optimize_fluence)
 
         self._filename = file_prefix
 
@@ -113,16 +117,69 @@ class MCERD:
 
         res_file = f"{self._rec_filename}.{self._seed}.erd"
 
-        # The recoil file and erd file are later passed to get_espe.
-        self.recoil_file = self.sim_dir / f"{self._rec_filename}.{suffix}"
+        # The erd file is later passed to get_espe.
         self.result_file = self.sim_dir / res_file
 
-        # These files will be deleted after the simulation
-        self.command_file = self.sim_dir / self._rec_filename
-        self.target_file = self.sim_dir / f"{self._filename}.erd_target"
-        self.detector_file = self.sim_dir / f"{self._filename}.erd_detector"
-        self.foils_file = self.sim_dir / f"{self._filename}.foils"
-        self.presimulation_file = self.sim_dir / f"{self._filename}.pre"
+        # Each process writes its input files into a working directory of
+        # its own so that processes can be started at the same time without
+        # overwriting each other's files. MCERD names its output files after
+        # the command file, so the erd file is also written there. The
+        # working directory is deleted after the simulation.
+        self.work_dir = self.sim_dir / \
+            f"{self._rec_filename}.{self._seed}{MCERD.WORK_DIR_SUFFIX}"
+        self.recoil_file = self.work_dir / f"{self._rec_filename}.{suffix}"
+        self.command_file = self.work_dir / self._rec_filename
+        self.target_file = self.work_dir / f"{self._filename}.erd_target"
+        self.detector_file = self.work_dir / f"{self._filename}.erd_detector"
+        self.foils_file = self.work_dir / f"{self._filename}.foils"
+        self.presimulation_file = self.work_dir / f"{self._filename}.pre"
+
+    @staticmethod
+    def get_recoil_filename(recoil_element: RecoilElement,
+                            optimize_fluence: bool = False) -> str:
+        """Returns the name that MCERD files of the recoil element start
+        with.
+
+        Args:
+            recoil_element: simulated recoil element
+            optimize_fluence: whether fluence is optimized or not
+        """
+        if optimize_fluence:
+            return f"{recoil_element.prefix}-optfl"
+        return recoil_element.get_full_name()
+
+    @staticmethod
+    def remove_stale_work_dirs(sim_dir: Path, recoil_element: RecoilElement,
+                               optimize_fluence: bool = False):
+        """Removes working directories that MCERD processes of the recoil
+        element have left in the simulation directory, for example because
+        Potku crashed while they were running. Erd files that were not
+        linked to the simulation directory are moved there first.
+
+        Must not be called while MCERD processes of the recoil element are
+        running.
+
+        Args:
+            sim_dir: simulation directory
+            recoil_element: simulated recoil element
+            optimize_fluence: whether fluence is optimized or not
+        """
+        rec_filename = MCERD.get_recoil_filename(
+            recoil_element, optimize_fluence)
+        prefix = f"{rec_filename}."
+        try:
+            work_dirs = list(sim_dir.iterdir())
+        except OSError:
+            return
+        for work_dir in work_dirs:
+            name = work_dir.name
+            seed = name[len(prefix):-len(MCERD.WORK_DIR_SUFFIX)]
+            if name.startswith(prefix) and \
+                    name.endswith(MCERD.WORK_DIR_SUFFIX) and \
+                    seed.isdigit() and work_dir.is_dir():
+                erd_file = f"{prefix}{seed}.erd"
+                _move_result_file(work_dir / erd_file, sim_dir / erd_file)
+                shutil.rmtree(work_dir, ignore_errors=True)
 
     def get_command(self) -> StrTuple:
         """Returns the command that is used to start the MCERD process.
@@ -135,60 +192,77 @@ class MCERD:
         return cmd, str(self.command_file)
 
     def run(self, print_output=True, ct: Optional[CancellationToken] = None,
-            poll_interval=10, first_check=0.2, max_time=None,
-            ct_check=0.2) -> rx.Observable:
+            max_time=None, ct_check=0.2, niceness=0,
+            supervisor: Optional[ProcessSupervisor] = None,
+            logger: Optional[Logger] = None) -> rx.Observable:
         """Starts the MCERD process.
 
         Args:
             print_output: whether MCERD output is also printed to console
             ct: token that is checked periodically to see if
                 the simulation should be stopped.
-            poll_interval: seconds between each check to see if the simulation
-                process is still running.
-            first_check: seconds until the first time mcerd is polled.
             max_time: maximum running time in seconds.
             ct_check: how often cancellation is checked in seconds.
+            niceness: how much the scheduling priority of the process is
+                lowered.
+            supervisor: ProcessSupervisor that runs the process. Defaults to
+                the supervisor that is shared by all MCERD processes.
+            logger: optional Logger entity used for logging
+
+        Raises:
+            FileExistsError: if the erd file already exists in the
+                simulation directory
 
         Return:
             observable stream where each item is a dictionary. All dictionaries
             contain the same keys.
         """
         # Create files necessary to run MCERD
-        self.create_mcerd_files()
-        cmd = self.get_command()
+        self.create_mcerd_files(logger)
         ct = ct or CancellationToken()
-
-        process = subprocess.Popen(
-            cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
-            cwd=gf.get_bin_dir() , universal_newlines=True)
-
-        errs = rx.from_iterable(iter(process.stderr.readline, ""))
-        outs = rx.from_iterable(iter(process.stdout.readline, ""))
-
-        is_running = MCERD.running_check(process, first_check, poll_interval)
-        ct_check = MCERD.cancellation_check(process, ct_check, ct)
-
-        if max_time is not None:
-            timeout = MCERD.timeout_check(process, max_time, ct)
-        else:
-            timeout = rx.empty()
-
-        thread_count = multiprocessing.cpu_count()
-        pool_scheduler = ThreadPoolScheduler(thread_count)
-
-        merged = rx.merge(errs, outs).pipe(
-             ops.subscribe_on(pool_scheduler),
-             MCERD.get_pipeline(
-                 self._seed, self._rec_filename, print_output=print_output),
-             ops.combine_latest(rx.merge(
-                 is_running, ct_check, timeout
-             )),
-             ops.starmap(lambda x, y: {
-                 **x, **y,
-                 MCERD.IS_RUNNING: x[MCERD.IS_RUNNING] and y[MCERD.IS_RUNNING]
-             }),
-             ops.take_while(lambda x: x[MCERD.IS_RUNNING], inclusive=True),
-         )
+        supervisor = supervisor or get_default_supervisor()
+
+        # Running status of the process. Updated when the process stops.
+        status = BehaviorSubject({MCERD.IS_RUNNING: True})
+
+        def stop(msg=None):
+            if msg is None:
+                status.on_next({MCERD.IS_RUNNING: False})
+            else:
+                status.on_next({MCERD.IS_RUNNING: False, MCERD.MSG: msg})
+            status.on_completed()
+
+        def handle_error(err, _):
+            if isinstance(err, ProcessCancelledError):
+                stop(MCERD.SIM_STOPPED)
+                return rx.empty()
+            if isinstance(err, subprocess.TimeoutExpired):
+                # Request cancellation so all simulation processes that
+                # share the same cancellation_token are also stopped.
+                ct.request_cancellation()
+                stop(MCERD.SIM_TIMEOUT)
+                return rx.empty()
+            if isinstance(err, subprocess.CalledProcessError):
+                err = subprocess.SubprocessError(
+                    f"MCERD stopped with an error code {err.returncode}.")
+            return rx.throw(err)
+
+        output = supervisor.run(
+            self.get_command(), cwd=gf.get_bin_dir(), ct=ct,
+            ct_check=ct_check, max_time=max_time, niceness=niceness)
+
+        merged = output.pipe(
+            MCERD.get_pipeline(
+                self._seed, self._rec_filename, print_output=print_output),
+            ops.do_action(on_completed=stop),
+            ops.catch(handle_error),
+            ops.combine_latest(status),
+            ops.starmap(lambda x, y: {
+                **x, **y,
+                MCERD.IS_RUNNING: x[MCERD.IS_RUNNING] and y[MCERD.IS_RUNNING]
+            }),
+            ops.take_while(lambda x: x[MCERD.IS_RUNNING], inclusive=True),
+        )
 
         # on_completed does not get called if the take_while condition is
         # inclusive so this is a quick fix to get the files deleted.
@@ -204,32 +278,6 @@ class MCERD:
                 on_completed=self.delete_unneeded_files)
         )
 
-    @staticmethod
-    def _stop_if_cancelled(
-            process: subprocess.Popen,
-            ct: CancellationToken) -> bool:
-        """Stops the process if cancellation has been requested. Returns
-        True if cancellation has not been requested and simulation is still
-        running, False otherwise.
-        """
-        if ct.is_cancellation_requested():
-            sutils.kill_process(process)
-            return False
-        return True
-
-    @staticmethod
-    def is_running(process: subprocess.Popen) -> bool:
-        """Checks if the given process is running. Raises SubprocessError if
-        the process returns an error code.
-        """
-        res = process.poll()
-        if res == 0:
-            return False
-        if res is None:
-            return True
-        raise subprocess.SubprocessError(
-            f"MCERD stopped with an error code {res}.")
-
     @staticmethod
     def get_pipeline(seed: int, name: str, print_output=False) -> rx.pipe:
         """Returns an rx pipeline that parses the raw output from MCERD
@@ -290,97 +338,19 @@ class MCERD:
             pass
         return ops.do_action(passer)
 
-    @staticmethod
-    def running_check(
-            process: subprocess.Popen,
-            first_check: float,
-            interval: float) -> rx.Observable:
-        """Periodically checks if the given process is running.
+    def create_mcerd_files(self, logger: Optional[Logger] = None):
+        """Creates the working directory and the temporary files needed for
+        running MCERD.
 
         Args:
-            process: process to be monitored
-            first_check: seconds until the first check
-            interval: interval between each check
+            logger: optional Logger entity used for logging
 
-        Return:
-            rx.Observable that fires dictionaries after each check
+        Raises:
+            FileExistsError: if the erd file already exists in the
+                simulation directory
         """
-        return rx.timer(first_check, interval).pipe(
-            # TODO change this to run at an increasing interval, i.e:
-            #       - first check after 0.0 seconds,
-            #       - second check after 0.2 seconds,
-            #       - third after 1.0, ... etc.
-            #   MCERD is likely to crash early (?) so it makes sense to
-            #   run the check more frequently at the beginning.
-            ops.map(lambda _: {
-                MCERD.IS_RUNNING: MCERD.is_running(process)
-            }),
-            ops.take_while(lambda x: x[MCERD.IS_RUNNING], inclusive=True)
-        )
-
-    @staticmethod
-    def cancellation_check(
-            process: subprocess.Popen,
-            interval: float,
-            ct: CancellationToken) -> rx.Observable:
-        """Kills the given process if cancellation is requested from the
-        CancellationToken.
-
-        Args:
-            process: process that will killed if cancellation is requested
-            interval: cancellation check interval in seconds
-            ct: CancellationToken that is being checked
-
-        Return:
-            rx.Observable that fires a single dictionary after cancellation is
-            requested
-        """
-        return rx.timer(0, interval).pipe(
-            ops.map(
-                lambda _: MCERD._stop_if_cancelled(process, ct)),
-            ops.first(lambda x: not x),
-            ops.map(lambda _: {
-                MCERD.IS_RUNNING: False,
-                MCERD.MSG: MCERD.SIM_STOPPED
-            }),
-        )
+        self.work_dir.mkdir(parents=True, exist_ok=True)
 
-    @staticmethod
-    def timeout_check(
-            process: subprocess.Popen,
-            timeout: float,
-            ct: CancellationToken) -> rx.Observable:
-        """Kills the given process after timeout has passed.
-
-        Args:
-            process: process to be killed
-            timeout: termination time in seconds
-            ct: CancellationToken
-
-        Return:
-            rx.Observable that fires only a single dictionary after the timeout
-            has passed.
-        """
-        return rx.timer(timeout).pipe(
-            ops.do_action(
-                # Request cancellation so all simulation processes that
-                # share the same cancellation_token are also stopped.
-                # TODO not working as intended if simulation is short enough
-                #   to stop before max_time has elapsed. Maybe let caller
-                #   implement its own timeout check when multiple processes
-                #   are being run.
-                on_next=lambda _: ct.request_cancellation()),
-            ops.map(lambda _: {
-                # sutils.kill_process returns None, which can be casted to bool
-                MCERD.IS_RUNNING: bool(sutils.kill_process(process)),
-                MCERD.MSG: MCERD.SIM_TIMEOUT
-            }),
-            ops.first()
-        )
-
-    def create_mcerd_files(self):
-        """Creates the temporary files needed for running MCERD.
-        """
         # Create the main MCERD command file
         with open(self.command_file, "w") as file:
             file.write(self.get_command_file_contents())
@@ -401,6 +371,56 @@ class MCERD:
         with open(self.recoil_file, "w") as file:
             file.write(self.get_recoil_file_contents())
 
+        self._link_result_file(logger)
+
+    def get_work_result_file(self) -> Path:
+        """Returns the path of the erd file that MCERD writes in the working
+        directory.
+        """
+        return self.work_dir / self.result_file.name
+
+    def _link_result_file(self, logger: Optional[Logger] = None):
+        """Creates the erd file in the working directory and links it to the
+        simulation directory, so that results can be read while MCERD is
+        running.
+
+        A hard link is used if the file system supports it and a symbolic
+        link otherwise. If neither can be created, the file is only moved to
+        the simulation directory after MCERD has finished and the failure is
+        logged.
+
+        Args:
+            logger: optional Logger entity used for logging
+
+        Raises:
+            FileExistsError: if the erd file already exists in the
+                simulation directory
+        """
+        if self.result_file.exists() or self.result_file.is_symlink():
+            raise FileExistsError(
+                f"Result file {self.result_file} already exists.")
+        work_result_file = self.get_work_result_file()
+        work_result_file.touch()
+        try:
+            os.link(work_result_file, self.result_file)
+            return
+        except FileExistsError:
+            raise
+        except OSError:
+            pass
+        try:
+            self.result_file.symlink_to(
+                Path(self.work_dir.name, work_result_file.name))
+            return
+        except FileExistsError:
+            raise
+        except OSError as e:
+            msg = f"Could not link {work_result_file} to the simulation " \
+                  f"directory: {e}. Observed atoms are counted when " \
+                  f"the simulation has finished."
+        if logger is not None:
+            logger.log_error(msg)
+
     def get_recoil_file_contents(self) -> str:
         """Returns the contents of the recoil file.
         """
@@ -509,21 +529,29 @@ class MCERD:
         return "\n".join(cont)
 
     def delete_unneeded_files(self):
-        """Delete mcerd files that are not needed anymore.
+        """Moves the erd file to the simulation directory if it was not
+        hard linked there and deletes the working directory.
         """
-        # FIXME should only be called after the last process ends,
-        #   otherwise may remove files generated for other processes.
-        #   In that case GUI will show message
-        #       "MCERD stopped with an error code 10"
-        #   and console print may say something like:
-        #       "Fatal error: Could not open the target description file"
-        gf.remove_files(
-            self.command_file, self.detector_file, self.target_file,
-            self.foils_file)
-
-        gf.remove_matching_files(
-            self.sim_dir, exts={".out", ".dat", ".range", ".pre"},
-            filter_func=lambda f: f.startswith(self._rec_filename))
+        _move_result_file(self.get_work_result_file(), self.result_file)
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+
+
+def _move_result_file(work_result_file: Path, result_file: Path):
+    """Moves an erd file from a working directory to the simulation
+    directory, replacing a symbolic link to it. Nothing is done if the file
+    is already hard linked to the simulation directory or another file
+    exists there.
+    """
+    if not work_result_file.exists():
+        return
+    if not result_file.is_symlink() and result_file.exists():
+        # Either a hard link to the file or some other file that must not
+        # be overwritten
+        return
+    try:
+        os.replace(work_result_file, result_file)
+    except OSError:
+        pass
 
 
 _pattern = re.compile(r"Calculated (?P<calculated>\d+) of (?P<total>\d+) ions "
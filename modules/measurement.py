@@ -46,8 +46,10 @@ from typing import Tuple
 
 from . import general_functions as gf
 from . import file_paths as fpaths
+from . import event_store
 from .cut_file import CutFile
 from .detector import Detector
+from .event_store import EventStore
 from .profile import Profile
 from .run import Run
 from .target import Target
@@ -256,7 +258,7 @@ class Measurement(MeasurementLogger, Serializable):
                 "measurement_setting_file_description", "serial_number", \
                 "measurement_setting_modification_time", "data", \
                 "measurement_file", "directory", "use_request_settings", \
-                "selector"
+                "selector", "__saved_cuts", "__saved_cuts_events"
 
     DIRECTORY_PREFIX = "Measurement_"
 
@@ -304,7 +306,11 @@ class Measurement(MeasurementLogger, Serializable):
         self.measurement_setting_modification_time = \
             measurement_setting_modification_time
 
-        self.data = []
+        self.data = EventStore.empty()
+        # Cut files written by save_cuts and the selections they were
+        # written from
+        self.__saved_cuts = {}
+        self.__saved_cuts_events = None
 
         self.serial_number = 0
         self.directory = self.path.parent
@@ -661,27 +667,20 @@ class Measurement(MeasurementLogger, Serializable):
         file_name = file_path.name
         new_path = self.get_data_dir() / file_name
         shutil.copyfile(file_path, new_path)
+        event_store.remove_cache_file(new_path)
 
     def load_data(self):
-        """Loads measurement data from filepath
+        """Loads measurement data from filepath. Events are read from a
+        binary cache file if the .asc file has not changed since it was last
+        loaded.
         """
-        n = 0
         try:
             filename = Path(self.measurement_file)
 
             measurement_name, extension = filename.stem, filename.suffix.lower()
             if extension == ".asc":
                 file_to_open = self.get_data_dir() / f"{measurement_name}.asc"
-                with file_to_open.open("r") as fp:
-                    for line in fp:
-                        n += 1  # Event number
-                        split = line.split()
-                        split_len = len(split)
-                        if split_len == 2:  # At least two columns
-                            self.data.append([int(split[0]), int(split[1]), n])
-                        if split_len == 3:
-                            self.data.append([int(split[0]), int(split[1]),
-                                              int(split[2]), n])
+                self.data = event_store.load_asc_file(file_to_open)
             self.selector.measurement = self
         except IOError as e:
             error_log = "Error while loading the measurement date for the " \
@@ -865,51 +864,84 @@ class Measurement(MeasurementLogger, Serializable):
 
     def save_cuts(self, progress=None):
         """Save cut files
-        
+
         Saves data points within selections into cut files.
+
+        Only selections that have changed since the previous call are cut
+        again. Cut files of unchanged selections are left as they are and
+        cut files that no longer belong to any selection are removed.
         """
         if self.selector.is_empty():
             self.__remove_old_cut_files()
+            self.__saved_cuts = {}
             # Remove .selections file
             selection_file = self.get_data_dir() / f"{self.name}.selections"
             gf.remove_files(selection_file)
             return 0
 
-        self.__make_directories(self.get_cuts_dir())
+        cuts_dir = self.get_cuts_dir()
+        self.__make_directories(cuts_dir)
 
         starttime = time.time()
 
-        self.__remove_old_cut_files()
-
-        # Initializes the list size to match the number of selections.
-        points_in_selection = [[] for _ in range(self.selector.count())]
-
-        for i, selection in enumerate(self.selector.selections):
-            points_in_selection[i] = selection.fast_points_inside(self.data)
-            if progress is not None:
-                progress.report(i / len(self.selector.selections) * 80)
-
-        #print(points_in_selection[0])
+        if progress is not None:
+            sub_progress = progress.get_sub_reporter(lambda x: 0.8 * x)
+        else:
+            sub_progress = None
+        masks = self.selector.get_masks(progress=sub_progress)
 
         self.selector.update_selection_beams()
         self.selector.auto_save()
 
-        # Save all found data points into appropriate element cut files
-        # Firstly clear old cut files so those won't be accidentally
-        # left there.
         if progress is not None:
             progress.report(80)
 
-        content_length = len(points_in_selection)
-        for i, points in enumerate(points_in_selection):
-            if points:  # If not empty selection -> save
+        if self.data is not self.__saved_cuts_events:
+            self.__saved_cuts = {}
+            self.__saved_cuts_events = self.data
+
+        # Cut files are numbered in the order of the selections that have
+        # the same element and type.
+        saved_cuts = {}
+        element_counts = {}
+        changed = False
+        content_length = len(masks)
+        for i, mask in enumerate(masks):
+            if mask.any():  # If not empty selection -> save
                 selection = self.selector.get_at(i)
-                cut_file = CutFile(self.get_cuts_dir())
-                cut_file.set_info(selection, points)
-                cut_file.save()
+                label = str(selection.element), selection.type, \
+                    str(selection.element_scatter)
+                key = selection.get_vertex_key(), selection.weight_factor
+                element_count = element_counts.get(label, 0)
+                element_counts[label] = element_count + 1
+
+                old_key, file = self.__saved_cuts.get(
+                    (label, element_count), (None, None))
+                if old_key != key or not file.exists():
+                    cut_file = CutFile(cuts_dir)
+                    cut_file.set_info(selection, self.data.rows(mask))
+                    cut_file.save(element_count, overwrite=True)
+                    file = cut_file.get_file_path(element_count)
+                    changed = True
+                if file is not None:
+                    saved_cuts[label, element_count] = key, file
             if progress is not None:
                 progress.report(80 + (i / content_length) * 0.2)
 
+        # Remove cut files of selections that were removed or renamed
+        saved_files = {file for _, file in saved_cuts.values()}
+        old_files = [
+            file for file in self._get_cut_files(cuts_dir)
+            if file not in saved_files
+        ]
+        if old_files:
+            gf.remove_files(*old_files)
+            changed = True
+        if changed:
+            # Element loss splits are made from the cut files
+            gf.remove_matching_files(self.get_changes_dir(), exts={".cut"})
+        self.__saved_cuts = saved_cuts
+
         if progress is not None:
             progress.report(100)
 
@@ -917,9 +949,14 @@ class Measurement(MeasurementLogger, Serializable):
         self.log(log_msg)
 
     def save_single_cut(self, selection, progress=None):
-        """Save cut files
+        """Save cut files after a single selection has been added or edited.
 
-        Saves data points within selections into cut files.
+        Only the cut file of the given selection is written again (see
+        save_cuts).
+
+        Args:
+            selection: Selection object that was changed
+            progress: ProgressReporter object
         """
         if self.selector.is_empty():
             # Remove .selections file
@@ -927,28 +964,9 @@ class Measurement(MeasurementLogger, Serializable):
             gf.remove_files(selection_file)
             return 0
 
-        self.__make_directories(self.get_cuts_dir())
-
         starttime = time.time()
 
-        points_in_selection = selection.fast_points_inside(self.data)
-
-        self.selector.update_selection_beams()
-        self.selector.auto_save()
-
-        # Save all found data points into appropriate element cut files
-        # Firstly clear old cut files so those won't be accidentally
-        # left there.
-        if progress is not None:
-            progress.report(80)
-
-        if points_in_selection:  # If not empty selection -> save
-            cut_file = CutFile(self.get_cuts_dir())
-            cut_file.set_info(selection, points_in_selection)
-            cut_file.save()
-
-        if progress is not None:
-            progress.report(100)
+        self.save_cuts(progress=progress)
 
         log_msg = f"Saving single cut finished in {time.time() - starttime} seconds."
         self.log(log_msg)
@@ -24,15 +24,18 @@ __version__ = "2.0"
 import collections
 import os
 import subprocess
+import tempfile
+import threading
 from pathlib import Path
 from timeit import default_timer as timer
-from typing import Tuple, List, Union
+from typing import Tuple, List, Optional, Union
 
 import numpy as np
+from scipy.interpolate import RBFInterpolator
 
 from . import general_functions as gf
-from . import math_functions as mf
 from . import optimization as opt
+from . import concurrency
 from .concurrency import CancellationToken
 from .element_simulation import ElementSimulation
 from .enums import IonDivision
@@ -67,7 +70,10 @@ class Nsgaii(opt.BaseOptimizer):
                  stop_percent=0.3, check_time=20, ch=0.025,
                  measurement=None, cut_file=None, dis_c=20,
                  dis_m=20, check_max=900, check_min=0, skip_simulation=False,
-                 use_efficiency=False, optimize_by_area=False, verbose=False):
+                 use_efficiency=False, optimize_by_area=False, verbose=False,
+                 in_process_espe=False, max_workers=None, cache_size=1024,
+                 convergence_tolerance=1e-4, convergence_generations=10,
+                 surrogate_factor=None):
 
         """
         Initialize the NSGA-II optimizer.
@@ -84,6 +90,21 @@ class Nsgaii(opt.BaseOptimizer):
             dis_c: Distribution index for crossover. When this is big,
                 a new solution is close to its parents.
             dis_m: Distribution for mutation.
+            max_workers: Maximum number of solutions that are evaluated in
+                parallel. Defaults to the number of CPUs.
+            cache_size: Maximum number of objective values that are cached
+                so that repeated solutions are not evaluated again.
+            convergence_tolerance: Optimization is stopped before all
+                evaluations are done if the hypervolume of the Pareto front
+                has not improved relatively more than this in
+                convergence_generations generations. If None, all
+                evaluations are always done.
+            convergence_generations: Number of generations used in the
+                convergence check.
+            surrogate_factor: If given, this many times more offspring
+                are generated in each generation, and a surrogate model
+                fitted on the evaluated solutions picks which of them are
+                evaluated.
         """
         # TODO separate the two optimization types into two classes
         # Observable.__init__(self)
@@ -105,12 +126,26 @@ class Nsgaii(opt.BaseOptimizer):
             skip_simulation=skip_simulation,
             use_efficiency=use_efficiency,
             verbose=verbose,
-            optimize_by_area=optimize_by_area
+            optimize_by_area=optimize_by_area,
+            in_process_espe=in_process_espe
         )
 
         self.evaluations = gen * pop_size
         self.pop_size = pop_size
         self.sol_size = sol_size  # TODO: Move to BaseOptimizer?
+        self.max_workers = max_workers
+
+        # Objective values of evaluated solutions, least recently used first
+        self.cache_size = cache_size
+        self._objective_cache = collections.OrderedDict()
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+        self.convergence_tolerance = convergence_tolerance
+        self.convergence_generations = convergence_generations
+
+        self.surrogate_factor = surrogate_factor
+        self.surrogate = None
 
         # Crossover and mutation parameters
         self.cross_p = cross_p
@@ -122,6 +157,9 @@ class Nsgaii(opt.BaseOptimizer):
         self.bit_length_y = 0
 
         self.population = None
+        # Fluence and simulated spectrum that spectra of fluence solutions
+        # are scaled from
+        self._fluence_espe = None
 
     def _prepare_optimization(
             self, initial_pop=None, cancellation_token=None,
@@ -135,6 +173,10 @@ class Nsgaii(opt.BaseOptimizer):
                 "Optimization could not be prepared, no measurement defined.")
 
         self.element_simulation.optimized_fluence = None
+        self._fluence_espe = None
+        self._objective_cache.clear()
+        self.cache_hits = 0
+        self.cache_misses = 0
 
         self.prepare_measured_spectra()
 
@@ -162,7 +204,15 @@ class Nsgaii(opt.BaseOptimizer):
         if not self._skip_simulation:
             self.run_initial_simulation(cancellation_token, ion_division)
 
-        self.population = self.evaluate_solutions(initial_pop)
+        self.population = self.evaluate_solutions(
+            initial_pop, cancellation_token=cancellation_token)
+
+        if self.surrogate_factor is not None and self.surrogate_factor > 1:
+            self.surrogate = SurrogateModel()
+            self.surrogate.add(*self.population)
+            self.surrogate.fit()
+        else:
+            self.surrogate = None
 
     @staticmethod
     def crowding_distance(
@@ -181,99 +231,212 @@ class Nsgaii(opt.BaseOptimizer):
         pop_obj = np.array(objective_values)
         n, m = np.shape(pop_obj)
         crowd_dis = np.zeros(n)
+        front_no = np.asarray(front_no)
         # Get all front numbers.
         front_unique = np.unique(front_no)
         fronts = front_unique[front_unique != np.inf]
-        for f in range(len(fronts)):
-            # All the indices corresponding to solutions belonging to front f
-            front = np.array(
-                [k for k in range(len(front_no)) if front_no[k] == fronts[f]])
+        for front_number in fronts:
+            # All the indices corresponding to solutions belonging to the front
+            front = np.flatnonzero(front_no == front_number)
             # Find min and max values for objective functions
             f_max = pop_obj[front, :].max(0)
             f_min = pop_obj[front, :].min(0)
             for i in range(m):
                 # Sort the front's solutions according to its ith objective.
-                # rank[i] tells the index in front -> front[rank[i]] tells the
-                # index in pop_obj
                 rank = np.argsort(pop_obj[front, i])
+                sorted_front = front[rank]
                 # Current front's first and last get infinitive crowding
                 # distance values
-                crowd_dis[front[rank[0]]] = np.inf
-                crowd_dis[front[rank[-1]]] = np.inf
-                for j in range(1, len(front) - 1):
-                    ind_pop = front[rank[j]]
-                    ind_front_next = front[rank[j + 1]]
-                    ind_front_prev = front[rank[j - 1]]
-                    # Normalize the objective function values
-                    dist = pop_obj[(ind_front_next, i)] - \
-                           pop_obj[(ind_front_prev, i)]
-                    if dist == 0:
-                        current_distance = 0
-                    else:
-                        # TODO raises RuntimeWarning here if simulation time
-                        #  outs before presim ends
-                        current_distance = dist / (f_max[i] - f_min[i])
-                    crowd_dis[ind_pop] = crowd_dis[ind_pop] + current_distance
+                crowd_dis[sorted_front[0]] = np.inf
+                crowd_dis[sorted_front[-1]] = np.inf
+                # Normalized distances between the neighbours of each
+                # solution
+                values = pop_obj[sorted_front, i]
+                dist = values[2:] - values[:-2]
+                with np.errstate(divide="ignore", invalid="ignore"):
+                    current_distance = np.where(
+                        dist == 0, 0, dist / (f_max[i] - f_min[i]))
+                crowd_dis[sorted_front[1:-1]] += current_distance
         return crowd_dis
 
-    def evaluate_solutions(self, sols: List[Solution]) \
+    def evaluate_solutions(
+            self, sols: List[Solution],
+            cancellation_token: Optional[CancellationToken] = None) \
             -> Tuple[PopulationNp, List[ObjectiveValues]]:
         """
         Calculate objective function values for given solutions.
 
+        Objective values are cached by the rounded solution and the ERD
+        files it is evaluated against, so solutions that have already been
+        evaluated are not simulated again. Recoil solutions are evaluated in
+        parallel by running get_espe in a pool of at most max_workers
+        threads.
+
         Args:
              sols: List of solutions.
+             cancellation_token: CancellationToken that is checked before
+                each solution is evaluated. Solutions that are not evaluated
+                get the objective values of a failed evaluation.
 
         Return:
             Solutions and their objective function values.
         """
-        objective_values = []
         if self.optimization_type is OptimizationType.RECOIL:
             self.element_simulation.optimization_recoils = [
                 self.form_recoil(solution) for solution in sols
             ]
+            candidates = self.element_simulation.optimization_recoils
+            # Recoils are compared by the distribution given to get_espe
+            keys = [tuple(recoil.get_mcerd_params()) for recoil in candidates]
+        else:
+            # Round solution appropriately
+            candidates = [
+                gf.round_value_by_four_biggest(solution[0])
+                for solution in sols
+            ]
+            keys = list(candidates)
+        fingerprint = self._get_erd_fingerprint()
+        keys = [(fingerprint, key) for key in keys]
+
+        # Cached values are looked up before new ones are added so that they
+        # cannot be evicted in between
+        results = {}
+        uncached = {}
+        for key, candidate in zip(keys, candidates):
+            if key in results or key in uncached:
+                self.cache_hits += 1
+            elif key in self._objective_cache:
+                self._objective_cache.move_to_end(key)
+                results[key] = self._objective_cache[key]
+                self.cache_hits += 1
+            else:
+                uncached[key] = candidate
+                self.cache_misses += 1
 
-            for recoil in self.element_simulation.optimization_recoils:
-                # Run get_espe
-                espe, _ = self.element_simulation.calculate_espe(
-                    recoil, verbose=self.verbose,
-                    optimization_type=self.optimization_type,
-                    ch=self.channel_width, write_to_file=False)
-                objective_values.append(self.get_objective_values(espe))
+        new_values = self._evaluate_candidates(
+            list(uncached.values()), cancellation_token=cancellation_token)
+        for key, values in zip(uncached, new_values):
+            results[key] = values
+            self._cache_objective_values(key, values)
 
-        else:  # Evaluate fluence
-            recoil = self.element_simulation.get_main_recoil()
-            for solution in sols:
-                # Round solution appropriately
-                sol_fluence = gf.round_value_by_four_biggest(solution[0])
-                # Run get_espe
-                espe, _ = self.element_simulation.calculate_espe(
-                    recoil, optimization_type=self.optimization_type,
-                    ch=self.channel_width, fluence=sol_fluence,
-                    write_to_file=False)
-                objective_values.append(self.get_objective_values(espe))
+        objective_values = [results[key] for key in keys]
 
         pop = collections.namedtuple("Population",
                                      ("solutions", "objective_values"))
         return pop(sols, objective_values)
 
-    def _get_spectra_differences(self, optim_espe: Espe) -> Tuple[float, float]:
-        # Make spectra the same size
-        optim_espe, measured_espe = gf.uniform_espe_lists(
-            optim_espe, self.measured_espe,
-            channel_width=self.element_simulation.channel_width)
+    def _evaluate_candidates(
+            self, candidates: List[Union[RecoilElement, float]],
+            cancellation_token: Optional[CancellationToken] = None) \
+            -> List[ObjectiveValues]:
+        """Returns the objective values of recoils or fluences.
+        """
+        if self.optimization_type is not OptimizationType.RECOIL:
+            return [
+                self.get_objective_values(self.get_fluence_espe(fluence))
+                for fluence in candidates
+            ]
+        if self.in_process_espe:
+            return [
+                self.get_objective_values(
+                    self.get_espe_engine(recoil).calculate_spectrum(recoil))
+                for recoil in candidates
+            ]
+        return self._evaluate_recoils_in_parallel(
+            candidates, cancellation_token=cancellation_token)
 
-        # Find the area between simulated and measured energy
-        # spectra
-        area = mf.calculate_area(optim_espe, measured_espe)
+    def _get_erd_fingerprint(self) -> Tuple[Tuple[str, int, int], ...]:
+        """Returns the names, sizes and modification times of the ERD
+        files that solutions are evaluated against.
+        """
+        pattern = self.element_simulation.get_espe_erd_file_pattern(
+            self.optimization_type)
+        fingerprint = []
+        for erd_file in sorted(pattern.parent.glob(pattern.name)):
+            try:
+                stat = erd_file.stat()
+            except OSError:
+                continue
+            fingerprint.append((erd_file.name, stat.st_size, stat.st_mtime_ns))
+        return tuple(fingerprint)
+
+    def _cache_objective_values(
+            self, key: tuple, objective_values: ObjectiveValues) -> None:
+        """Caches objective values and removes the least recently used
+        values if the cache is full. Failed evaluations are not cached.
+        """
+        if self.cache_size <= 0 or np.all(np.isinf(objective_values)):
+            return
+        self._objective_cache[key] = objective_values
+        self._objective_cache.move_to_end(key)
+        while len(self._objective_cache) > self.cache_size:
+            self._objective_cache.popitem(last=False)
+
+    def _evaluate_recoils_in_parallel(
+            self, recoils: List[RecoilElement],
+            cancellation_token: Optional[CancellationToken] = None) \
+            -> List[ObjectiveValues]:
+        """Runs get_espe for each recoil in a thread pool and returns
+        their objective values in the same order as the recoils.
+
+        Recoils have the same names, so each worker thread writes its recoil
+        files into a temporary directory of its own.
+        """
+        with tempfile.TemporaryDirectory(prefix="potku-nsgaii-") as tmp_dir:
+            workers = threading.local()
+
+            def evaluate(recoil: RecoilElement, _) -> ObjectiveValues:
+                if not hasattr(workers, "directory"):
+                    workers.directory = Path(tempfile.mkdtemp(dir=tmp_dir))
+                espe, _ = self.element_simulation.calculate_espe(
+                    recoil, verbose=self.verbose,
+                    optimization_type=self.optimization_type,
+                    ch=self.channel_width, write_to_file=False,
+                    remove_recoil_file=True, recoil_dir=workers.directory)
+                return self.get_objective_values(espe)
+
+            objective_values = concurrency.run_in_threads(
+                evaluate, recoils, cancellation_token=cancellation_token,
+                max_workers=self.max_workers)
+
+        # Recoils that were skipped due to cancellation
+        return [
+            values if values is not None else self.get_objective_values([])
+            for values in objective_values
+        ]
+
+    def get_fluence_espe(self, fluence: float) -> Espe:
+        """Returns the simulated spectrum of the main recoil for the given
+        fluence.
+
+        Counts of the simulated spectrum are proportional to the fluence and
+        ERD files do not change during fluence optimization, so get_espe is
+        only run for the first fluence. Spectra of other fluences are scaled
+        from it.
+
+        Args:
+            fluence: fluence of the spectrum
 
-        # Find the mean squared error between simulated and measured
-        # energy spectra y values
-        diff = [(opt_p[1] - mesu_p[1])**2
-                for opt_p, mesu_p in zip(optim_espe, measured_espe)]
-        sum_diff = sum(diff) / len(diff)
+        Return:
+            simulated spectrum
+        """
+        if self._fluence_espe is None:
+            recoil = self.element_simulation.get_main_recoil()
+            espe, _ = self.element_simulation.calculate_espe(
+                recoil, optimization_type=self.optimization_type,
+                ch=self.channel_width, fluence=fluence,
+                write_to_file=False)
+            if not espe:
+                return espe
+            self._fluence_espe = fluence, espe
+        reference_fluence, espe = self._fluence_espe
+        factor = fluence / reference_fluence
+        return [(x, y * factor) for x, y in espe]
 
-        return area, sum_diff
+    def _get_spectra_differences(self, optim_espe: Espe) -> Tuple[float, float]:
+        # Find the area and the mean squared error between simulated and
+        # measured energy spectra
+        return self.get_measured_grid().get_differences(optim_espe)
 
     def get_objective_values(self, optim_espe: Espe) -> Tuple[float, float]:
         """Calculates the objective values and returns them as a np.array.
@@ -701,55 +864,26 @@ class Nsgaii(opt.BaseOptimizer):
         if r_n == np.inf:
             r_n = n
         # Coded according to algorithm given by Deb(2002)
-        # Go through all solutions
         front_no = np.inf * np.ones(n)
-        fronts = 0
-        front_1 = []  # Holds pop_obj and index in one element
-        added_solutions = 0
-        s_i = [i for i in range(n)]  # s_p holds pop_obj and its index in one
-        # element
-        n_i = np.zeros(n)
-        # front_no, pop_obj and s_i plus n_i -> all have corresponding indices
-        for i in range(len(pop_obj)):
-            p = pop_obj[i]
-            s_p = []
-            n_p = 0
-            for h in range(len(pop_obj)):
-                q = pop_obj[h]
-                if np.array_equal(p, q):
-                    continue
-                if opt.dominates(p, q):
-                    s_p.append((q, h))
-                elif opt.dominates(q, p):
-                    n_p += 1
-            if n_p == 0:
-                front_no[i] = 1
-                front_1.append((p, i))
-                added_solutions += 1
-            s_i[i] = s_p
-            n_i[i] = n_p
-        fronts += 1
-
-        current_front = front_1
+        # dominated[i, j] tells if solution i dominates solution j
+        dominated = opt.dominance_matrix(pop_obj)
+        # Number of solutions that dominate each solution
+        n_i = dominated.sum(axis=0)
+
+        current_front = n_i == 0
+        front_no[current_front] = 1
+        added_solutions = np.count_nonzero(current_front)
+        fronts = 1
         f_n = 1
-        while current_front:
+        while np.any(current_front):
             if added_solutions >= r_n:
                 break
-            new_front = []
-            for j in range(len(current_front)):
-                p = current_front[j]
-                p_i = p[1]
-                s_p = s_i[p_i]
-                for k in range(len(s_p)):
-                    q = s_p[k][0]
-                    index = s_p[k][1]
-                    n_q = n_i[index]
-                    n_q -= 1
-                    n_i[index] = n_q
-                    if n_q == 0:
-                        front_no[index] = f_n + 1
-                        new_front.append((q, index))
-                        added_solutions += 1
+            # Solutions that are dominated by the current front
+            dominated_by_front = dominated[current_front]
+            n_i = n_i - dominated_by_front.sum(axis=0)
+            new_front = (n_i == 0) & np.any(dominated_by_front, axis=0)
+            front_no[new_front] = f_n + 1
+            added_solutions += np.count_nonzero(new_front)
             f_n += 1
             current_front = new_front
             fronts += 1
@@ -798,6 +932,54 @@ class Nsgaii(opt.BaseOptimizer):
 
         return next_pop, front_no[index], crowd_dis[index]
 
+    def prescreen_offspring(self, pop_sols: PopulationNp,
+                            offspring: PopulationNp) -> PopulationNp:
+        """Generates more offspring and picks the ones whose objective
+        values predicted by the surrogate model are the best.
+
+        Args:
+            pop_sols: Solutions that are used to create offspring population.
+            offspring: Offspring that has already been generated.
+
+        Return:
+            Offspring of size self.pop_size.
+        """
+        if not self.surrogate.is_fitted():
+            return offspring
+        candidates = np.vstack([offspring] + [
+            self.variation(pop_sols)
+            for _ in range(self.surrogate_factor - 1)
+        ])
+        predicted = self.surrogate.predict(candidates)
+        selected, _, _ = self.new_population_selection(
+            [candidates, predicted], self.pop_size)
+        return selected[0]
+
+    def update_surrogate(self, sols: PopulationNp,
+                         objective_values: List[ObjectiveValues]) \
+            -> Optional[float]:
+        """Adds evaluated solutions to the surrogate model and fits it
+        again. The accuracy of the previous fit on the solutions is logged.
+
+        Args:
+            sols: Evaluated solutions.
+            objective_values: Objective values of the solutions.
+
+        Return:
+            Relative error of the surrogate model on the solutions or None
+            if the model was not used.
+        """
+        if self.surrogate is None:
+            return None
+        error = self.surrogate.get_error(sols, objective_values)
+        self.surrogate.add(sols, objective_values)
+        self.surrogate.fit()
+        if error is not None and self.element_simulation.simulation \
+                is not None:
+            self.element_simulation.simulation.log(
+                f"Optimization surrogate model relative error: {error:.3f}")
+        return error
+
     def start_optimization(
             self, starting_solutions: List[Solution] = None,
             cancellation_token: CancellationToken = None,
@@ -839,6 +1021,9 @@ class Nsgaii(opt.BaseOptimizer):
         # crowding distance. crowd_dis is still needed when initial population
         # is joined with the offspring population.
         crowd_dis = self.crowding_distance(front_no, self.population[1])
+        convergence = ConvergenceMonitor(
+            self.convergence_tolerance, self.convergence_generations)
+        convergence.update(self.population[1][front_no == 1, :])
         # In a loop until number of evaluations is reached:
         evaluations = self.evaluations
         while evaluations > 0:
@@ -868,6 +1053,8 @@ class Nsgaii(opt.BaseOptimizer):
                 # FIXME using automatically adjusted upper limit for x may
                 #  cause an IndexError here. Find out why and handle it properly
                 offspring = self.variation(pool[0])
+                if self.surrogate is not None:
+                    offspring = self.prescreen_offspring(pool[0], offspring)
             except IndexError as e:
                 self.on_error(self._get_message(
                     OptimizationState.FINISHED,
@@ -875,7 +1062,13 @@ class Nsgaii(opt.BaseOptimizer):
                 self.clean_up(cancellation_token)
                 return
             # Evaluate offspring solutions to get offspring population
-            offspring_pop = self.evaluate_solutions(offspring)
+            offspring_pop = self.evaluate_solutions(
+                offspring, cancellation_token=cancellation_token)
+            if cancellation_token is not None and \
+                    cancellation_token.is_cancellation_requested():
+                # Offspring may not have been fully evaluated
+                break
+            surrogate_error = self.update_surrogate(*offspring_pop)
             # Join parent population and offspring population
             joined_sols = np.vstack((self.population[0], offspring_pop[0]))
             joined_objs = np.vstack((self.population[1], offspring_pop[1]))
@@ -891,11 +1084,17 @@ class Nsgaii(opt.BaseOptimizer):
             # Update the amount of evaluation left
             evaluations -= self.pop_size
 
+            pareto_front = self.population[1][front_no == 1, :]
+            convergence.update(pareto_front)
+
             elapsed_time = timer() - start_time
             self.on_next(self._get_message(
                 OptimizationState.RUNNING, evaluations_left=evaluations,
-                pareto_front=self.population[1][front_no == 1, :],
-                elapsed=elapsed_time))
+                pareto_front=pareto_front,
+                elapsed=elapsed_time, cache_hits=self.cache_hits,
+                cache_misses=self.cache_misses,
+                hypervolumes=list(convergence.hypervolumes),
+                surrogate_error=surrogate_error))
 
             # Temporary prints
             if evaluations % (10 * self.evaluations / self.pop_size) == 0:
@@ -906,6 +1105,9 @@ class Nsgaii(opt.BaseOptimizer):
                         elapsed_time - start_time, percent, self.evaluations -
                         evaluations))
 
+            if convergence.has_converged():
+                break
+
         # Finally, sort by non-domination
         front_no, last_front_no = self.nd_sort(self.population[1],
                                                self.pop_size)
@@ -946,7 +1148,10 @@ class Nsgaii(opt.BaseOptimizer):
 
         self.on_completed(self._get_message(
             OptimizationState.FINISHED,
-            evaluations_done=self.evaluations - evaluations))
+            evaluations_done=self.evaluations - evaluations,
+            cache_hits=self.cache_hits, cache_misses=self.cache_misses,
+            hypervolumes=list(convergence.hypervolumes),
+            converged=convergence.has_converged()))
 
     def variation(self, pop_sols: List[Solution]) -> PopulationNp:
         """
@@ -1155,6 +1360,167 @@ class Nsgaii(opt.BaseOptimizer):
         return np.array(offspring)
 
 
+class SurrogateModel:
+    """Radial basis function model that predicts the objective values of
+    solutions from the solutions that have been evaluated.
+    """
+    # Solutions needed before the model is fitted
+    MIN_POINTS = 10
+
+    def __init__(self, max_points: int = 500):
+        """Initializes a new SurrogateModel.
+
+        Args:
+            max_points: maximum number of evaluated solutions the model is
+                fitted on. Most recently evaluated solutions are used.
+        """
+        self.max_points = max_points
+        self._sols = None
+        self._objs = None
+        self._model = None
+        self._columns = None
+        self._offset = None
+        self._scale = None
+
+    def add(self, sols: PopulationNp,
+            objective_values: List[ObjectiveValues]) -> None:
+        """Adds evaluated solutions. Failed evaluations are ignored.
+        """
+        sols = np.asarray(sols, dtype=float)
+        objs = np.asarray(objective_values, dtype=float)
+        finite = np.all(np.isfinite(objs), axis=1)
+        sols, objs = sols[finite], objs[finite]
+        if self._sols is not None:
+            sols = np.vstack((self._sols, sols))
+            objs = np.vstack((self._objs, objs))
+        self._sols = sols[-self.max_points:]
+        self._objs = objs[-self.max_points:]
+
+    def fit(self) -> None:
+        """Fits the model on the added solutions. Solutions are scaled to
+        the unit range so that all variables have the same weight.
+
+        If the solutions do not determine the model, the previous fit is
+        kept.
+        """
+        if self._sols is None:
+            return
+        # Repeated solutions would make the interpolation matrix singular
+        sols, index = np.unique(self._sols, axis=0, return_index=True)
+        if len(sols) < self.MIN_POINTS:
+            return
+        # Constant variables are left out
+        offset = sols.min(axis=0)
+        span = sols.max(axis=0) - offset
+        columns = span > 0
+        try:
+            model = RBFInterpolator(
+                (sols[:, columns] - offset[columns]) / span[columns],
+                self._objs[index], kernel="thin_plate_spline",
+                smoothing=1e-6)
+        except (np.linalg.LinAlgError, ValueError):
+            return
+        self._model = model
+        self._columns = columns
+        self._offset = offset[columns]
+        self._scale = span[columns]
+
+    def is_fitted(self) -> bool:
+        """Whether the model has been fitted.
+        """
+        return self._model is not None
+
+    def predict(self, sols: PopulationNp) -> np.ndarray:
+        """Returns predicted objective values of solutions.
+        """
+        sols = np.asarray(sols, dtype=float)[:, self._columns]
+        return self._model((sols - self._offset) / self._scale)
+
+    def get_error(self, sols: PopulationNp,
+                  objective_values: List[ObjectiveValues]) \
+            -> Optional[float]:
+        """Returns the root mean square error of predictions relative to
+        the standard deviation of the objective values, averaged over
+        objectives. Failed evaluations are ignored.
+
+        Return:
+            relative error or None if the model has not been fitted or
+            there are no successful evaluations
+        """
+        if not self.is_fitted():
+            return None
+        sols = np.asarray(sols, dtype=float)
+        objs = np.asarray(objective_values, dtype=float)
+        finite = np.all(np.isfinite(objs), axis=1)
+        if not np.any(finite):
+            return None
+        errors = self.predict(sols[finite]) - objs[finite]
+        rmse = np.sqrt(np.mean(errors ** 2, axis=0))
+        spread = np.std(self._objs, axis=0)
+        return float(np.mean(rmse / np.where(spread > 0, spread, 1.0)))
+
+
+class ConvergenceMonitor:
+    """Tracks the hypervolume of the Pareto front between generations and
+    tells when it has stopped improving.
+    """
+
+    def __init__(self, tolerance: Optional[float], generations: int):
+        """Initializes a new ConvergenceMonitor.
+
+        Args:
+            tolerance: relative improvement of the hypervolume below which
+                the optimization has converged. If None, the optimization
+                never converges.
+            generations: number of generations over which the improvement
+                is calculated
+        """
+        self.tolerance = tolerance
+        self.generations = generations
+        self.reference = None
+        self.hypervolumes = []
+
+    def update(self, pareto_front: np.ndarray) -> float:
+        """Calculates the hypervolume of the Pareto front of a generation.
+
+        The reference point is set just beyond the worst objective values of
+        the first Pareto front, so hypervolumes of later generations are
+        comparable with each other.
+
+        Args:
+            pareto_front: objective values of the Pareto front
+
+        Return:
+            hypervolume of the Pareto front
+        """
+        front = np.asarray(pareto_front, dtype=float).reshape(-1, 2)
+        # Failed evaluations have infinite objective values
+        front = front[np.all(np.isfinite(front), axis=1)]
+        if self.reference is None and len(front):
+            worst = front.max(axis=0)
+            margin = 0.1 * np.maximum(worst - front.min(axis=0), np.abs(worst))
+            self.reference = worst + np.where(margin > 0, margin, 1.0)
+        if self.reference is None:
+            volume = 0.0
+        else:
+            volume = opt.hypervolume(front, self.reference)
+        self.hypervolumes.append(volume)
+        return volume
+
+    def has_converged(self) -> bool:
+        """Whether the hypervolume has improved relatively less than the
+        tolerance during the last generations.
+        """
+        if self.tolerance is None or \
+                len(self.hypervolumes) <= self.generations:
+            return False
+        latest = self.hypervolumes[-1]
+        if latest <= 0:
+            return False
+        earlier = self.hypervolumes[-self.generations - 1]
+        return (latest - earlier) / latest <= self.tolerance
+
+
 def solution_to_binary(
         solution: Solution, bit_length_x: int, bit_length_y: int) -> List[str]:
     """Returns a binary representation of a solution.
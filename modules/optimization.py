@@ -31,8 +31,11 @@ __version__ = "2.0"
 import os
 import abc
 import math
+import time
+from collections import deque
 from pathlib import Path
 from typing import Any
+from typing import Callable
 
 import numpy as np
 import reactivex
@@ -43,17 +46,23 @@ from . import general_functions as gf
 from .concurrency import CancellationToken
 from .element_simulation import ElementSimulation
 from .energy_spectrum import EnergySpectrum
+from .espe_engine import EspeEngine
 from .enums import IonDivision
 from .enums import OptimizationState
 from .enums import OptimizationType
 from .mcerd import MCERD
 from .observing import Observable
 from .parsing import CSVParser
+from .recoil_element import RecoilElement
+from .spectrum_grid import SpectrumGrid
 
 
 class BaseOptimizer(abc.ABC, Observable):
     """A base class for optimizers.
     """
+    # Seconds between the checks of the initial simulation when the
+    # spectrum is accumulated in-process
+    ACCUMULATED_CHECK_INTERVAL = 1.0
 
     def __init__(self, evaluations=None,
                  element_simulation: ElementSimulation = None,
@@ -62,7 +71,8 @@ class BaseOptimizer(abc.ABC, Observable):
                  number_of_processes=1, stop_percent=0.3, check_time=20,
                  ch=0.025, measurement=None, cut_file=None, check_max=900,
                  check_min=0, skip_simulation=False, use_efficiency=False,
-                 verbose=False, optimize_by_area=False) -> None:
+                 verbose=False, optimize_by_area=False,
+                 in_process_espe=False) -> None:
         """Initialize a BaseOptimizer.
 
         Args:
@@ -86,6 +96,10 @@ class BaseOptimizer(abc.ABC, Observable):
             skip_simulation: whether simulation is skipped altogether
             use_efficiency: whether to use efficiency for pre-calculated
                 spectrum.
+            in_process_espe: whether simulated spectra of solutions are
+                calculated with an EspeEngine instead of get_espe. The
+                spectrum of the initial simulation is then also accumulated
+                in-process while it is checked.
         """
         Observable.__init__(self)
 
@@ -117,9 +131,12 @@ class BaseOptimizer(abc.ABC, Observable):
         self.cut_file = Path(cut_file)
 
         self.measured_espe = None
+        self._measured_grid = None
         self.use_efficiency = use_efficiency
         self.verbose = verbose
         self.optimize_by_area = optimize_by_area
+        self.in_process_espe = in_process_espe
+        self._espe_engine = None
 
     @staticmethod
     def _get_message(state: OptimizationState, **kwargs) -> dict:
@@ -158,6 +175,32 @@ class BaseOptimizer(abc.ABC, Observable):
                          Path(self.element_simulation.directory,
                               erd_file_name))
 
+    def get_measured_grid(self) -> SpectrumGrid:
+        """Returns the measured spectrum as a SpectrumGrid that simulated
+        spectra are compared to. The grid is recreated if measured_espe has
+        been replaced.
+        """
+        grid = self._measured_grid
+        if grid is None or grid.espe is not self.measured_espe:
+            grid = SpectrumGrid(
+                self.measured_espe, self.element_simulation.channel_width)
+            self._measured_grid = grid
+        return grid
+
+    def get_espe_engine(self, recoil_element: RecoilElement) -> EspeEngine:
+        """Returns the EspeEngine used to calculate simulated spectra of
+        solutions. The engine is created when this is first called, after
+        the simulation has finished.
+
+        Args:
+            recoil_element: recoil element used to calibrate the engine
+        """
+        if self._espe_engine is None:
+            self._espe_engine = self.element_simulation.get_espe_engine(
+                recoil_element, ch=self.channel_width,
+                optimization_type=self.optimization_type)
+        return self._espe_engine
+
     def run_initial_simulation(self,
                                cancellation_token: CancellationToken,
                                ion_division: IonDivision) -> None:
@@ -181,7 +224,7 @@ class BaseOptimizer(abc.ABC, Observable):
                 OptimizationState.SIMULATING,
                 evaluations_left=self.evaluations))
 
-            ct_check = rx.timer(0, 0.2).pipe(
+            ct_check = reactivex.timer(0, 0.2).pipe(
                 ops.take_while(lambda _: not stop_if_cancelled(
                     cancellation_token, ct)),
                 ops.filter(lambda _: False),
@@ -189,15 +232,21 @@ class BaseOptimizer(abc.ABC, Observable):
             # FIXME spectra_chk should only be performed when pre-simulation
             #   has finished, otherwise there will be no new observed atoms
             #   and the difference between the two spectra is 0
-            spectra_chk = rx.timer(self.check_min, self.check_time).pipe(
-                ops.merge(ct_check),
-                ops.map(lambda _: get_optim_espe(
-                    self.element_simulation, self.optimization_type)),
-                ops.scan(
-                    lambda prev_espe, next_espe: (prev_espe[1], next_espe),
-                    seed=[None, None]),
-                ops.map(lambda espes: calculate_change(
-                    *espes, self.element_simulation.channel_width)),
+            if self.in_process_espe:
+                changes = self._get_accumulated_changes(ct_check)
+            else:
+                changes = reactivex.timer(
+                    self.check_min, self.check_time).pipe(
+                    ops.merge(ct_check),
+                    ops.map(lambda _: get_optim_espe(
+                        self.element_simulation, self.optimization_type)),
+                    ops.scan(
+                        lambda prev_espe, next_espe: (prev_espe[1], next_espe),
+                        seed=[None, None]),
+                    ops.map(lambda espes: calculate_change(
+                        *espes, self.element_simulation.channel_width)),
+                )
+            spectra_chk = changes.pipe(
                 ops.take_while(
                     lambda change: change > self.stop_percent and not
                     ct.is_cancellation_requested()
@@ -205,7 +254,7 @@ class BaseOptimizer(abc.ABC, Observable):
                 ops.do_action(
                     on_completed=ct.request_cancellation)
             )
-            merged = rx.merge(observable, spectra_chk).pipe(
+            merged = reactivex.merge(observable, spectra_chk).pipe(
                 ops.take_while(
                     lambda x: not isinstance(x, dict) or x[
                         MCERD.IS_RUNNING],
@@ -223,6 +272,83 @@ class BaseOptimizer(abc.ABC, Observable):
                 "Could not start simulation. Check that simulation is not "
                 "currently running.")
 
+    def _get_accumulated_changes(
+            self, ct_check: reactivex.Observable) -> reactivex.Observable:
+        """Returns an observable stream of changes in the simulated spectrum
+        while the initial simulation is running.
+
+        The spectrum is accumulated from the events that MCERD appends to
+        the ERD files, so each check only reads new events and checks can
+        be performed more often than every check_time seconds. See
+        _get_accumulated_change_check.
+
+        Args:
+            ct_check: observable that is merged to the check timer
+
+        Return:
+            observable stream of changes
+        """
+        interval = min(self.check_time, self.ACCUMULATED_CHECK_INTERVAL)
+        return reactivex.timer(self.check_min, interval).pipe(
+            ops.merge(ct_check),
+            ops.map(self._get_accumulated_change_check(interval))
+        )
+
+    def _get_accumulated_change_check(
+            self, interval: float) -> Callable[[Any], float]:
+        """Returns a function that updates the accumulated spectrum and
+        returns its change.
+
+        Each change is calculated between the current spectrum and the
+        spectrum from check_time seconds earlier. Spectra are calibrated
+        with a single get_espe run. Until calibration succeeds, get_espe is
+        run at most once every check_time seconds, and the change is inf.
+
+        Args:
+            interval: seconds between the checks
+
+        Return:
+            function that takes an ignored argument and returns the change
+        """
+        accumulator = self.element_simulation.get_spectrum_accumulator(
+            get_optim_recoil(self.element_simulation, self.optimization_type),
+            optimization_type=self.optimization_type)
+        history = deque()
+        calibrated = False
+        last_calibration = -math.inf
+
+        def check(_) -> float:
+            nonlocal calibrated, last_calibration
+            now = time.monotonic()
+            accumulator.update()
+            if not calibrated:
+                # get_espe is run once there are events to calibrate with
+                if not accumulator.get_espe() or \
+                        now - last_calibration < self.check_time:
+                    return math.inf
+                last_calibration = now
+                try:
+                    accumulator.calibrate(get_optim_espe(
+                        self.element_simulation, self.optimization_type))
+                except ValueError:
+                    return math.inf
+                calibrated = True
+
+            espe = accumulator.get_espe()
+            # Allow some delay in the timer
+            compared_time = now - self.check_time + interval / 2
+            while len(history) > 1 and history[1][0] <= compared_time:
+                history.popleft()
+            if history and history[0][0] <= compared_time:
+                previous_espe = history[0][1]
+            else:
+                previous_espe = None
+            history.append((now, espe))
+            return calculate_change(
+                previous_espe, espe, self.element_simulation.channel_width)
+
+        return check
+
     def modify_measurement(self) -> None:
         """
         Modify measured energy spectrum to match the simulated in regards to
@@ -282,13 +408,19 @@ class BaseOptimizer(abc.ABC, Observable):
                     pass
 
 
-def get_optim_espe(elem_sim: ElementSimulation,
-                   optimization_type: OptimizationType):
+def get_optim_recoil(elem_sim: ElementSimulation,
+                     optimization_type: OptimizationType) -> RecoilElement:
+    """Returns the recoil element that is simulated in the initial
+    simulation of the optimization.
+    """
     if optimization_type is OptimizationType.RECOIL:
-        recoil = elem_sim.optimization_recoils[0]
-    else:
-        recoil = elem_sim.get_main_recoil()
+        return elem_sim.optimization_recoils[0]
+    return elem_sim.get_main_recoil()
+
 
+def get_optim_espe(elem_sim: ElementSimulation,
+                   optimization_type: OptimizationType):
+    recoil = get_optim_recoil(elem_sim, optimization_type)
     espe, _ = elem_sim.calculate_espe(
         recoil, optimization_type=optimization_type, write_to_file=False)
     return espe
@@ -297,22 +429,9 @@ def get_optim_espe(elem_sim: ElementSimulation,
 def calculate_change(espe1, espe2, channel_width):
     if not espe1 or not espe2:
         return math.inf
-    uniespe1, uniespe2 = gf.uniform_espe_lists(
-        espe1, espe2, channel_width=channel_width)
-
-    # Calculate distance between energy spectra
-    # TODO move this to math_functions
-    sum_diff = 0
-    amount = 0
-    for point1, point2 in zip(uniespe1, uniespe2):
-        if point1[1] != 0 or point2[1] != 0:
-            amount += 1
-            sum_diff += abs(point1[1] - point2[1])
-    # Take average of sum_diff (non-zero diffs)
-    if amount:
-        return sum_diff / amount
-    else:
-        return math.inf
+    # Average distance between energy spectra (non-zero channels)
+    return SpectrumGrid(espe1, channel_width).get_mean_absolute_difference(
+        espe2)
 
 
 def dominates(a, b):
@@ -336,6 +455,88 @@ def dominates(a, b):
     return is_better
 
 
+def hypervolume(objective_values, reference) -> float:
+    """
+    Calculates the hypervolume, i.e. the area dominated by a set of
+    solutions with two objectives and bounded by a reference point.
+    Minimization.
+
+    Args:
+        objective_values: Objective values of the solutions.
+        reference: Reference point that is worse than the solutions in
+            both objectives. Solutions that do not dominate it do not add
+            to the hypervolume.
+
+    Return:
+        Hypervolume of the solutions.
+    """
+    pop_obj = np.asarray(objective_values, dtype=float).reshape(-1, 2)
+    ref_x, ref_y = reference
+    pop_obj = pop_obj[(pop_obj[:, 0] < ref_x) & (pop_obj[:, 1] < ref_y)]
+    # Sweep solutions in the order of the first objective. Each solution
+    # that improves the second objective adds a rectangle.
+    pop_obj = pop_obj[np.lexsort((pop_obj[:, 1], pop_obj[:, 0]))]
+    volume = 0.0
+    prev_y = ref_y
+    for x, y in pop_obj:
+        if y < prev_y:
+            volume += (ref_x - x) * (prev_y - y)
+            prev_y = y
+    return volume
+
+
+def dominance_matrix(objective_values) -> np.ndarray:
+    """
+    Returns a matrix that tells which solutions dominate which. This is the
+    same as calling dominates for each pair of solutions.
+
+    Args:
+        objective_values: Objective values of n solutions.
+
+    Return:
+        Boolean n x n array whose element [i, j] is True if solution i
+        dominates solution j.
+    """
+    pop_obj = np.asarray(objective_values, dtype=float)
+    if pop_obj.ndim != 2:
+        pop_obj = pop_obj.reshape(len(pop_obj), -1 if pop_obj.size else 0)
+    a = pop_obj[:, None, :]
+    b = pop_obj[None, :, :]
+    return ~np.any(a > b, axis=2) & np.any(a < b, axis=2)
+
+
+def _draw_tournament_candidates(t, p, n):
+    """
+    Draws t different candidates for each of p tournaments. Random numbers
+    are drawn in the same order as when each candidate is drawn separately
+    and drawn again if it is already in the tournament.
+    """
+    candidates = np.empty((p, t), dtype=int)
+    i = 0
+    while i < p:
+        state = np.random.get_state()
+        draws = np.random.randint(n, size=(p - i, t))
+        sorted_draws = np.sort(draws, axis=1)
+        repeats = np.flatnonzero(
+            np.any(sorted_draws[:, 1:] == sorted_draws[:, :-1], axis=1))
+        if not len(repeats):
+            candidates[i:] = draws
+            break
+        # Draw again up to the first tournament with a repeated candidate
+        # and continue that tournament one candidate at a time
+        first = repeats[0]
+        np.random.set_state(state)
+        candidates[i:i + first] = np.random.randint(n, size=(first, t))
+        tournament = []
+        while len(tournament) < t:
+            candidate = np.random.randint(n)
+            if candidate not in tournament:
+                tournament.append(candidate)
+        candidates[i + first] = tournament
+        i += first + 1
+    return candidates
+
+
 def tournament_allow_doubles(t, p, fit):
     """
     Tournament selection that allows one individual to be in the mating pool
@@ -349,29 +550,17 @@ def tournament_allow_doubles(t, p, fit):
     Return:
         Index of selected solutions.
     """
-    n = len(fit)
-    pool = []
-    for i in range(p):
-        candidates = []
-        # Find k different candidates for tournament
-        j = 0
-        while j in range(t):
-            candidate = np.random.randint(n)
-            if candidate not in candidates:
-                candidates.append(candidate)
-                j += 1
-        min_front = min([fit[i, 0] for i in candidates])
-        min_candidates = [i for i in candidates if fit[i, 0] == min_front]
-        number_of_mins = len(min_candidates)
-        if number_of_mins > 1:  # If multiple candidates from the same front
-            # Find the candidate with smallest crowding distance
-            max_dist = max([fit[i, 1] for i in min_candidates])
-            max_cands = [i for i in min_candidates if fit[i, 1] == max_dist]
-            pool.append(max_cands[0])
-        else:
-            pool.append(min_candidates[0])
-
-    return np.array(pool)
+    fit = np.asarray(fit)
+    candidates = _draw_tournament_candidates(t, p, len(fit))
+    fronts = fit[candidates, 0]
+    is_min = fronts == fronts.min(axis=1, keepdims=True)
+    # If multiple candidates are from the same front, the first one with
+    # the largest crowding distance wins
+    distances = np.where(is_min, fit[candidates, 1], -np.inf)
+    is_max = is_min & (distances == distances.max(axis=1, keepdims=True))
+    winners = np.where(
+        is_min.sum(axis=1) > 1, is_max.argmax(axis=1), is_min.argmax(axis=1))
+    return candidates[np.arange(p), winners]
 
 
 def single_point_crossover(parent1, parent2):
@@ -0,0 +1,271 @@
+# coding=utf-8
+"""
+Created on 17.10.2026
+
+Potku is a graphical user interface for analyzation and
+visualization of measurement data collected from a ToF-ERD
+telescope. For physics calculations Potku uses external
+analyzation components.
+Copyright (C) 2026 Potku developers
+
+This program is free software; you can redistribute it and/or
+modify it under the terms of the GNU General Public License
+as published by the Free Software Foundation; either version 2
+of the License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program (file named 'LICENCE').
+
+Process supervisor runs external processes, such as MCERD, on a single
+asyncio event loop. The loop reads the output of all processes and stops them
+when they time out or cancellation is requested.
+"""
+__version__ = "2.0"
+
+import asyncio
+import locale
+import subprocess
+import threading
+
+import reactivex as rx
+
+from typing import Optional
+from typing import Sequence
+from pathlib import Path
+from reactivex.abc import ObserverBase
+from reactivex.disposable import Disposable
+
+from . import subprocess_utils as sutils
+from .concurrency import CancellationToken
+
+
+class ProcessCancelledError(subprocess.SubprocessError):
+    """Raised when a supervised process is killed because cancellation was
+    requested.
+    """
+
+    def __init__(self, cmd: Sequence[str]):
+        self.cmd = cmd
+        super().__init__(f"Command '{cmd}' was cancelled.")
+
+
+class ProcessSupervisor:
+    """Runs processes and reads their output on an asyncio event loop that
+    runs in a single background thread.
+
+    The thread is started when the first process is run. Observers of the
+    processes are notified on the thread of the event loop, so they should
+    not block.
+    """
+
+    def __init__(self):
+        """Initializes a new ProcessSupervisor.
+        """
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def _get_loop(self) -> asyncio.AbstractEventLoop:
+        """Returns the event loop of the supervisor. Starts the loop if it is
+        not running yet.
+        """
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(
+                    target=self._loop.run_forever, daemon=True,
+                    name="ProcessSupervisor")
+                self._thread.start()
+            return self._loop
+
+    def run(self, cmd: Sequence[str], cwd: Optional[Path] = None,
+            ct: Optional[CancellationToken] = None, ct_check: float = 0.2,
+            max_time: Optional[float] = None, niceness: int = 0
+            ) -> rx.Observable:
+        """Returns an observable that starts the given command when it is
+        subscribed to.
+
+        The observable emits each line that the process writes to stdout or
+        stderr and completes when the process has finished. If the process
+        returns a non-zero exit code, subprocess.CalledProcessError is
+        emitted. If the process is killed because cancellation was requested
+        or it timed out, ProcessCancelledError or subprocess.TimeoutExpired is
+        emitted. Disposing the subscription does not stop the process.
+
+        Args:
+            cmd: command and its arguments
+            cwd: working directory of the process
+            ct: token that is checked to see if the process should be killed
+            ct_check: how often cancellation is checked in seconds
+            max_time: maximum running time in seconds
+            niceness: how much the scheduling priority of the process is
+                lowered.
+
+        Return:
+            observable stream of output lines
+        """
+        def subscribe(observer: ObserverBase, _=None) -> Disposable:
+            subscription = _Subscription(observer)
+            asyncio.run_coroutine_threadsafe(self._supervise(
+                cmd, subscription, cwd, ct or CancellationToken(), ct_check,
+                max_time, niceness), self._get_loop())
+            return Disposable(subscription.dispose)
+
+        return rx.create(subscribe)
+
+    @staticmethod
+    async def _supervise(cmd: Sequence[str], subscription: "_Subscription",
+                         cwd: Optional[Path], ct: CancellationToken,
+                         ct_check: float, max_time: Optional[float],
+                         niceness: int):
+        """Runs the process and notifies the subscription about its output
+        and exit status. Unexpected errors are published to the
+        subscription and the process is killed if it is still running.
+        """
+        process = None
+        try:
+            process = await asyncio.create_subprocess_exec(
+                *cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                cwd=cwd,
+                creationflags=sutils.get_priority_creationflags(niceness))
+            sutils.set_niceness(process, niceness)
+            error = await _wait_for_exit(
+                cmd, process, ct, ct_check, max_time, subscription)
+            return_code = process.returncode
+        except Exception as e:
+            if process is not None and process.returncode is None:
+                try:
+                    await _kill(process)
+                except Exception:
+                    pass
+            subscription.on_error(e)
+            return
+
+        if error is not None:
+            subscription.on_error(error)
+        elif return_code != 0:
+            subscription.on_error(
+                subprocess.CalledProcessError(return_code, cmd))
+        else:
+            subscription.on_completed()
+
+
+async def _wait_for_exit(cmd: Sequence[str],
+                         process: asyncio.subprocess.Process,
+                         ct: CancellationToken, ct_check: float,
+                         max_time: Optional[float],
+                         subscription: "_Subscription"
+                         ) -> Optional[Exception]:
+    """Publishes the output of the process until it has exited. Kills the
+    process if cancellation is requested or it times out.
+
+    Return:
+        ProcessCancelledError or subprocess.TimeoutExpired if the process
+        was killed, otherwise None
+    """
+    readers = asyncio.gather(
+        _read_lines(process.stdout, subscription),
+        _read_lines(process.stderr, subscription))
+    waiter = asyncio.ensure_future(process.wait())
+
+    loop = asyncio.get_running_loop()
+    deadline = None if max_time is None else loop.time() + max_time
+    error = None
+    while not waiter.done():
+        timeout = ct_check
+        if deadline is not None:
+            timeout = max(0.0, min(timeout, deadline - loop.time()))
+        if readers.done():
+            # Raises the error of a reader that failed
+            readers.result()
+            await asyncio.wait((waiter,), timeout=timeout)
+        else:
+            await asyncio.wait((waiter, readers), timeout=timeout,
+                               return_when=asyncio.FIRST_COMPLETED)
+        if waiter.done():
+            break
+        if ct.is_cancellation_requested():
+            error = ProcessCancelledError(cmd)
+        elif deadline is not None and loop.time() >= deadline:
+            error = subprocess.TimeoutExpired(cmd, max_time)
+        else:
+            continue
+        try:
+            await _kill(process)
+        except ProcessLookupError:
+            # Process finished on its own
+            error = None
+        break
+
+    # Output is read until both pipes have been closed, so the exit
+    # status is always the last thing that is published.
+    await readers
+    await waiter
+    return error
+
+
+async def _kill(process: asyncio.subprocess.Process):
+    """Kills the process. Killing may start another process on Windows, so
+    it is done in the default executor of the event loop.
+    """
+    await asyncio.get_running_loop().run_in_executor(
+        None, sutils.kill_process, process)
+
+
+async def _read_lines(stream: asyncio.StreamReader,
+                      subscription: "_Subscription"):
+    """Publishes each line read from the stream until the stream is closed.
+    """
+    encoding = locale.getpreferredencoding(False)
+    while True:
+        line = await stream.readline()
+        if not line:
+            return
+        subscription.on_next(line.decode(encoding, errors="replace"))
+
+
+class _Subscription:
+    """Forwards notifications to an observer until the subscription is
+    disposed.
+    """
+    __slots__ = "_observer", "_disposed"
+
+    def __init__(self, observer: ObserverBase):
+        self._observer = observer
+        self._disposed = False
+
+    def dispose(self):
+        self._disposed = True
+
+    def on_next(self, value):
+        if not self._disposed:
+            try:
+                self._observer.on_next(value)
+            except Exception as e:
+                # Errors raised by the observer must not stop the supervisor
+                # from reading the rest of the output.
+                self.on_error(e)
+
+    def on_error(self, error: Exception):
+        if not self._disposed:
+            self._disposed = True
+            self._observer.on_error(error)
+
+    def on_completed(self):
+        if not self._disposed:
+            self._disposed = True
+            self._observer.on_completed()
+
+
+_default_supervisor = ProcessSupervisor()
+
+
+def get_default_supervisor() -> ProcessSupervisor:
+    """Returns the supervisor that runs the MCERD processes of Potku.
+    """
+    return _default_supervisor
@@ -52,6 +52,9 @@ from .target import Target
 from .recoil_element import RecoilElement
 from .global_settings import GlobalSettings
 from .observing import ProgressReporter
+from .concurrency import CancellationToken
+from .concurrency import JobScheduler
+from .concurrency import run_in_threads
 
 
 class Request(ElementSimulationContainer, RequestLogger):
@@ -76,6 +79,9 @@ class Request(ElementSimulationContainer, RequestLogger):
 
         self.request_name = name
         self.global_settings = global_settings
+        # MCERD processes of all element simulations and optimizations share
+        # this scheduler so that they do not oversubscribe the CPU.
+        self.mcerd_scheduler = JobScheduler()
         self.samples = Samples(self)
 
         self.__tabs = tabs
@@ -519,31 +525,39 @@ class Request(ElementSimulationContainer, RequestLogger):
     def save_cuts(
             self,
             measurement: Measurement,
-            progress: Optional[ProgressReporter] = None) -> None:
+            progress: Optional[ProgressReporter] = None,
+            cancellation_token: Optional[CancellationToken] = None,
+            max_workers: Optional[int] = None) -> None:
         """ Save cuts for all measurements except for master.
-        
+
+        Slave measurements are cut in parallel in a thread pool. Each
+        measurement writes only into its own cut directory.
+
         Args:
             measurement: A measurement class object that issued save cuts.
             progress: ProgressReporter object.
+            cancellation_token: CancellationToken that can be used to stop
+                cutting measurements that have not been started yet.
+            max_workers: maximum number of measurements that are cut at the
+                same time. Defaults to the number of CPUs.
         """
         name = measurement.name
         master = self.has_master()
+        slaves = []
         if master != "" and name == master.name:
             nonslaves = self.get_nonslaves()
             tabs = self.get_measurement_tabs(measurement.tab_id)
-            for i, tab in enumerate(tabs):
-                if progress is not None:
-                    sub_progress = progress.get_sub_reporter(
-                        lambda x: (100 * i + x) / len(tabs)
-                    )
-                else:
-                    sub_progress = None
-
+            for tab in tabs:
                 tab_name = tab.obj.name
                 if tab.data_loaded and tab.obj not in nonslaves and \
                         tab_name != name:
                     # No need to save same measurement twice.
-                    tab.obj.save_cuts(progress=sub_progress)
+                    slaves.append(tab.obj)
+
+        run_in_threads(
+            lambda slave, sub_progress: slave.save_cuts(progress=sub_progress),
+            slaves, progress=progress, cancellation_token=cancellation_token,
+            max_workers=max_workers)
 
         if progress is not None:
             progress.report(100)
@@ -36,10 +36,15 @@ __version__ = "2.0"
 import os
 import itertools
 
+from typing import List
+from typing import Tuple
+
 from . import math_functions as mf
 from . import general_functions as gf
 
 import matplotlib as mpl
+import matplotlib.lines
+import matplotlib.path
 
 from dialogs.measurement.selection import SelectionSettingsDialog
 
@@ -47,8 +52,9 @@ from pathlib import Path
 
 from .element import Element
 
-import math
+import numpy as np
 
+from .event_store import EventStore
 from .measurement import Measurement
 
 
@@ -134,6 +140,9 @@ class Selector:
         self.axes_limits = AxesLimits()
         self.selected_id = None
         self.draw_legend = False
+        # Packed membership masks of selections keyed by their vertices
+        self.__masks = {}
+        self.__masked_events = None
 
     def count(self):
         """Get count of selections.
@@ -538,11 +547,10 @@ class Selector:
         """
         selection.events_counted = False
         selection.event_count = 0
-        data = self.measurement.data
         if not selection.is_closed:
             selection.events_counted = True
             return
-        selection.fast_points_inside(data)
+        self.get_mask(selection)
         selection.events_counted = True
 
     def update_selection_points(self, progress=None):
@@ -551,26 +559,69 @@ class Selector:
         Args:
             progress: ProgressReporter object
         """
-        data = self.measurement.data
         for selection in self.selections:
             selection.events_counted = False
             selection.event_count = 0
 
-        # for i, point in enumerate(data):
-        #     for selection in self.selections:
-        #         if selection.is_closed:
-        #             selection.point_inside(point)
-        #     if progress is not None and i % 10_000 == 0:
-        #         progress.report(i / len(data) * 100)
-
-        for i, selection in enumerate(self.selections):
-            selection.fast_points_inside(data)
-            if progress is not None:
-                progress.report(i / len(self.selections) * 100)
+        self.get_masks(progress=progress)
 
         for selection in self.selections:
             selection.events_counted = True
 
+    def get_mask(self, selection: "Selection") -> np.ndarray:
+        """Finds out which events of the measurement are inside the
+        selection and updates the event count of the selection.
+
+        Masks are cached by the vertices of the selection so only
+        selections whose polygon has changed are tested again. Cached
+        masks of polygons that no longer belong to any selection are
+        dropped.
+
+        Args:
+            selection: Selection object
+
+        Return:
+            boolean mask over the measurement's events
+        """
+        events = self.measurement.data
+        if events is not self.__masked_events:
+            self.__masks = {}
+            self.__masked_events = events
+
+        key = selection.get_vertex_key()
+        try:
+            packed, count = self.__masks[key]
+            mask = np.unpackbits(packed, count=len(events)).view(bool)
+            selection.event_count = count
+        except KeyError:
+            mask = selection.get_mask(events)
+            self.__masks[key] = np.packbits(mask), selection.event_count
+
+        keys = {sel.get_vertex_key() for sel in self.selections}
+        keys.add(key)
+        for old_key in self.__masks.keys() - keys:
+            del self.__masks[old_key]
+        return mask
+
+    def get_masks(self, progress=None) -> List[np.ndarray]:
+        """Finds out which events of the measurement are inside each
+        selection. Event counts of the selections are updated at the same
+        time.
+
+        Args:
+            progress: ProgressReporter object
+
+        Return:
+            list of boolean masks over the measurement's events, one for
+            each selection
+        """
+        masks = []
+        for i, selection in enumerate(self.selections):
+            masks.append(self.get_mask(selection))
+            if progress is not None:
+                progress.report((i + 1) / len(self.selections) * 100)
+        return masks
+
     def update_selection_beams(self):
         """Update all RBS selections' beam ions."""
         for selection in self.selections:
@@ -634,10 +685,6 @@ class Selection:
         self.axes = axes
         self.axes_limits = AxesLimits()
 
-        self.cached_points = []
-        self.cached_intersect_x = []
-        self.cached_intersect_x_max = []
-
         Selection.GLOBAL_ID += 1
 
         if points is not None:
@@ -939,57 +986,41 @@ class Selection:
             self.event_count += 1
         return inside
 
-    def calculate_intersect_values(self, poly):
-        """
-        pre-calculates selection intersect x-values
-        """
-        x_list = []
-        x_max_list = []
-        for i in range(8192):  # improve max size of list, either check data for real value or atleast make it a constant
-            x_list.append([])
-            x_max_list.append(-1)
-        n = len(poly)
-        p1x, p1y = poly[0]
-        for i in range(n + 1):
-            p2x, p2y = poly[i % n]
-            if p1y != p2y:
-                for i in range(math.ceil(min(p1y, p2y)), math.floor(max(p1y, p2y))):
-                    xinters = (i - p1y) * (p2x - p1x) / (p2y - p1y) + p1x
-                    if x_list[i] == [9999999]:
-                        x_list[i] = [xinters]
-                    else:
-                        x_list[i].append(xinters)
-            p1x, p1y = p2x, p2y
-        for i in range(len(x_list)):
-            if x_list[i] != []:
-                x_list[i].sort(reverse=True)
-                x_max_list[i] = x_list[i][0]
-            if x_list[i] == []:
-                x_list[i] = [99999999]
-        return x_list, x_max_list
-
-    def fast_points_inside(self, points): #Check speed python list vs numpy array -TL
-        """
-        Faster algorithm testing which points are inside selection
-        Relies on data points being integers.
-        """
-        # check if cached intersect values are current
-        if self.cached_points != self.get_points():
-            self.cached_points = list(self.get_points())
-            self.cached_intersect_x, self.cached_intersect_x_max = self.calculate_intersect_values(self.cached_points)
-
-        # First test if points x-value is less then x_max then test how many polygon x_values point crosses
-
-        if self.__is_transposed:
-            points_inside = [[point[1],point[0],point[2]] for point in points if (point[1] < self.cached_intersect_x_max[point[0]]) and
-                             len([x for x in self.cached_intersect_x[point[0]] if x < point[1]]) % 2]
-        else:
-            points_inside = [point for point in points if (point[0] < self.cached_intersect_x_max[point[1]]) and
-                            len([x for x in self.cached_intersect_x[point[1]] if x < point[0]]) % 2]
+    def get_mask(self, events: EventStore) -> np.ndarray:
+        """Finds out which events are inside the selection and updates the
+        event count of the selection.
 
-        self.event_count = len(points_inside) # update events_count
+        Args:
+            events: EventStore of the measurement
 
-        return points_inside
+        Return:
+            boolean mask that is True for events inside the selection
+        """
+        # When axes are transposed, energy is on the x axis. Columns are
+        # swapped without copying them.
+        x, y = events.get_columns(self.__is_transposed)
+        mask = mf.points_inside_polygon(x, y, self.get_points())
+        self.event_count = int(np.count_nonzero(mask))
+        return mask
+
+    def get_vertex_key(self) -> Tuple[bool, Tuple[Tuple[int, int], ...]]:
+        """Returns a hashable key that identifies the polygon of the
+        selection. Two selections with the same key contain the same events.
+
+        Repeated consecutive vertices and the closing vertex do not change
+        the polygon so they are left out of the key.
+
+        Return:
+            tuple of the transposition state and the vertices
+        """
+        vertices = []
+        for x, y in self.get_points():
+            point = x, y
+            if not vertices or vertices[-1] != point:
+                vertices.append(point)
+        while len(vertices) > 1 and vertices[0] == vertices[-1]:
+            vertices.pop()
+        return self.__is_transposed, tuple(vertices)
 
     def name(self):
         if self.type == "RBS":
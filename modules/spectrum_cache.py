@@ -0,0 +1,182 @@
+# coding=utf-8
+"""
+Created on 17.10.2026
+
+Potku is a graphical user interface for analyzation and
+visualization of measurement data collected from a ToF-ERD
+telescope. For physics calculations Potku uses external
+analyzation components.
+Copyright (C) 2026 Potku developers
+
+This program is free software; you can redistribute it and/or
+modify it under the terms of the GNU General Public License
+as published by the Free Software Foundation; either version 2
+of the License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program (file named 'LICENCE').
+
+Content-addressed cache for arrays that are calculated from files, such as
+tofe_list outputs and histogrammed energy spectra. Entries are stored as .npy
+files named by the hash of the inputs they were calculated from. When the
+total size of the entries exceeds the size limit, least recently used
+entries are removed.
+"""
+__version__ = "2.0"
+
+import hashlib
+import os
+import tempfile
+import threading
+
+import numpy as np
+
+from pathlib import Path
+from typing import Optional
+from typing import Union
+
+# Name of the cache directory inside the directory of cached results
+CACHE_DIR_NAME = ".cache"
+DEFAULT_MAX_SIZE = 256 * 1024 ** 2  # bytes
+
+_ENTRY_SUFFIX = ".npy"
+
+
+class SpectrumCache:
+    """Stores arrays under keys calculated from their inputs.
+    """
+
+    def __init__(self, directory: Path, max_size: int = DEFAULT_MAX_SIZE):
+        """Initializes a new SpectrumCache.
+
+        Args:
+            directory: directory where the entries are stored. It is created
+                when the first entry is stored.
+            max_size: maximum total size of the entries in bytes
+        """
+        self.directory = Path(directory)
+        self.max_size = max_size
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def get_key(*parts: Union[bytes, str, int, float, Path, None]) -> str:
+        """Returns a key for the given inputs.
+
+        Contents of Paths are hashed. Paths to files that do not exist are
+        hashed by their name so that they change the key if they are
+        created later.
+
+        Args:
+            parts: inputs of the cached result
+
+        Return:
+            hexadecimal hash of the inputs
+        """
+        md5 = hashlib.md5()
+        for part in parts:
+            if isinstance(part, Path):
+                md5.update(b"path:")
+                md5.update(part.name.encode())
+                if part.is_file():
+                    with part.open("rb") as fp:
+                        for block in iter(lambda: fp.read(2 ** 24), b""):
+                            md5.update(block)
+            elif isinstance(part, bytes):
+                md5.update(b"bytes:")
+                md5.update(part)
+            else:
+                md5.update(f"{type(part).__name__}:{part!r}".encode())
+            md5.update(b"\0")
+        return md5.hexdigest()
+
+    def get_entry_file(self, key: str) -> Path:
+        """Returns the path to the file of a cache entry.
+        """
+        return self.directory / f"{key}{_ENTRY_SUFFIX}"
+
+    def get(self, key: str, mmap: bool = False) -> Optional[np.ndarray]:
+        """Returns the array stored under the key or None if there is no
+        such entry.
+
+        Args:
+            key: key returned by get_key
+            mmap: whether the array is memory-mapped instead of read into
+                memory
+        """
+        entry = self.get_entry_file(key)
+        try:
+            array = np.load(
+                entry, mmap_mode="r" if mmap else None, allow_pickle=False)
+            # Modification time of an entry is the time it was last used
+            os.utime(entry)
+        except (OSError, ValueError):
+            return None
+        return array
+
+    def put(self, key: str, array: np.ndarray) -> bool:
+        """Stores an array under the key and removes least recently used
+        entries if the size limit is exceeded.
+
+        Args:
+            key: key returned by get_key
+            array: array without object columns
+
+        Return:
+            whether the array was stored. Arrays are not stored if the cache
+            directory cannot be written to.
+        """
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            # Entry is written to a temporary file first so that other
+            # threads and processes never see partially written entries.
+            fd, tmp_file = tempfile.mkstemp(
+                dir=self.directory, suffix=".tmp")
+        except OSError:
+            return False
+        try:
+            with os.fdopen(fd, "wb") as fp:
+                np.save(fp, array, allow_pickle=False)
+            os.replace(tmp_file, self.get_entry_file(key))
+        except OSError:
+            Path(tmp_file).unlink(missing_ok=True)
+            return False
+        self.evict()
+        return True
+
+    def evict(self):
+        """Removes least recently used entries until the total size of the
+        entries is at most max_size.
+        """
+        with self._lock:
+            entries = []
+            for entry in self.directory.glob(f"*{_ENTRY_SUFFIX}"):
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime_ns, stat.st_size, entry))
+            total_size = sum(size for _, size, _ in entries)
+            for _, size, entry in sorted(entries, key=lambda x: x[0]):
+                if total_size <= self.max_size:
+                    break
+                try:
+                    entry.unlink(missing_ok=True)
+                except OSError:
+                    # Memory-mapped entries cannot be removed on Windows
+                    continue
+                total_size -= size
+
+    def clear(self):
+        """Removes all entries.
+        """
+        with self._lock:
+            for entry in self.directory.glob(f"*{_ENTRY_SUFFIX}"):
+                try:
+                    entry.unlink(missing_ok=True)
+                except OSError:
+                    pass
@@ -0,0 +1,141 @@
+# coding=utf-8
+"""
+Created on 17.10.2026
+
+Potku is a graphical user interface for analyzation and
+visualization of measurement data collected from a ToF-ERD
+telescope. For physics calculations Potku uses external
+analyzation components.
+Copyright (C) 2026 Potku developers
+
+This program is free software; you can redistribute it and/or
+modify it under the terms of the GNU General Public License
+as published by the Free Software Foundation; either version 2
+of the License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program (file named 'LICENCE').
+
+Spectrum grid aligns energy spectra on a common integer channel index so that
+they can be compared with vectorized operations.
+"""
+__version__ = "2.0"
+
+import math
+
+import numpy as np
+
+from typing import Tuple
+
+from .base import Espe
+
+
+class SpectrumGrid:
+    """Energy spectrum stored as NumPy arrays on an integer channel index.
+
+    Spectra are assumed to have one point per channel. The channel of the
+    first point of a spectrum is determined by its distance from the first
+    point of the grid spectrum, and the rest of the points follow on
+    consecutive channels. Channels that are missing from a spectrum have zero
+    counts.
+    """
+    __slots__ = "espe", "channel_width", "origin", "y"
+
+    def __init__(self, espe: Espe, channel_width: float = 0.025):
+        """Initializes a new SpectrumGrid.
+
+        Args:
+            espe: energy spectrum as (x, y) pairs. It is not modified.
+            channel_width: width of a channel in the spectrum (MeV)
+        """
+        self.espe = espe
+        self.channel_width = channel_width
+        self.origin, self.y = _to_array(espe)
+
+    def get_first_channel(self, espe_origin: float) -> int:
+        """Returns the channel index of the given x value.
+        """
+        return round((espe_origin - self.origin) / self.channel_width)
+
+    def align(self, espe: Espe) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Aligns the given spectrum with the spectrum of the grid.
+
+        Both spectra are padded with zeros so that they cover the same
+        channels.
+
+        Args:
+            espe: energy spectrum as (x, y) pairs. It is not modified.
+
+        Return:
+            x values of the common channels, y values of the grid spectrum
+            and y values of the given spectrum
+        """
+        origin, y = _to_array(espe)
+        if not self.y.size:
+            x = origin + np.arange(y.size) * self.channel_width
+            return x, np.zeros_like(y), y
+        first = self.get_first_channel(origin) if y.size else 0
+
+        start = min(0, first)
+        stop = max(self.y.size, first + y.size)
+
+        aligned_self = np.zeros(stop - start)
+        aligned_self[-start:-start + self.y.size] = self.y
+        aligned_other = np.zeros(stop - start)
+        aligned_other[first - start:first - start + y.size] = y
+
+        x = self.origin + np.arange(start, stop) * self.channel_width
+        return x, aligned_self, aligned_other
+
+    def get_area(self, espe: Espe) -> float:
+        """Returns the net area between the grid spectrum and the given
+        spectrum. Areas where the spectra cross cancel each other out.
+        """
+        x, y1, y2 = self.align(espe)
+        if x.size < 2:
+            return 0.0
+        return float(abs(np.trapz(y1 - y2, x)))
+
+    def get_mean_squared_error(self, espe: Espe) -> float:
+        """Returns the mean squared error between the y values of the grid
+        spectrum and the given spectrum, or inf if both are empty.
+        """
+        _, y1, y2 = self.align(espe)
+        if not y1.size:
+            return math.inf
+        return float(np.mean((y1 - y2) ** 2))
+
+    def get_mean_absolute_difference(self, espe: Espe) -> float:
+        """Returns the mean absolute difference between the y values of the
+        grid spectrum and the given spectrum. Channels where both spectra
+        are zero are left out. Returns inf if there are no such channels.
+        """
+        _, y1, y2 = self.align(espe)
+        nonzero = (y1 != 0) | (y2 != 0)
+        if not np.any(nonzero):
+            return math.inf
+        return float(np.mean(np.abs(y1[nonzero] - y2[nonzero])))
+
+    def get_differences(self, espe: Espe) -> Tuple[float, float]:
+        """Returns the net area and mean squared error between the grid
+        spectrum and the given spectrum.
+        """
+        x, y1, y2 = self.align(espe)
+        diff = y1 - y2
+        area = float(abs(np.trapz(diff, x))) if x.size >= 2 else 0.0
+        mse = float(np.mean(diff ** 2)) if diff.size else math.inf
+        return area, mse
+
+
+def _to_array(espe: Espe) -> Tuple[float, np.ndarray]:
+    """Returns the first x value and y values of a spectrum.
+    """
+    if not len(espe):
+        return 0.0, np.zeros(0)
+    espe = np.asarray(espe, dtype=float)
+    return float(espe[0, 0]), espe[:, 1]
@@ -25,8 +25,11 @@ __author__ = "Juhani Sundell"
 __version__ = "2.0"
 
 
+import os
+import shutil
 import subprocess
 import platform
+import threading
 from pathlib import Path
 from typing import Callable
 from typing import Iterable
@@ -77,6 +80,55 @@ class StdoutStream:
         self.close()
 
 
+class StdinWriter(threading.Thread):
+    """Thread that copies the contents of files into the stdin of a
+    subprocess.Popen. Files are copied in binary chunks so the memory usage
+    does not depend on the size of the files. stdin is closed after all
+    files have been written.
+    """
+    DEFAULT_CHUNK_SIZE = 2 ** 20
+
+    def __init__(self, process: subprocess.Popen, files: Iterable[Path],
+                 chunk_size: int = DEFAULT_CHUNK_SIZE):
+        """Initializes a new StdinWriter.
+
+        Args:
+            process: a subprocess.Popen object whose stdin is a pipe
+            files: files to write
+            chunk_size: size of the chunks that are written at a time
+        """
+        super().__init__(daemon=True)
+        self._stdin = process.stdin
+        self._files = files
+        self._chunk_size = chunk_size
+        self._error: Optional[BaseException] = None
+
+    def run(self):
+        # Text mode stdin is bypassed by writing into its binary buffer
+        stdin = getattr(self._stdin, "buffer", self._stdin)
+        try:
+            try:
+                for file in self._files:
+                    with open(file, "rb") as fp:
+                        shutil.copyfileobj(fp, stdin, self._chunk_size)
+            finally:
+                self._stdin.close()
+        except BrokenPipeError:
+            # Process exited before reading all of its input. The exit
+            # status of the process tells whether it was an error.
+            pass
+        except BaseException as e:
+            self._error = e
+
+    def wait(self):
+        """Waits until all files have been written and raises the exception
+        that occurred while writing, if any.
+        """
+        self.join()
+        if self._error is not None:
+            raise self._error
+
+
 def write_to_file(
         iterable: Iterable[T0],
         file: Path,
@@ -128,6 +180,30 @@ def process_output(
         return output_func(stream)
 
 
+def get_priority_creationflags(niceness: int) -> int:
+    """Returns creationflags for subprocess.Popen that lower the priority
+    of the new process on Windows. Returns 0 on other systems or if
+    niceness is not positive.
+    """
+    if niceness > 0 and platform.system() == "Windows":
+        return subprocess.BELOW_NORMAL_PRIORITY_CLASS
+    return 0
+
+
+def set_niceness(process: subprocess.Popen, niceness: int):
+    """Lowers the scheduling priority of a started process by niceness on
+    systems that support it. Errors are ignored, as the process runs
+    either way.
+    """
+    if niceness <= 0 or not hasattr(os, "setpriority"):
+        return
+    try:
+        current = os.getpriority(os.PRIO_PROCESS, process.pid)
+        os.setpriority(os.PRIO_PROCESS, process.pid, current + niceness)
+    except OSError:
+        pass
+
+
 def kill_process(process: subprocess.Popen):
     """Kills the given process.
     """
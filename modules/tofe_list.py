@@ -0,0 +1,247 @@
+# coding=utf-8
+"""
+Created on 17.10.2026
+
+Potku is a graphical user interface for analyzation and
+visualization of measurement data collected from a ToF-ERD
+telescope. For physics calculations Potku uses external
+analyzation components.
+Copyright (C) 2026 Potku developers
+
+This program is free software; you can redistribute it and/or
+modify it under the terms of the GNU General Public License
+as published by the Free Software Foundation; either version 2
+of the License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program (file named 'LICENCE').
+
+In-process implementation of the conversion done by the external tofe_list
+program. Time of flight channels of cut file events are converted into
+energies using the settings of a tof.in file.
+"""
+__version__ = "2.0"
+
+import functools
+import math
+
+import numpy as np
+
+from pathlib import Path
+from typing import Dict
+from typing import Tuple
+
+from . import general_functions as gf
+from .element import Element
+
+# Energy grid used when the energy loss in the carbon foil is tabulated
+_FOIL_TABLE_MIN_ENERGY = 0.01  # MeV
+_FOIL_TABLE_SIZE = 48
+
+# Column layout of tofe_list output (see parsing.ToFListParser). The first
+# two columns are not used by Potku and are always 0.
+TOFE_LIST_DTYPE = np.dtype([
+    ("x", float),
+    ("y", float),
+    ("energy", float),
+    ("mass_number", int),
+    ("mass", float),
+    ("type", object),
+    ("weight", float),
+    ("event_number", int),
+])
+
+
+def read_tof_in(tof_in: Path) -> Dict[str, str]:
+    """Reads the settings from a tof.in file (see
+    Measurement.generate_tof_in).
+
+    Args:
+        tof_in: path to a tof.in file
+
+    Return:
+        dictionary of setting names and values as strings
+    """
+    settings = {}
+    with tof_in.open("r") as file:
+        for line in file:
+            key, sep, value = line.partition(":")
+            if sep:
+                settings[key.strip()] = value.strip()
+    return settings
+
+
+def read_cut_file(cut_file: Path) -> Tuple[Dict[str, str], np.ndarray]:
+    """Reads the header and the events of a cut file.
+
+    Args:
+        cut_file: path to a cut file
+
+    Return:
+        header as a dictionary and events as an array of rows. The first
+        two columns are the ToF and energy channels and the last column is
+        the event number.
+    """
+    header = {}
+    with cut_file.open("r") as file:
+        for line in file:
+            if not line.strip():
+                break
+            key, _, value = line.partition(":")
+            header[key.strip()] = value.strip()
+        # Skip column names
+        file.readline()
+        data = file.read()
+    column_count = len(data.split("\n", 1)[0].split())
+    if not column_count:
+        return header, np.empty((0, 3), dtype=np.int64)
+    events = np.fromstring(data, dtype=np.int64, sep=" ")
+    return header, events.reshape(-1, column_count)
+
+
+def tofe_list(cut_file: Path, tof_in: Path) -> np.ndarray:
+    """Converts the events of a cut file into energies like the external
+    tofe_list program does.
+
+    Args:
+        cut_file: path to a cut file whose name is in the format produced
+            by CutFile.save
+        tof_in: path to a tof.in file
+
+    Return:
+        structured array with TOFE_LIST_DTYPE
+    """
+    settings = read_tof_in(tof_in)
+    header, events = read_cut_file(cut_file)
+
+    element = Element.from_string(cut_file.name.split(".")[1])
+    if not element.isotope:
+        element.isotope = element.get_most_common_isotope()
+
+    slope, offset = (
+        float(x) for x in settings["TOF calibration"].split())
+    energies, valid = calculate_energies(
+        events[:, 0], element.get_mass(), float(settings["Toflen"]),
+        slope, offset)
+
+    foil_thickness = float(settings.get("Carbon foil thickness", 0))
+    if foil_thickness > 0 and np.any(valid):
+        energies[valid] = add_foil_energy_loss(
+            energies[valid], element, foil_thickness)
+
+    eff_dir = settings.get("Efficiency directory")
+    if eff_dir:
+        eff_file = Path(eff_dir, f"{element.isotope}{element.symbol}.eff")
+    else:
+        eff_file = None
+    weights = get_efficiency_weights(energies, eff_file)
+
+    result = np.zeros(np.count_nonzero(valid), dtype=TOFE_LIST_DTYPE)
+    result["energy"] = np.round(energies[valid], 5)
+    result["mass_number"] = element.isotope
+    result["mass"] = round(element.get_mass(), 4)
+    result["type"] = header.get("Type", "ERD")
+    result["weight"] = np.round(weights[valid], 5)
+    result["event_number"] = events[valid, -1]
+    return result
+
+
+def calculate_energies(tof_channels: np.ndarray, mass: float, toflen: float,
+                       slope: float, offset: float) \
+        -> Tuple[np.ndarray, np.ndarray]:
+    """Calculates the kinetic energies of particles from their time of
+    flight channels.
+
+    Args:
+        tof_channels: array of time of flight channels
+        mass: mass of the particle in atomic mass units
+        toflen: length of the time of flight path in meters
+        slope: slope of the time of flight calibration (s / channel)
+        offset: offset of the time of flight calibration (s)
+
+    Return:
+        energies in MeV and a boolean mask of events with a positive time of
+        flight. Energies of other events are 0.
+    """
+    times = slope * np.asarray(tof_channels, dtype=float) + offset
+    valid = times > 0
+    energies = np.zeros(len(times))
+    velocities = toflen / times[valid]
+    energies[valid] = 0.5 * gf.convert_amu_to_kg(mass) * velocities ** 2 / \
+        gf.convert_mev_to_joule(1.0)
+    return energies, valid
+
+
+def add_foil_energy_loss(energies: np.ndarray, element: Element,
+                         thickness: float) -> np.ndarray:
+    """Returns the energies that the particles had before they lost energy
+    in the carbon timing foil.
+
+    Args:
+        energies: energies (MeV) after the foil
+        element: Element with isotope
+        thickness: areal density of the carbon foil in ug/cm^2
+
+    Return:
+        energies (MeV) before the foil
+    """
+    # Table is made up to the next power of two so it can be reused for
+    # other cuts of the same element.
+    max_energy = 2.0 ** math.ceil(
+        math.log2(max(2 * float(np.max(energies)), 1.0)))
+    energies_in, energies_out = _get_foil_table(
+        element.symbol, int(element.isotope), thickness, max_energy)
+    return np.interp(energies, energies_out, energies_in)
+
+
+@functools.lru_cache(maxsize=64)
+def _get_foil_table(symbol: str, isotope: int, thickness: float,
+                    max_energy: float) -> Tuple[np.ndarray, np.ndarray]:
+    """Tabulates the energies of a particle before and after the carbon foil.
+
+    Stopping is calculated with jibaltool once for each tabulated energy so
+    the table is cached. Output of jibaltool is not printed.
+    """
+    energies_in = np.geomspace(
+        _FOIL_TABLE_MIN_ENERGY, max_energy, _FOIL_TABLE_SIZE)
+    # carbon_stopping takes thickness in nm and density in g/cm^3. With a
+    # density of 1 g/cm^3, 1 ug/cm^2 corresponds to 10 nm.
+    losses = np.array([
+        gf.carbon_stopping(
+            symbol, isotope, energy, thickness * 10, 1.0, verbose=False)
+        for energy in energies_in
+    ]) / gf.convert_mev_to_joule(1.0)
+    energies_out = energies_in - losses
+    # Particles below the lowest tabulated energy are stopped in the foil.
+    # Keep the table increasing so it can be interpolated.
+    energies_out = np.maximum.accumulate(energies_out)
+    return energies_in, energies_out
+
+
+def get_efficiency_weights(energies: np.ndarray, eff_file: Path) \
+        -> np.ndarray:
+    """Returns weights that correct for the detection efficiency.
+
+    Args:
+        energies: energies (MeV) of the events
+        eff_file: efficiency file that has energy (MeV) and efficiency
+            columns. If the file does not exist, all weights are 1.
+
+    Return:
+        inverse efficiencies. Events whose efficiency is 0 have weight 0.
+        Efficiencies outside the tabulated energies are taken from the
+        closest tabulated energy.
+    """
+    if eff_file is None or not eff_file.is_file():
+        return np.ones(len(energies))
+    table = np.loadtxt(eff_file, comments="#", ndmin=2)
+    efficiencies = np.interp(energies, table[:, 0], table[:, 1])
+    weights = np.zeros(len(energies))
+    positive = efficiencies > 0
+    weights[positive] = 1 / efficiencies[positive]
+    return weights
@@ -1275,98 +1275,82 @@ class Potku(QtWidgets.QMainWindow):
         master_tab = self.tab_widgets[master.tab_id]
         master_name = master.name
 
-        # Load selections and save cut files
+        # Load selections into slaves that have their data loaded
         # TODO: Make a check for these if identical already -> don't redo.
-        # Saving selections takes about 20 % of the processing time
         self.request.save_selection(
             master, progress=sbh.reporter.get_sub_reporter(lambda x: 0.2 * x))
 
-        sbh.reporter.report(21)
+        sbh.reporter.report(20)
 
+        slaves = []
+        tree_root = self.treeWidget.invisibleRootItem()
+        for i in range(tree_root.childCount()):
+            sample_item = tree_root.child(i)
+            for j in range(sample_item.childCount()):
+                tree_item = sample_item.child(j)
+                if isinstance(tree_item.obj, Measurement):
+                    tab = self.tab_widgets[tree_item.tab_id]
+                    tab_name = tab.obj.name
+                    if tab_name == master_name or tab.obj in nonslaves:
+                        continue
+                    slaves.append((tree_item, tab))
+
+        # Load the data, histograms and selections of slaves that have not
+        # been opened yet. These update the GUI so they are done in the main
+        # thread.
+        directory = master.get_data_dir()
+        selection_file = Path(directory, f"{master_name}.selections")
+        unloaded = [(item, tab) for item, tab in slaves if not tab.data_loaded]
+        for i, (tree_item, tab) in enumerate(unloaded):
+            tab.data_loaded = True
+            tab.obj.load_data()
+            tab.add_histogram(progress=sbh.reporter.get_sub_reporter(
+                lambda x: 20 + 0.2 * (100 * i + x) / len(unloaded)
+            ))
+            tab.obj.selector.load(selection_file)
+            tab.histogram.matplotlib.on_draw()
+
+            # Update tree item icon to open folder
+            self.__change_tab_icon(tree_item)
+
+        sbh.reporter.report(40)
+
+        # Cut all slaves in parallel
         self.request.save_cuts(master, progress=sbh.reporter.get_sub_reporter(
-            lambda x: 21 + 0.12 * x))
+            lambda x: 40 + 0.2 * x))
 
-        sbh.reporter.report(33)
+        sbh.reporter.report(60)
 
-        tree_root = self.treeWidget.invisibleRootItem()
-        tree_child_count = tree_root.childCount()
+        # Check all widgets of master and do them for slaves.
+        for i, (tree_item, tab) in enumerate(slaves):
+            item_reporter = sbh.reporter.get_sub_reporter(
+                lambda x: 60 + 0.4 * (100 * i + x) / len(slaves)
+            )
 
-        for i in range(tree_child_count):
-            sample_item = tree_root.child(i)
-            sample_child_count = sample_item.childCount()
+            if master_tab.elemental_losses_widget and tab.data_loaded:
+                if tab.elemental_losses_widget:
+                    tab.del_widget(tab.elemental_losses_widget)
+                tab.make_elemental_losses(master.get_composition_changes_dir())
+                tab.elemental_losses_widget.losses.save_splits()
+                tab.elemental_losses_widget.save_to_file()
 
-            sample_reporter = sbh.reporter.get_sub_reporter(
-                lambda x: 33 + 0.67 * (100 * i + x) / tree_child_count
-            )
-            for j in range(sample_child_count):
-                tree_item = sample_item.child(j)
+            item_reporter.report(40)
 
-                item_reporter = sample_reporter.get_sub_reporter(
-                    lambda x: (100 * j + x) / sample_child_count
-                )
+            if master_tab.depth_profile_widget and tab.data_loaded:
+                if tab.depth_profile_widget:
+                    tab.del_widget(tab.depth_profile_widget)
+                tab.make_depth_profile(Path(master.get_depth_profiles_dir()))
+                tab.depth_profile_widget.save_to_file()
 
-                if isinstance(tree_item.obj, Measurement):
-                    tab = self.tab_widgets[tree_item.tab_id]
-                    tab_obj = tab.obj
-                    tab_name = tab_obj.name
-                    if tab_name == master_name or tab_obj in nonslaves:
-                        continue
-                    # Load measurement data if the slave is
-                    if not tab.data_loaded:
-                        tab.data_loaded = True
-
-                        tab.obj.load_data()
-                        item_reporter.report(20)
-
-                        tab.add_histogram(
-                            progress=item_reporter.get_sub_reporter(
-                                lambda x: 20 + 0.4 * x
-                            ))
-
-                        item_reporter.report(60)
-
-                        # Load selection
-                        directory = master.get_data_dir()
-                        selection_file = Path(directory,
-                                              f"{master_name}.selections")
-                        tab.obj.selector.load(selection_file)
-                        tab.histogram.matplotlib.on_draw()
-
-                        # Save cuts
-                        tab.obj.save_cuts(
-                            progress=item_reporter.get_sub_reporter(
-                                lambda x: 60 + 0.2 * x
-                            ))
-
-                        # Update tree item icon to open folder
-                        self.__change_tab_icon(tree_item)
-
-                    # Check all widgets of master and do them for slaves.
-
-                    if master_tab.elemental_losses_widget and tab.data_loaded:
-                        if tab.elemental_losses_widget:
-                            tab.del_widget(tab.elemental_losses_widget)
-                        tab.make_elemental_losses(master.get_composition_changes_dir())
-                        tab.elemental_losses_widget.losses.save_splits()
-                        tab.elemental_losses_widget.save_to_file()
-
-                    item_reporter.report(80)
-
-                    if master_tab.depth_profile_widget and tab.data_loaded:
-                        if tab.depth_profile_widget:
-                            tab.del_widget(tab.depth_profile_widget)
-                        tab.make_depth_profile(Path(master.get_depth_profiles_dir()))
-                        tab.depth_profile_widget.save_to_file()
-
-                    item_reporter.report(90)
-
-                    if master_tab.energy_spectrum_widget and tab.data_loaded:
-                        if tab.energy_spectrum_widget:
-                            tab.del_widget(tab.energy_spectrum_widget)
-                        tab.make_energy_spectrum(master.get_energy_spectra_dir())
-                        tab.energy_spectrum_widget.save_to_file()
-
-                item_reporter.report(100)
+            item_reporter.report(70)
+
+            if master_tab.energy_spectrum_widget and tab.data_loaded:
+                if tab.energy_spectrum_widget:
+                    tab.del_widget(tab.energy_spectrum_widget)
+                tab.make_energy_spectrum(master.get_energy_spectra_dir())
+                tab.energy_spectrum_widget.save_to_file()
+
+            item_reporter.report(100)
 
         sbh.reporter.report(100)
 
@@ -71,6 +71,24 @@ class TestRecoilParameters(unittest.TestCase):
         self.assertEqual("8-point two-peak",
                          widget.recoilTypeComboBox.currentText())
 
+    def test_early_stopping(self):
+        widget = OptimizationRecoilParameterWidget(
+            convergence_tolerance=0.01, convergence_generations=5)
+        self.assertEqual(0.01, widget.convergence_tolerance)
+        self.assertEqual(5, widget.convergence_generations)
+        self.assertTrue(widget.convergenceToleranceDoubleSpinBox.isEnabled())
+
+        # Early stopping is disabled with a tolerance of None
+        widget.convergence_tolerance = None
+        self.assertIsNone(widget.convergence_tolerance)
+        self.assertFalse(widget.earlyStoppingCheckBox.isChecked())
+        self.assertFalse(widget.convergenceToleranceDoubleSpinBox.isEnabled())
+        self.assertFalse(widget.convergenceGenerationsSpinBox.isEnabled())
+
+        widget.earlyStoppingCheckBox.setChecked(True)
+        self.assertEqual(0.01, widget.convergence_tolerance)
+        self.assertTrue(widget.convergenceGenerationsSpinBox.isEnabled())
+
     def test_bad_inputs(self):
         # Widget should be able to handle bad inputs by retaining previous
         # or default values
@@ -115,6 +133,8 @@ class TestRecoilParameters(unittest.TestCase):
             "cross_p": 0.9,
             "mut_p": 1.0,
             "check_time": 20,
+            "convergence_tolerance": 1e-4,
+            "convergence_generations": 10,
         }
         fluence_expected = {
             "stop_percent": 0.7,
@@ -46,6 +46,7 @@ class TestMCERD(unittest.TestCase):
     @classmethod
     def setUpClass(cls):
         cls.directory = Path(tempfile.gettempdir())
+        cls.work_dir = cls.directory / "He-Default.101.mcerd"
         target = Target(layers=[
             Layer("layer1", [
                 Element.from_string("Li 1.0")
@@ -85,7 +86,7 @@ class TestMCERD(unittest.TestCase):
         # PlatformSwitcher cannot change the separator char in file paths.
         # Therefore the same bin_path and file_path is used for each system
         bin_path = gf.get_bin_dir() / "mcerd"
-        file_path = self.directory / "He-Default"
+        file_path = self.work_dir / "He-Default"
 
         with utils.PlatformSwitcher("Windows"):
             cmd = f"{bin_path}.exe", str(file_path)
@@ -102,27 +103,30 @@ class TestMCERD(unittest.TestCase):
     def test_paths(self):
         """Testing various file paths that MCERD uses."""
         self.assertEqual(
-            self.directory / "He-Default.recoil",
+            self.work_dir / "He-Default.recoil",
             self.mcerd.recoil_file)
         self.assertEqual(
             self.directory / "He-Default.101.erd",
             self.mcerd.result_file)
         self.assertEqual(
-            self.directory / "He-Default",
+            self.work_dir / "He-Default.101.erd",
+            self.mcerd.get_work_result_file())
+        self.assertEqual(
+            self.work_dir / "He-Default",
             self.mcerd.command_file)
 
         # These use the parent prefix, therefore they do not start with 'He'
         self.assertEqual(
-            self.directory / "Default.erd_target",
+            self.work_dir / "Default.erd_target",
             self.mcerd.target_file)
         self.assertEqual(
-            self.directory / "Default.erd_detector",
+            self.work_dir / "Default.erd_detector",
             self.mcerd.detector_file)
         self.assertEqual(
-            self.directory / "Default.foils",
+            self.work_dir / "Default.foils",
             self.mcerd.foils_file)
         self.assertEqual(
-            self.directory / "Default.pre",
+            self.work_dir / "Default.pre",
             self.mcerd.presimulation_file)
 
     def test_get_command_file_contents(self):
@@ -130,10 +134,10 @@ class TestMCERD(unittest.TestCase):
 
         expected = utils.get_template_file_contents(
             detector_file,
-            tgt_file=self.directory / "Default.erd_target",
-            det_file=self.directory / "Default.erd_detector",
-            rec_file=self.directory / "He-Default.recoil",
-            pre_file=self.directory / "Default.pre"
+            tgt_file=self.work_dir / "Default.erd_target",
+            det_file=self.work_dir / "Default.erd_detector",
+            rec_file=self.work_dir / "He-Default.recoil",
+            pre_file=self.work_dir / "Default.pre"
         )
         output = self.mcerd.get_command_file_contents()
 
@@ -144,7 +148,7 @@ class TestMCERD(unittest.TestCase):
 
         expected = utils.get_template_file_contents(
             detector_file,
-            foils_file=self.directory / "Default.foils"
+            foils_file=self.work_dir / "Default.foils"
         )
         output = self.mcerd.get_detector_file_contents()
 
@@ -32,6 +32,10 @@ import threading
 from timeit import default_timer as timer
 
 from modules.concurrency import CancellationToken
+from modules.concurrency import JobScheduler
+from modules.concurrency import get_physical_core_count
+from modules.concurrency import run_in_threads
+from modules.observing import ProgressReporter
 
 
 def sleeper(sleep_time, ct):
@@ -76,5 +80,149 @@ class TestCancellationToken(unittest.TestCase):
         self.assertLess(stop - start, 1.5 * self.sleep_time)
 
 
+class TestRunInThreads(unittest.TestCase):
+    def test_empty(self):
+        values = []
+        self.assertEqual([], run_in_threads(
+            lambda x, p: x, [], progress=ProgressReporter(values.append)))
+        self.assertEqual([100], values)
+
+    def test_results_are_ordered(self):
+        def func(x, _):
+            time.sleep(0.01 * (5 - x))
+            return x * x
+        self.assertEqual([0, 1, 4, 9, 16],
+                         run_in_threads(func, range(5), max_workers=5))
+
+    def test_calls_run_in_multiple_threads(self):
+        barrier = threading.Barrier(3, timeout=5)
+        results = run_in_threads(
+            lambda x, _: barrier.wait() is not None, range(3), max_workers=3)
+        self.assertEqual([True] * 3, results)
+
+    def test_progress_is_aggregated_in_calling_thread(self):
+        values = []
+        threads = set()
+
+        def report(value):
+            threads.add(threading.current_thread())
+            values.append(value)
+
+        def func(x, progress):
+            progress.report(50)
+            time.sleep(0.05)
+            return x
+
+        run_in_threads(func, range(4), progress=ProgressReporter(report),
+                       poll_interval=0.01)
+        self.assertEqual({threading.current_thread()}, threads)
+        self.assertEqual(100, values[-1])
+        self.assertEqual(sorted(values), values)
+
+    def test_cancellation(self):
+        ct = CancellationToken()
+
+        def func(x, _):
+            ct.request_cancellation()
+            return x
+
+        results = run_in_threads(func, range(10), cancellation_token=ct,
+                                 max_workers=1)
+        self.assertEqual([0] + [None] * 9, results)
+
+    def test_exception_is_raised(self):
+        called = []
+
+        def func(x, _):
+            called.append(x)
+            if x == 0:
+                raise ValueError("error")
+            return x
+
+        self.assertRaises(
+            ValueError,
+            lambda: run_in_threads(func, range(10), max_workers=1))
+        self.assertEqual([0], called)
+
+
+class TestJobScheduler(unittest.TestCase):
+    def wait_until(self, condition, timeout=5):
+        end = timer() + timeout
+        while not condition():
+            if timer() > end:
+                self.fail("Condition was not met")
+            time.sleep(0.01)
+
+    def test_default_limit(self):
+        self.assertGreaterEqual(get_physical_core_count(), 1)
+        self.assertEqual(get_physical_core_count(), JobScheduler().max_jobs)
+
+    def test_limit_is_enforced(self):
+        scheduler = JobScheduler(max_jobs=2)
+        lock = threading.Lock()
+        running = []
+        max_running = []
+
+        def job(_, __):
+            with scheduler.acquire(poll_interval=0.01):
+                with lock:
+                    running.append(1)
+                    max_running.append(len(running))
+                time.sleep(0.02)
+                with lock:
+                    running.pop()
+
+        run_in_threads(job, range(8), max_workers=8)
+        self.assertEqual(2, max(max_running))
+        self.assertEqual(0, scheduler.running_count)
+        self.assertEqual(0, scheduler.waiting_count)
+
+    def test_priority_order(self):
+        scheduler = JobScheduler(max_jobs=1)
+        first = scheduler.acquire()
+        started = []
+        threads = []
+        for priority, name in ((2, "simulation 1"), (2, "simulation 2"),
+                               (1, "optimization")):
+            def job(p=priority, n=name):
+                with scheduler.acquire(p, poll_interval=0.01):
+                    started.append(n)
+            thread = threading.Thread(target=job)
+            thread.start()
+            threads.append(thread)
+            # Ensure that jobs are queued in the given order
+            self.wait_until(lambda: scheduler.waiting_count == len(threads))
+
+        first.release()
+        for thread in threads:
+            thread.join(5)
+        self.assertEqual(
+            ["optimization", "simulation 1", "simulation 2"], started)
+
+    def test_cancelled_job_leaves_queue(self):
+        scheduler = JobScheduler(max_jobs=1)
+        slot = scheduler.acquire()
+        ct = CancellationToken()
+        results = []
+        thread = threading.Thread(target=lambda: results.append(
+            scheduler.acquire(1, ct, poll_interval=0.01)))
+        thread.start()
+        self.wait_until(lambda: scheduler.waiting_count == 1)
+        ct.request_cancellation()
+        thread.join(5)
+
+        self.assertEqual([None], results)
+        self.assertEqual(0, scheduler.waiting_count)
+        self.assertEqual(1, scheduler.running_count)
+
+        # Releasing twice frees only one slot
+        slot.release()
+        slot.release()
+        self.assertEqual(0, scheduler.running_count)
+        with scheduler.acquire():
+            self.assertEqual(1, scheduler.running_count)
+        self.assertEqual(0, scheduler.running_count)
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -34,11 +34,18 @@ import tests.utils as utils
 import tests.mock_objects as mo
 
 import modules.file_paths as fp
+import modules.general_functions as gf
+import reactivex as rx
 
+from modules.concurrency import CancellationToken
+from modules.concurrency import JobScheduler
+from modules.mcerd import MCERD
 from modules.recoil_element import RecoilElement
 from modules.element import Element
 from modules.element_simulation import ERDFileHandler
 from modules.element_simulation import ElementSimulation
+from modules.element_simulation import _LineCounter
+from modules.enums import JobPriority
 from modules.enums import OptimizationType
 
 from tests.utils import only_succeed_on
@@ -286,6 +293,76 @@ class TestErdFileHandler(unittest.TestCase):
         t.join()
 
 
+class TestLineCounter(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.file = Path(self.tmp_dir.name, "4He-Default.101.erd")
+        self.counter = _LineCounter(self.file)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def append(self, text):
+        with self.file.open("ab") as file:
+            file.write(text)
+
+    def assert_count(self, expected):
+        self.assertEqual(expected, self.counter.count())
+        self.assertEqual(
+            gf.count_lines_in_file(self.file, check_file_exists=True),
+            self.counter.count())
+
+    def test_appended_lines_are_counted(self):
+        self.assert_count(0)
+        self.append(b"")
+        self.assert_count(0)
+        self.append(b"1 2 3\n4 5 6\n")
+        self.assert_count(2)
+        # Partial last line is counted like count_lines_in_file does
+        self.append(b"7 8")
+        self.assert_count(3)
+        self.append(b" 9\r\n")
+        self.assert_count(3)
+        self.append(b"\n" * 10000)
+        self.assert_count(10003)
+
+    def test_only_appended_bytes_are_read(self):
+        self.append(b"foo\n" * 10)
+        self.assertEqual(10, self.counter.count())
+
+        # Bytes that have already been counted are not read again
+        with self.file.open("r+b") as file:
+            file.write(b"fooo")
+        self.append(b"bar\n")
+        self.assertEqual(11, self.counter.count())
+        self.assertEqual(10, gf.count_lines_in_file(self.file))
+
+    def test_replaced_and_truncated_files_are_recounted(self):
+        self.append(b"foo\n" * 10)
+        self.assert_count(10)
+
+        self.file.write_bytes(b"foo\n" * 3)
+        self.assert_count(3)
+
+        self.file.unlink()
+        self.assert_count(0)
+        self.append(b"foo\nbar\n")
+        self.assert_count(2)
+
+        replacement = self.file.with_suffix(".tmp")
+        replacement.write_bytes(b"foo\n" * 20)
+        os.replace(replacement, self.file)
+        self.assert_count(20)
+
+    def test_cached_count(self):
+        self.append(b"foo\n")
+        self.assertEqual(1, self.counter.get_cached_count())
+        self.append(b"foo\n")
+        self.assertEqual(1, self.counter.get_cached_count())
+        self.assertEqual(2, self.counter.count())
+        self.assertEqual(2, self.counter.get_cached_count())
+
+
 class TestElementSimulation(unittest.TestCase):
     def setUp(self):
         self.main_rec = mo.get_recoil_element()
@@ -580,3 +657,48 @@ def write_line(file):
         # it does not care if the file contains
         # nonsensical data.
         file.write("foo\n")
+
+
+class TestMcerdScheduling(unittest.TestCase):
+    def setUp(self):
+        self.elem_sim = mo.get_element_simulation()
+        self.scheduler = JobScheduler(max_jobs=1)
+        self.elem_sim.request.mcerd_scheduler = self.scheduler
+        self.runs = []
+
+    def run_mcerd(self, *args, niceness=0, **kwargs):
+        self.runs.append(niceness)
+        self.assertEqual(1, self.scheduler.running_count)
+        return rx.of({MCERD.IS_RUNNING: True}, {MCERD.IS_RUNNING: False})
+
+    def test_slot_is_held_while_mcerd_runs(self):
+        with patch.object(ElementSimulation, "_run_mcerd",
+                          side_effect=self.run_mcerd):
+            observable = self.elem_sim._start(
+                None, 101, None, {}, CancellationToken(),
+                JobPriority.SIMULATION)
+            self.assertEqual(1, self.scheduler.running_count)
+            items = []
+            observable.subscribe(items.append)
+
+        self.assertEqual([JobPriority.SIMULATION.get_niceness()], self.runs)
+        self.assertEqual(2, len(items))
+        self.assertEqual(0, self.scheduler.running_count)
+
+    def test_cancelled_process_is_not_started(self):
+        slot = self.scheduler.acquire()
+        ct = CancellationToken()
+        timer = threading.Timer(0.1, ct.request_cancellation)
+        timer.start()
+        with patch.object(ElementSimulation, "_run_mcerd",
+                          side_effect=self.run_mcerd):
+            observable = self.elem_sim._start(
+                None, 101, None, {}, ct, JobPriority.OPTIMIZATION)
+            items = []
+            observable.subscribe(items.append)
+
+        self.assertEqual([], self.runs)
+        self.assertEqual([], items)
+        self.assertEqual(0, self.scheduler.waiting_count)
+        slot.release()
+        self.assertEqual(0, self.scheduler.running_count)
@@ -29,13 +29,16 @@ import tests.mock_objects as mo
 import tests.utils as utils
 import tempfile
 import os
+import time
 import numpy as np
 
 from pathlib import Path
+from unittest.mock import patch
 
 from modules.energy_spectrum import EnergySpectrum, SumEnergySpectrum
 from modules.enums import SumSpectrumType
 from modules.parsing import ToFListParser
+from modules.spectrum_cache import CACHE_DIR_NAME
 
 parser = ToFListParser()
 
@@ -68,7 +71,8 @@ class TestCalculateMeasuredSpectra(unittest.TestCase):
                 mesu, tmp_dir, spectrum_width=0.5)
 
             expected = sorted([
-                *self.expected_hist_files, *self.expected_tofe_list_files
+                *self.expected_hist_files, *self.expected_tofe_list_files,
+                CACHE_DIR_NAME
             ])
             spectra_files = sorted(os.listdir(mesu.get_energy_spectra_dir()))
             self.assertEqual(expected, spectra_files)
@@ -201,6 +205,101 @@ class TestCalculateMeasuredSpectra(unittest.TestCase):
         ]
 
 
+class TestLoadCuts(unittest.TestCase):
+    def test_results_are_in_cut_file_order(self):
+        cuts = [
+            Path(f"cuts.{i}H.ERD.0.cut") for i in range(1, 9)
+        ]
+
+        def tofe_list(cut_file, *args, **kwargs):
+            # Later cut files finish first
+            i = int(cut_file.name.split(".")[1][:-1])
+            time.sleep(0.01 * (9 - i))
+            return [cut_file.name]
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            tmp_dir = Path(tmp_dir)
+            mesu = mo.get_measurement(
+                path=tmp_dir / "mesu.info", save_on_creation=True)
+            mesu.get_detector_or_default().update_directories(
+                tmp_dir / "Detector")
+            with patch.object(EnergySpectrum, "tofe_list", tofe_list):
+                es = EnergySpectrum(mesu, cuts, 0.1, verbose=False)
+
+        self.assertEqual(
+            [f"{i}H.ERD.0" for i in range(1, 9)],
+            list(es._tofe_listed_files))
+        self.assertEqual(
+            [[cut.name] for cut in cuts],
+            list(es._tofe_listed_files.values()))
+
+
+class TestCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        tmp_dir = Path(self.tmp_dir.name)
+        self.mesu = mo.get_measurement(
+            path=tmp_dir / "mesu.info", save_on_creation=True)
+        self.mesu.get_detector_or_default().update_directories(
+            tmp_dir / "Detector")
+        self.mesu.request.global_settings.set_tofe_list_in_process(True)
+        self.cut_file = tmp_dir / "mesu.1H.ERD.0.cut"
+        self.cut_file.write_bytes(
+            (utils.get_resource_dir() / "cuts.1H.ERD.0.cut").read_bytes())
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def calculate(self, spectrum_width=0.2):
+        return EnergySpectrum.calculate_measured_spectra(
+            self.mesu, [self.cut_file], spectrum_width, no_foil=True,
+            verbose=False)
+
+    def test_unchanged_inputs_are_not_recalculated(self):
+        expected = self.calculate()
+        hist_file = EnergySpectrum.get_hist_file_name(
+            self.mesu.get_energy_spectra_dir(), self.mesu.name, "1H.ERD.0",
+            no_foil=True)
+        hist_file.unlink()
+        with patch.object(EnergySpectrum, "tofe_list") as tofe_list:
+            self.assertEqual(expected, self.calculate())
+            # Spectrum with another bin width is calculated from the cached
+            # tofe_list data
+            self.assertTrue(self.calculate(0.5)["1H.ERD.0"])
+        tofe_list.assert_not_called()
+        self.assertTrue(hist_file.exists())
+
+    def test_changed_cut_file_is_recalculated(self):
+        self.calculate()
+        with self.cut_file.open("a") as file:
+            file.write("1100 600 1000000\n")
+        with patch.object(EnergySpectrum, "tofe_list",
+                          return_value=[]) as tofe_list:
+            self.calculate()
+        tofe_list.assert_called_once()
+
+    def test_tofe_list_file_matches_cached_inputs(self):
+        tofe_list_file = EnergySpectrum.get_tofe_list_file_name(
+            self.mesu.get_energy_spectra_dir(), self.cut_file, no_foil=True)
+        eff_file = self.mesu.get_detector_or_default(
+            ).get_efficiency_dir() / "1H.eff"
+
+        self.calculate()
+        contents_a = tofe_list_file.read_text()
+        eff_file.parent.mkdir(parents=True, exist_ok=True)
+        eff_file.write_text("0.0 0.5\n10.0 0.5\n")
+        self.calculate()
+        contents_b = tofe_list_file.read_text()
+        self.assertNotEqual(contents_a, contents_b)
+
+        # Results of the first inputs are taken from the cache
+        eff_file.unlink()
+        with patch.object(EnergySpectrum, "tofe_list") as tofe_list:
+            self.calculate()
+        tofe_list.assert_not_called()
+        self.assertEqual(contents_a, tofe_list_file.read_text())
+
+
 class TestGetTofListFileName(unittest.TestCase):
     def test_when_no_foil_is_false(self):
         directory = Path("tmp", "espes")
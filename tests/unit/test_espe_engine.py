@@ -0,0 +1,316 @@
+# coding=utf-8
+"""
+Created on 17.10.2026
+
+Potku is a graphical user interface for analyzation and
+visualization of measurement data collected from a ToF-ERD
+telescope. For physics calculations Potku uses external
+analyzation components.
+Copyright (C) 2026 Potku developers
+
+This program is free software; you can redistribute it and/or
+modify it under the terms of the GNU General Public License
+as published by the Free Software Foundation; either version 2
+of the License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program (file named 'LICENCE').
+"""
+__version__ = "2.0"
+
+import os
+import platform
+import tempfile
+import unittest
+
+import numpy as np
+
+import tests.mock_objects as mo
+import tests.utils as utils
+import modules.general_functions as gf
+
+from pathlib import Path
+
+from modules.espe_engine import EspeEngine
+from modules.espe_engine import SpectrumAccumulator
+from modules.espe_engine import get_distribution
+from modules.espe_engine import get_energies
+from modules.espe_engine import read_erd_files
+from modules.get_espe import GetEspe
+
+resource_dir = utils.get_resource_dir()
+_RECOIL_FILE = resource_dir / "C-Default.recoil"
+_ERD_FILE = resource_dir / "C-Default.9997.erd"
+_EXPECTED_SPECTRUM_FILE = resource_dir / "C-Default-expected.simu"
+_FLUENCE = 5.00e+11
+
+del resource_dir
+
+
+def has_get_espe() -> bool:
+    if platform.system() == "Windows":
+        return (gf.get_bin_dir() / "get_espe.exe").exists()
+    return (gf.get_bin_dir() / "get_espe").exists()
+
+
+def get_window_sums(espe, width=0.25):
+    """Sums the counts of a spectrum in energy windows.
+    """
+    sums = {}
+    for x, y in espe:
+        window = int(x // width)
+        sums[window] = sums.get(window, 0.0) + y
+    return sums
+
+
+def get_moments(espe):
+    """Returns the mean energy and the standard deviation of the energies
+    of a spectrum.
+    """
+    energies, counts = np.array(espe).T
+    mean = np.average(energies, weights=counts)
+    return mean, np.sqrt(np.average((energies - mean) ** 2, weights=counts))
+
+
+class TestReadErdFiles(unittest.TestCase):
+    def test_read_erd_files(self):
+        events = read_erd_files([_ERD_FILE])
+        self.assertEqual(20, len(events))
+        self.assertEqual({"R", "S"}, set(events["type"]))
+
+    def test_empty_files(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            erd_file = Path(tmp_dir, "C-Default.1.erd")
+            erd_file.touch()
+            self.assertEqual(0, len(read_erd_files([erd_file])))
+            self.assertEqual(0, len(read_erd_files([])))
+
+
+class TestDistribution(unittest.TestCase):
+    def test_get_distribution(self):
+        recoil = mo.get_recoil_element()
+        depths, concentrations = get_distribution(recoil)
+        self.assertEqual(
+            [0.0, 0.99, 1.0, 2.0, 2.01, 2.02], depths.tolist())
+        self.assertEqual(
+            [1e-6, 1e-6, 1.0, 2.0, 0.0, 0.0], concentrations.tolist())
+
+
+class TestEspeEngine(unittest.TestCase):
+    def setUp(self):
+        self.engine = EspeEngine.from_erd_files(
+            [_ERD_FILE], mo.get_detector(), 0.025, fluence=_FLUENCE)
+        distribution = np.loadtxt(_RECOIL_FILE)
+        self.depths = distribution[:, 0]
+        self.concentrations = distribution[:, 1]
+        self.expected = GetEspe.read_espe_file(_EXPECTED_SPECTRUM_FILE)
+
+    def test_only_recoil_events_are_used(self):
+        events = read_erd_files([_ERD_FILE])
+        self.assertEqual(
+            np.count_nonzero(events["type"] == "R"), len(self.engine.depths))
+
+    def test_spectrum_matches_get_espe(self):
+        self.engine.calibrate(self.depths, self.concentrations, self.expected)
+        espe = self.engine.calculate_distribution(
+            self.depths, self.concentrations)
+
+        self.assertEqual(0.0, espe[0][1])
+        self.assertEqual(0.0, espe[-1][1])
+        self.assertAlmostEqual(
+            sum(y for _, y in self.expected), sum(y for _, y in espe),
+            places=3)
+        # Broadening differs so counts are only compared in wide windows.
+        # A shift of two channels or a 10 % wider spectrum fails these.
+        expected_sums = get_window_sums(self.expected)
+        actual_sums = get_window_sums(espe)
+        total = sum(expected_sums.values())
+        differences = [
+            abs(expected_sums.get(window, 0.0) - actual_sums.get(window, 0.0))
+            / total
+            for window in set(expected_sums) | set(actual_sums)
+        ]
+        self.assertLess(max(differences), 0.03)
+        self.assertLess(sum(differences), 0.06)
+
+        expected_mean, expected_std = get_moments(self.expected)
+        actual_mean, actual_std = get_moments(espe)
+        self.assertAlmostEqual(expected_mean, actual_mean, delta=0.01)
+        self.assertAlmostEqual(1.0, actual_std / expected_std, delta=0.02)
+
+    def test_channels_are_centered(self):
+        espe = self.engine.calculate_distribution(
+            self.depths, self.concentrations)
+        for (x0, _), (x1, _) in zip(espe[:-1], espe[1:]):
+            self.assertAlmostEqual(0.025, x1 - x0)
+        self.assertAlmostEqual(0.0, espe[0][0] / 0.025 % 1.0)
+
+    def test_distribution_outside_events_is_empty(self):
+        espe = self.engine.calculate_distribution(
+            np.array([1000.0, 2000.0]), np.array([1.0, 1.0]))
+        self.assertEqual([], espe)
+
+    def test_partial_distribution(self):
+        full = self.engine.get_counts(self.depths, self.concentrations)
+        half = self.engine.get_counts(
+            self.depths, self.concentrations * 0.5)
+        np.testing.assert_allclose(full * 0.5, half)
+
+        shallow = self.engine.get_counts(
+            np.array([0.0, 5.0, 5.01]), np.array([1.0, 1.0, 0.0]))
+        self.assertLess(np.sum(shallow), np.sum(full))
+
+    def test_fluence(self):
+        counts = self.engine.get_counts(self.depths, self.concentrations)
+        double = self.engine.get_counts(
+            self.depths, self.concentrations, fluence=2 * _FLUENCE)
+        np.testing.assert_allclose(2 * counts, double)
+
+    def test_response_is_calculated_in_chunks(self):
+        events = read_erd_files([_ERD_FILE])
+        events = events[events["type"] == "R"]
+        energies, resolutions = get_energies(events, mo.get_detector())
+        first_channel, response = EspeEngine._get_response(
+            energies, resolutions, 0.025)
+        for chunk_size in 1, 3, len(events) - 1:
+            chunk_first_channel, chunk_response = EspeEngine._get_response(
+                energies, resolutions, 0.025, chunk_size=chunk_size)
+            self.assertEqual(first_channel, chunk_first_channel)
+            self.assertEqual(response.shape, chunk_response.shape)
+            np.testing.assert_array_equal(
+                response.toarray(), chunk_response.toarray())
+
+    def test_calibrate_empty_spectrum(self):
+        self.assertRaises(
+            ValueError, self.engine.calibrate, self.depths,
+            self.concentrations, [])
+
+
+class TestSpectrumAccumulator(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.directory = Path(self.tmp_dir.name)
+        self.erd_file = self.directory / "C-Default.201.erd"
+        self.lines = _ERD_FILE.read_bytes().splitlines(keepends=True)
+        distribution = np.loadtxt(_RECOIL_FILE)
+        self.depths = distribution[:, 0]
+        self.concentrations = distribution[:, 1]
+        self.detector = mo.get_detector()
+        self.accumulator = SpectrumAccumulator(
+            self.directory / "C-Default.*.erd", self.detector, 0.025,
+            self.depths, self.concentrations)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def append(self, data: bytes, erd_file=None):
+        with (erd_file or self.erd_file).open("ab") as file:
+            file.write(data)
+
+    def get_expected(self, erd_files) -> list:
+        engine = EspeEngine.from_erd_files(erd_files, self.detector, 0.025)
+        return engine.calculate_distribution(self.depths, self.concentrations)
+
+    def assert_espe_equal(self, expected, actual):
+        self.assertEqual([x for x, _ in expected], [x for x, _ in actual])
+        np.testing.assert_allclose(
+            [y for _, y in expected], [y for _, y in actual])
+
+    def test_appended_events_are_accumulated(self):
+        self.assertEqual(0, self.accumulator.update())
+        self.assertEqual([], self.accumulator.get_espe())
+
+        self.append(b"".join(self.lines[:5]))
+        # Incomplete line is read on the next update
+        self.append(self.lines[5][:10])
+        self.assertEqual(3, self.accumulator.update())
+        self.append(self.lines[5][10:] + b"".join(self.lines[6:]))
+        self.accumulator.update()
+        self.assertEqual(0, self.accumulator.update())
+
+        self.assert_espe_equal(
+            self.get_expected([_ERD_FILE]), self.accumulator.get_espe())
+
+    def test_files_are_combined(self):
+        other_file = self.directory / "C-Default.202.erd"
+        self.append(b"".join(self.lines[:10]))
+        self.append(b"".join(self.lines[10:]), erd_file=other_file)
+        self.accumulator.update()
+        # Files of other recoils are not read
+        self.append(b"".join(self.lines), self.directory / "H-Default.1.erd")
+
+        self.assert_espe_equal(
+            self.get_expected([self.erd_file, other_file]),
+            self.accumulator.get_espe())
+
+    def test_replaced_files_are_read_again(self):
+        self.append(b"".join(self.lines))
+        self.accumulator.update()
+
+        self.erd_file.unlink()
+        self.accumulator.update()
+        self.assertEqual([], self.accumulator.get_espe())
+
+        replacement = self.directory / "replacement"
+        replacement.write_bytes(b"".join(self.lines[:8]))
+        self.append(b"".join(self.lines))
+        self.accumulator.update()
+        os.replace(replacement, self.erd_file)
+        self.accumulator.update()
+        self.assert_espe_equal(
+            self.get_expected([self.erd_file]), self.accumulator.get_espe())
+
+    def test_calibrate(self):
+        self.assertRaises(
+            ValueError, self.accumulator.calibrate, [(1.0, 1.0)])
+        self.append(b"".join(self.lines))
+        self.accumulator.update()
+        expected = GetEspe.read_espe_file(_EXPECTED_SPECTRUM_FILE)
+        self.accumulator.calibrate(expected)
+        self.assertAlmostEqual(
+            sum(y for _, y in expected),
+            sum(y for _, y in self.accumulator.get_espe()))
+
+
+@unittest.skipUnless(has_get_espe(), "get_espe has not been compiled")
+class TestCompareToExternalProgram(unittest.TestCase):
+    def test_reweighted_distribution(self):
+        beam = mo.get_beam()
+        detector = mo.get_detector()
+        target = mo.get_target()
+        kwargs = {
+            "beam": beam, "detector": detector, "target": target,
+            "erd_file": _ERD_FILE, "reference_density": 4.98e22,
+            "ch": 0.025, "fluence": _FLUENCE, "verbose": False
+        }
+        reference = GetEspe.calculate_simulated_spectrum(
+            recoil_file=_RECOIL_FILE, **kwargs)
+        distribution = np.loadtxt(_RECOIL_FILE)
+        engine = EspeEngine.from_erd_files(
+            [_ERD_FILE], detector, 0.025, fluence=_FLUENCE)
+        engine.calibrate(distribution[:, 0], distribution[:, 1], reference)
+
+        depths = np.array([0.0, 100.0, 100.01, 400.0])
+        concentrations = np.array([1.0, 1.0, 0.5, 0.5])
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            recoil_file = Path(tmp_dir, "C-Default.recoil")
+            np.savetxt(recoil_file, np.column_stack((depths, concentrations)))
+            expected = GetEspe.calculate_simulated_spectrum(
+                recoil_file=recoil_file, **kwargs)
+        actual = engine.calculate_distribution(depths, concentrations)
+
+        expected_total = sum(y for _, y in expected)
+        self.assertAlmostEqual(
+            1.0, sum(y for _, y in actual) / expected_total, places=3)
+        expected_mean, _ = get_moments(expected)
+        actual_mean, _ = get_moments(actual)
+        self.assertAlmostEqual(expected_mean, actual_mean, delta=0.02)
+
+
+if __name__ == "__main__":
+    unittest.main()
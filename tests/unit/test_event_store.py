@@ -0,0 +1,206 @@
+# coding=utf-8
+"""
+Created on 17.10.2026
+
+Potku is a graphical user interface for analyzation and
+visualization of measurement data collected from a ToF-ERD
+telescope. For physics calculations Potku uses external
+analyzation components.
+Copyright (C) 2026 Potku developers
+
+This program is free software; you can redistribute it and/or
+modify it under the terms of the GNU General Public License
+as published by the Free Software Foundation; either version 2
+of the License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program (file named 'LICENCE').
+"""
+__version__ = "2.0"
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+import tests.utils as utils
+
+from pathlib import Path
+
+import modules.event_store as event_store
+
+from modules.event_store import EventStore
+
+
+def read_asc_file_legacy(file: Path):
+    # Reference implementation of the old line-by-line .asc reader
+    data = []
+    with file.open("r") as fp:
+        for n, line in enumerate(fp, start=1):
+            split = line.split()
+            if len(split) == 2:
+                data.append([int(split[0]), int(split[1]), n])
+            if len(split) == 3:
+                data.append([int(split[0]), int(split[1]), int(split[2]), n])
+    return data
+
+
+class TestEventStore(unittest.TestCase):
+    def setUp(self):
+        self.asc_file = utils.get_sample_data_dir() / "Ecaart-11-mini" / \
+            "Tof-E_65-mini.asc"
+
+    def test_empty(self):
+        events = EventStore.empty()
+        self.assertEqual(0, len(events))
+        self.assertFalse(events.has_adc())
+        self.assertEqual((0, 3), events.rows().shape)
+
+    def test_column_types(self):
+        events = EventStore.from_asc_file(self.asc_file)
+        self.assertEqual(np.int32, events.tof.dtype)
+        self.assertEqual(np.int32, events.energy.dtype)
+        self.assertEqual(np.uint32, events.event_number.dtype)
+        self.assertIsNone(events.adc)
+
+    def test_sample_data_matches_legacy_reader(self):
+        events = EventStore.from_asc_file(self.asc_file)
+        self.assertEqual(
+            read_asc_file_legacy(self.asc_file), events.rows().tolist())
+
+    def test_chunked_reading(self):
+        content = b"1 2\n3 4\n\n 5  6 \n7 8 9 10\n11\t12\r\n13 14"
+        expected = [[1, 2, 1], [3, 4, 2], [5, 6, 4], [11, 12, 6],
+                    [13, 14, 7]]
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            file = Path(tmp_dir, "events.asc")
+            file.write_bytes(content)
+            for chunk_size in (1, 2, 5, 8, 1000):
+                events = EventStore.from_asc_file(file, chunk_size=chunk_size)
+                self.assertEqual(expected, events.rows().tolist())
+
+    def test_adc_column(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            file = Path(tmp_dir, "events.asc")
+            file.write_text("1 2 3\n4 5 6\n")
+            events = EventStore.from_asc_file(file)
+            self.assertTrue(events.has_adc())
+            self.assertEqual([[1, 2, 3, 1], [4, 5, 6, 2]],
+                             events.rows().tolist())
+            self.assertEqual([[4, 5, 6, 2]],
+                             events.rows(np.array([False, True])).tolist())
+
+    def test_invalid_values(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            file = Path(tmp_dir, "events.asc")
+            for content in ("1 2\n3 a\n", "1 2\n3 4.5\n", "1 2\n3 4-5\n"):
+                file.write_text(content)
+                self.assertRaises(
+                    ValueError, lambda: EventStore.from_asc_file(file))
+
+    def test_get_columns(self):
+        events = EventStore([1, 2], [3, 4], [1, 2])
+        x, y = events.get_columns()
+        self.assertIs(events.tof, x)
+        self.assertIs(events.energy, y)
+        x, y = events.get_columns(transposed=True)
+        self.assertIs(events.energy, x)
+        self.assertIs(events.tof, y)
+
+    def test_unequal_columns(self):
+        self.assertRaises(
+            ValueError, lambda: EventStore([1, 2], [3], [1, 2]))
+        self.assertRaises(
+            ValueError, lambda: EventStore([1, 2], [3, 4], [1, 2], adc=[1]))
+
+
+class TestCacheFile(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.asc_file = Path(self.tmp_dir.name, "mesu.asc")
+        shutil.copyfile(
+            utils.get_sample_data_dir() / "Ecaart-11-mini" /
+            "Tof-E_65-mini.asc", self.asc_file)
+        self.cache_file = event_store.get_cache_file(self.asc_file)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def assert_events_equal(self, expected: EventStore, actual: EventStore):
+        self.assertEqual(expected.rows().tolist(), actual.rows().tolist())
+
+    def test_cache_is_written_and_used(self):
+        self.assertFalse(self.cache_file.exists())
+        events = event_store.load_asc_file(self.asc_file)
+        self.assertTrue(self.cache_file.exists())
+
+        cached = event_store.load_asc_file(self.asc_file)
+        self.assertIsInstance(cached.tof.base, np.memmap)
+        self.assert_events_equal(events, cached)
+
+    def test_adc_column_is_cached(self):
+        self.asc_file.write_text("1 2 3\n4 5\n")
+        event_store.load_asc_file(self.asc_file)
+        cached = event_store.load_asc_file(self.asc_file)
+        self.assertEqual([[1, 2, 3, 1], [4, 5, 0, 2]],
+                         cached.rows().tolist())
+
+    def test_empty_file(self):
+        self.asc_file.write_text("")
+        event_store.load_asc_file(self.asc_file)
+        self.assertEqual(0, len(event_store.load_asc_file(self.asc_file)))
+
+    def test_touched_file_is_validated_by_checksum(self):
+        event_store.load_asc_file(self.asc_file)
+        stat = self.asc_file.stat()
+        os.utime(self.asc_file, ns=(stat.st_atime_ns,
+                                    stat.st_mtime_ns + 10 ** 9))
+        cached = event_store.load_asc_file(self.asc_file)
+        self.assertIsInstance(cached.tof.base, np.memmap)
+        self.assertEqual(
+            self.asc_file.stat().st_mtime_ns,
+            event_store.read_cache_header(self.cache_file)["mtime_ns"])
+
+    def test_modified_file_is_parsed_again(self):
+        event_store.load_asc_file(self.asc_file)
+        stat = self.asc_file.stat()
+        # Same size, different content and checksum
+        content = self.asc_file.read_bytes().replace(b"4792", b"4793", 1)
+        self.asc_file.write_bytes(content)
+        os.utime(self.asc_file, ns=(stat.st_atime_ns,
+                                    stat.st_mtime_ns + 10 ** 9))
+
+        events = event_store.load_asc_file(self.asc_file)
+        self.assertEqual(4793, events.tof[0])
+        self.assertEqual(
+            4793, EventStore.from_cache_file(self.cache_file).tof[0])
+
+    def test_invalid_cache_file_is_replaced(self):
+        event_store.load_asc_file(self.asc_file)
+        with self.cache_file.open("r+b") as fp:
+            fp.truncate(1000)
+        self.assertRaises(
+            ValueError,
+            lambda: event_store.read_cache_header(self.cache_file))
+        events = event_store.load_asc_file(self.asc_file)
+        self.assert_events_equal(
+            EventStore.from_asc_file(self.asc_file), events)
+        event_store.read_cache_header(self.cache_file)
+
+    def test_remove_cache_file(self):
+        event_store.load_asc_file(self.asc_file)
+        event_store.remove_cache_file(self.asc_file)
+        self.assertFalse(self.cache_file.exists())
+        # Removing a file that does not exist is not an error
+        event_store.remove_cache_file(self.asc_file)
+
+
+if __name__ == '__main__':
+    unittest.main()
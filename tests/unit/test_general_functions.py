@@ -32,6 +32,8 @@ import random
 import time
 import tests.utils as utils
 
+import numpy as np
+
 from pathlib import Path
 
 from modules import general_functions as gf
@@ -201,6 +203,27 @@ class TestGeneralFunctions(unittest.TestCase):
         self.assertEqual(77780, gf.round_value_by_four_biggest(77777))
 
 
+def hist_legacy(data, col=0, weight_col=None, width=1.0):
+    # Reference implementation of the old pure Python histogram
+    if not data:
+        return []
+    data_sliced = sorted((
+        (float(row[col]), float(row[weight_col])
+         if weight_col is not None else 1)
+        for row in data), key=lambda x: x[0])
+    a = int(data_sliced[0][0] / width) * width
+    i = 0
+    hist_list = []
+    while i < len(data_sliced):
+        b = 0.0
+        while i < len(data_sliced) and data_sliced[i][0] < a:
+            b += data_sliced[i][1]
+            i += 1
+        hist_list.append((a - width, b))
+        a += width
+    return hist_list
+
+
 class TestHistogramming(unittest.TestCase):
     def test_hist(self):
         data = [
@@ -226,6 +249,38 @@ class TestHistogramming(unittest.TestCase):
         self.assertEqual([], gf.hist([]))
         self.assertRaises(IndexError, lambda: gf.hist([[1]], col=1))
 
+    def test_matches_legacy_implementation(self):
+        rng = np.random.default_rng(7)
+        for width, low, high in ((0.025, 0.0, 20.0), (0.3, -5.0, 5.0),
+                                 (2, -100, 100), (1.0, 1.0, 1.5),
+                                 (0.1, 0.0, 1000.0)):
+            values = rng.uniform(low, high, 2000)
+            # Values that are exactly on bin edges
+            values[:100] = np.round(values[:100] / width) * width
+            data = [(0.0, 0.0, value, 1, 1.0078, "ERD", weight, n)
+                    for n, (value, weight) in enumerate(
+                        zip(values, rng.uniform(0.5, 2.0, len(values))))]
+            self.assertEqual(
+                hist_legacy(data, col=2, width=width),
+                gf.hist(data, col=2, width=width))
+
+            expected = hist_legacy(data, col=2, weight_col=6, width=width)
+            actual = gf.hist(data, col=2, weight_col=6, width=width)
+            self.assertEqual([x for x, _ in expected], [x for x, _ in actual])
+            np.testing.assert_allclose(
+                [y for _, y in expected], [y for _, y in actual], rtol=1e-12)
+
+    def test_array_input(self):
+        data = [(0.5, 2.0), (1.0, 1.0), (2.5, 0.5), (0.25, 1.0)]
+        expected = gf.hist(data, col=0, weight_col=1, width=0.5)
+        self.assertEqual(
+            expected, gf.hist(np.array(data), col=0, weight_col=1, width=0.5))
+        structured = np.array(
+            data, dtype=[("energy", float), ("weight", float)])
+        self.assertEqual(
+            expected, gf.hist(structured, col=0, weight_col=1, width=0.5))
+        self.assertEqual([], gf.hist(np.empty((0, 2))))
+
     def test_hist_properties(self):
         """hist function should have following properties:
             - the sum of values on the y axis should equal the sum of values
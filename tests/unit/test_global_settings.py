@@ -73,6 +73,14 @@ class TestGlobalSettings(unittest.TestCase):
         self.gs.set_tofe_invert_y(True)
         self.assertTrue(self.gs.get_tofe_invert_y())
 
+        self.assertFalse(self.gs.is_tofe_list_in_process())
+        self.gs.set_tofe_list_in_process(True)
+        self.assertTrue(self.gs.is_tofe_list_in_process())
+
+        self.assertFalse(self.gs.is_espe_in_process())
+        self.gs.set_espe_in_process(True)
+        self.assertTrue(self.gs.is_espe_in_process())
+
     def test_int_getters(self):
         self.gs.set_import_coinc_count(555)
         self.assertEqual(555, self.gs.get_import_coinc_count())
@@ -0,0 +1,287 @@
+# coding=utf-8
+"""
+Created on 17.10.2026
+
+Potku is a graphical user interface for analyzation and
+visualization of measurement data collected from a ToF-ERD
+telescope. For physics calculations Potku uses external
+analyzation components.
+Copyright (C) 2026 Potku developers
+
+This program is free software; you can redistribute it and/or
+modify it under the terms of the GNU General Public License
+as published by the Free Software Foundation; either version 2
+of the License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program (file named 'LICENCE').
+"""
+__version__ = "2.0"
+
+import copy
+import math
+import tempfile
+import threading
+import unittest
+import tests.mock_objects as mo
+
+import numpy as np
+
+from pathlib import Path
+from unittest.mock import patch
+
+from modules import file_paths as fp
+from modules.concurrency import CancellationToken
+from modules.element_simulation import ElementSimulation
+from modules.enums import OptimizationType
+from modules.linear_optimization import LinearOptimization
+from modules.linear_optimization import SolutionBox4
+from modules.linear_optimization import SolutionBox6
+from modules.linear_optimization import SolutionPeak8
+from modules.linear_optimization import SolutionPeak10
+from modules.linear_optimization import get_solution6
+
+
+def get_measured_espe(peak_mevs):
+    """Returns measured espe x and y that have peaks at the given energies.
+    """
+    x = np.arange(1.5, 4.0, 0.025)
+    y = sum(100 * np.exp(-(x - mev) ** 2 / 0.01) for mev in peak_mevs)
+    return x, y + 1.0
+
+
+class TestMultiStart(unittest.TestCase):
+    def setUp(self):
+        self.lower_limits = (0.0, 0.0001)
+        self.upper_limits = (100.0, 1.0)
+        self.optimizer = LinearOptimization(
+            element_simulation=mo.get_element_simulation(),
+            optimization_type=OptimizationType.RECOIL,
+            lower_limits=self.lower_limits, upper_limits=self.upper_limits,
+            sol_size=7, cut_file=Path(tempfile.gettempdir(), "foo.cut"),
+            start_count=5, max_workers=3)
+        self.optimizer.measured_espe_x, self.optimizer.measured_espe_y = \
+            get_measured_espe([3.5, 2.5])
+        # Surface is at 4 MeV
+        self.optimizer._mev_to_nm_function = lambda mev: (4.0 - mev) * 40
+        self.optimizer._find_measured_peaks()
+        self.optimizer._find_measured_valleys()
+        self.optimizer.solution = get_solution6(
+            20.0, 40.0, self.lower_limits, self.upper_limits)
+        self.lock = threading.Lock()
+        self.names = []
+
+    def optimize(self, solution, name=""):
+        with self.lock:
+            self.names.append(name)
+        middle = copy.deepcopy(solution)
+        middle.peaks[0].scale_width(0.9)
+        return middle, solution, None
+
+    @staticmethod
+    def evaluate_solution(solution, name=""):
+        # Widest peak fits best
+        return 100.0 - solution.peaks[0].width
+
+    def test_starting_solutions(self):
+        self.optimizer.start_count = 1
+        self.assertEqual([(self.optimizer, self.optimizer.solution)],
+                         self.optimizer._get_starting_solutions())
+
+        self.optimizer.start_count = 5
+        starts = self.optimizer._get_starting_solutions()
+        self.assertEqual(
+            [SolutionBox6, SolutionBox4, SolutionPeak8, SolutionPeak10,
+             SolutionBox6],
+            [type(sol) for _, sol in starts])
+        self.assertIs(self.optimizer, starts[0][0])
+        self.assertIs(self.optimizer.solution, starts[0][1])
+        self.assertIs(self.optimizer, starts[-1][0])
+        scaled_peak = starts[-1][1].peaks[0]
+        self.assertNotEqual(
+            (20.0, 1.0),
+            (round(scaled_peak.width, 6), round(scaled_peak.center.get_y(), 6)))
+        self.assertEqual(
+            [1, 1, 2, 2, 1],
+            [optimizer.peak_count for optimizer, _ in starts])
+        for optimizer, sol in starts:
+            self.assertEqual(len(optimizer.measured_peaks_nm),
+                             len(sol.peaks))
+            self.assertEqual(self.lower_limits[0], sol.points[0].get_x())
+            self.assertEqual(self.upper_limits[0], sol.points[-1].get_x())
+            xs = [p.get_x() for p in sol.points]
+            self.assertEqual(sorted(xs), xs)
+
+        # Initial solution and optimizer are not modified
+        self.assertAlmostEqual(
+            20.0, self.optimizer.solution.peaks[0].width)
+        self.assertEqual(("box", 7, 1), (
+            self.optimizer.rec_type, self.optimizer.sol_size,
+            self.optimizer.peak_count))
+
+    def test_shapes_without_measured_peaks_are_left_out(self):
+        self.optimizer.measured_espe_x, self.optimizer.measured_espe_y = \
+            get_measured_espe([3.5])
+        starts = self.optimizer._get_starting_solutions()
+        self.assertEqual(
+            [SolutionBox6, SolutionBox4, SolutionBox6, SolutionBox6,
+             SolutionBox6],
+            [type(sol) for _, sol in starts])
+
+    def test_best_start_is_returned(self):
+        with patch.object(LinearOptimization, "_optimize",
+                          side_effect=self.optimize), \
+                patch.object(LinearOptimization, "evaluate_solution",
+                             side_effect=self.evaluate_solution) as evaluate:
+            first, middle, last, message, values = \
+                self.optimizer._optimize_starting_solutions()
+
+        # The last fitted solutions are scored
+        self.assertEqual(5, evaluate.call_count)
+        self.assertEqual(5, len(values))
+        self.assertEqual(5, len(set(self.names)))
+        self.assertEqual(min(values), 100.0 - last.peaks[0].width)
+        self.assertIs(first, last)
+        self.assertIsNone(message)
+        widths = [sol.peaks[0].width
+                  for _, sol in self.optimizer._get_starting_solutions()]
+        self.assertAlmostEqual(max(widths), first.peaks[0].width)
+
+    def test_fitted_solutions_are_ranked(self):
+        # Fitting reverses the order of the peak widths, so the widest
+        # starting solution gives the narrowest fit
+        def optimize(solution, name=""):
+            fitted = copy.deepcopy(solution)
+            fitted.peaks[0].scale_width(
+                (120.0 - solution.peaks[0].width) / solution.peaks[0].width)
+            return solution, fitted, None
+
+        with patch.object(LinearOptimization, "_optimize",
+                          side_effect=optimize), \
+                patch.object(LinearOptimization, "evaluate_solution",
+                             side_effect=self.evaluate_solution):
+            first, middle, last, _, values = \
+                self.optimizer._optimize_starting_solutions()
+
+        widths = [sol.peaks[0].width
+                  for _, sol in self.optimizer._get_starting_solutions()]
+        self.assertNotEqual(np.argmax(widths), np.argmin(values))
+        self.assertAlmostEqual(min(widths), first.peaks[0].width)
+        self.assertAlmostEqual(min(values), 100.0 - last.peaks[0].width)
+
+    def test_failed_starts_are_ignored(self):
+        def optimize(solution, name=""):
+            if name != "start-2":
+                return "fitting failed", None, None
+            return solution, "fitting failed", None
+
+        with patch.object(LinearOptimization, "_optimize",
+                          side_effect=optimize), \
+                patch.object(LinearOptimization, "evaluate_solution",
+                             return_value=1.0) as evaluate:
+            first, middle, last, _, values = \
+                self.optimizer._optimize_starting_solutions()
+
+        self.assertEqual(4, sum(math.isinf(value) for value in values))
+        self.assertEqual(1.0, values[2])
+        # The middle solution is scored when the last fit failed
+        evaluate.assert_called_once_with(middle, "start-2")
+        self.assertIs(first, middle)
+        self.assertEqual("fitting failed", last)
+
+    def test_cancellation(self):
+        ct = CancellationToken()
+        ct.request_cancellation()
+        with patch.object(LinearOptimization, "_optimize",
+                          side_effect=self.optimize):
+            first, middle, last, _, values = \
+                self.optimizer._optimize_starting_solutions(ct)
+
+        self.assertEqual([], self.names)
+        self.assertIs(self.optimizer.solution, first)
+        self.assertIsInstance(middle, str)
+        self.assertIsNone(last)
+        self.assertTrue(all(math.isinf(value) for value in values))
+
+
+class TestMevToNmCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.elem_sim = ElementSimulation(
+            Path(self.tmp_dir.name), mo.get_request(),
+            [mo.get_recoil_element()], simulation=mo.get_simulation(),
+            save_on_creation=False)
+        self.erd_file = Path(
+            self.tmp_dir.name,
+            fp.get_erd_file_name(self.elem_sim.get_main_recoil(), 101,
+                                 optim_mode=OptimizationType.RECOIL))
+        self.erd_file.write_text("1 2 3\n")
+        self.optimizer = LinearOptimization(
+            element_simulation=self.elem_sim,
+            optimization_type=OptimizationType.RECOIL,
+            lower_limits=(0.0, 0.0001), upper_limits=(100.0, 1.0),
+            sol_size=7, sample_count=6, sample_width=3.0,
+            cut_file=Path(self.tmp_dir.name, "foo.cut"))
+        self.optimizer.measured_espe_x = np.arange(0.0, 10.0, 0.025)
+        self.run_count = 0
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def run_solutions(self, solutions):
+        self.run_count += 1
+        x = np.arange(0.0, 10.0, 0.025)
+        espes = []
+        for sol in solutions:
+            # Deeper samples have lower energies
+            mev = 9.0 - sol.peaks[0].center.get_x() / 15
+            y = 100 * np.exp(-(x - mev) ** 2 / 0.2)
+            espes.append(list(zip(x, y)))
+        return espes
+
+    def generate(self):
+        with patch.object(LinearOptimization, "_run_solutions",
+                          side_effect=self.run_solutions):
+            self.optimizer._generate_mev_to_nm_function()
+        return self.optimizer._convert_mev_to_nm(6.0)
+
+    def test_conversion_is_reused(self):
+        nm = self.generate()
+        self.assertAlmostEqual(45.0, nm, delta=1.0)
+        samples = self.optimizer.mev_to_nm_samples
+        self.assertEqual(3, samples.shape[0])
+
+        self.optimizer._mev_to_nm_function = None
+        self.assertEqual(nm, self.generate())
+        self.assertEqual(1, self.run_count)
+        np.testing.assert_array_equal(
+            samples, self.optimizer.mev_to_nm_samples)
+
+    def test_changed_inputs_are_not_reused(self):
+        self.generate()
+        self.erd_file.write_text("1 2 4\n")
+        self.generate()
+        self.assertEqual(2, self.run_count)
+
+        self.optimizer.sample_polynomial_degree = 1
+        self.generate()
+        self.assertEqual(3, self.run_count)
+
+        self.elem_sim.simulation.run.beam.energy += 1
+        self.generate()
+        self.assertEqual(4, self.run_count)
+
+        self.optimizer.sample_polynomial_degree = 2
+        self.erd_file.write_text("1 2 3\n")
+        self.elem_sim.simulation.run.beam.energy -= 1
+        self.generate()
+        self.assertEqual(4, self.run_count)
+
+
+if __name__ == "__main__":
+    unittest.main()
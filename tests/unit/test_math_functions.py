@@ -480,6 +480,56 @@ class TestPointInside(unittest.TestCase):
         self.assertFalse(mf.point_inside_polygon(Point(1.5, 0.25), rectangle))
 
 
+class TestPointsInside(unittest.TestCase):
+    def setUp(self):
+        xs, ys = np.meshgrid(np.arange(-2, 25), np.arange(-2, 25))
+        self.x = xs.ravel()
+        self.y = ys.ravel()
+
+    def inside(self, poly):
+        mask = mf.points_inside_polygon(self.x, self.y, poly)
+        return set(zip(self.x[mask].tolist(), self.y[mask].tolist()))
+
+    def test_empty_polygon(self):
+        self.assertEqual(set(), self.inside([]))
+        self.assertEqual(set(), self.inside([(0, 0)]))
+        self.assertEqual(set(), self.inside([(0, 0), (10, 0)]))
+
+    def test_square(self):
+        # Points on the edges are not inside the selection
+        square = [(0, 0), (0, 4), (4, 4), (4, 0)]
+        self.assertEqual(
+            {(x, y) for x in range(1, 4) for y in range(0, 4)},
+            self.inside(square))
+
+    def test_triangle(self):
+        triangle = [(0, 0), (10, 10), (20, 0)]
+        inside = self.inside(triangle)
+        self.assertIn((10, 5), inside)
+        self.assertNotIn((5, 5), inside)
+        self.assertNotIn((20, 5), inside)
+        self.assertNotIn((10, 10), inside)
+
+    def test_matches_single_point_test(self):
+        # Vertices are chosen so that no point is on an edge
+        polygon = [(1.37, 1.21), (3.13, 20.61), (12.29, 16.43),
+                   (22.71, 21.17), (18.53, 2.39), (9.41, 9.07)]
+        mask = mf.points_inside_polygon(self.x, self.y, polygon)
+        expected = [
+            mf.point_inside_polygon((x, y), polygon)
+            for x, y in zip(self.x.tolist(), self.y.tolist())
+        ]
+        self.assertEqual(expected, mask.tolist())
+
+    def test_transposed(self):
+        polygon = [(1.37, 1.21), (3.13, 20.61), (12.29, 16.43),
+                   (22.71, 21.17), (18.53, 2.39), (9.41, 9.07)]
+        transposed = [(y, x) for x, y in polygon]
+        self.assertEqual(
+            mf.points_inside_polygon(self.x, self.y, polygon).tolist(),
+            mf.points_inside_polygon(self.y, self.x, transposed).tolist())
+
+
 class TestBinCounts(unittest.TestCase):
     def setUp(self):
         a, b = 0, 100
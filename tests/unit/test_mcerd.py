@@ -24,18 +24,23 @@ along with this program (file named 'LICENCE').
 __author__ = "Juhani Sundell"
 __version__ = "2.0"
 
+import os
 import unittest
 import reactivex as rx
 import subprocess
-import time
+import sys
+import threading
 import tempfile
-import platform
 from pathlib import Path
+from reactivex import operators as ops
 
 from modules.concurrency import CancellationToken
 import modules.mcerd as mcerd
+import tests.mock_objects as mo
 
 from tests.mock_objects import MockObserver
+from unittest.mock import Mock
+from unittest.mock import patch
 
 
 class TestParseOutput(unittest.TestCase):
@@ -166,194 +171,204 @@ class TestParseOutput(unittest.TestCase):
         }, obs.nexts[-1])
 
 
-FAILURE_MSG = "This test is based on timing and may fail because the " \
-              "code being tested ran faster or slower than expected. " \
-              "Run this test again to see if the problem persists and " \
-              "adjust the timing parameters if necessary."
-
-if platform.system() == "Windows":
-    # Add little extra to the sleep time on Windows as the TASKKILL call
-    # seems to block until the process is fully killed.
-    DEFAULT_SLEEP_TIME = 0.2
-else:
-    DEFAULT_SLEEP_TIME = 0.1
-
-
-class TestTimeoutCheck(unittest.TestCase):
-    def test_process_is_killed_after_timeout(self):
-        ct = CancellationToken()
-        with subprocess.Popen(["sleep", "1"]) as proc:
-            res = mcerd.MCERD.timeout_check(proc, 0.01, ct)
-
-            obs = MockObserver()
-            res.subscribe(obs)
-            time.sleep(DEFAULT_SLEEP_TIME)
-
-            self.assertNotEqual(0, int(proc.poll()), msg=FAILURE_MSG)
-            self.assertEqual([{
-                "is_running": False,
-                "msg": "Simulation timed out"
-                }],
-                obs.nexts, msg=FAILURE_MSG)
-            self.assertTrue(ct.is_cancellation_requested(), msg=FAILURE_MSG)
-
-    def test_timeout_check_returns_only_one_item_at_maximum(self):
-        ct = CancellationToken()
-        with subprocess.Popen(["sleep", "1"]) as proc:
-            res = mcerd.MCERD.timeout_check(proc, 0.01, ct)
-
-            obs = MockObserver()
-            res.subscribe(obs)
-            time.sleep(DEFAULT_SLEEP_TIME)
-
-            self.assertEqual(1, len(obs.nexts), msg=FAILURE_MSG)
-
-    def test_process_ending_before_timeout_does_not_change_outcome(self):
-        ct = CancellationToken()
-        with subprocess.Popen(
-                ["echo", "hello"], stdout=subprocess.DEVNULL) as proc:
-            res = mcerd.MCERD.timeout_check(proc, 0.01, ct)
+def get_mcerd(seed: int, sim_dir: Path) -> mcerd.MCERD:
+    elem_sim = mo.get_element_simulation()
+    elem_sim.simulation = mo.get_simulation()
+    settings, run, detector = elem_sim.get_mcerd_params()
+    settings.update({
+        "beam": run.beam,
+        "target": elem_sim.simulation.target,
+        "detector": detector,
+        "recoil_element": elem_sim.get_main_recoil(),
+        "sim_dir": sim_dir
+    })
+    return mcerd.MCERD(seed, settings, "foo")
+
+
+class TestMcerdFiles(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.sim_dir = Path(self.tmp_dir.name)
+        self.mcerds = [
+            get_mcerd(seed, self.sim_dir) for seed in (101, 102)
+        ]
 
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_processes_have_separate_files(self):
+        for m in self.mcerds:
+            m.create_mcerd_files()
+
+        first, second = self.mcerds
+        self.assertNotEqual(first.work_dir, second.work_dir)
+        for m in self.mcerds:
+            for file in (m.command_file, m.target_file, m.detector_file,
+                         m.foils_file, m.recoil_file):
+                self.assertTrue(file.is_file())
+                self.assertEqual(m.work_dir, file.parent)
+            self.assertIn(f"Seed number of the random number generator: "
+                          f"{m._seed}", m.command_file.read_text())
+            self.assertIn(str(m.target_file), m.command_file.read_text())
+            self.assertEqual(self.sim_dir, m.result_file.parent)
+            self.assertEqual(
+                (str(m.command_file.with_name(m.result_file.name)),),
+                (str(m.get_work_result_file()),))
+
+    def test_result_file_is_visible_while_running(self):
+        m = self.mcerds[0]
+        m.create_mcerd_files()
+        with open(m.get_work_result_file(), "w") as file:
+            file.write("1 2 3\n")
+        self.assertEqual("1 2 3\n", m.result_file.read_text())
+
+        m.delete_unneeded_files()
+        self.assertFalse(m.work_dir.exists())
+        self.assertEqual("1 2 3\n", m.result_file.read_text())
+        # Cleaning up twice is a no-op
+        m.delete_unneeded_files()
+        self.assertEqual("1 2 3\n", m.result_file.read_text())
+
+    def test_result_file_is_symlinked_if_it_cannot_be_hard_linked(self):
+        m = self.mcerds[0]
+        with patch.object(os, "link", side_effect=OSError):
+            m.create_mcerd_files()
+        self.assertTrue(m.result_file.is_symlink())
+        m.get_work_result_file().write_text("1 2 3\n")
+        self.assertEqual("1 2 3\n", m.result_file.read_text())
+
+        m.delete_unneeded_files()
+        self.assertFalse(m.work_dir.exists())
+        self.assertFalse(m.result_file.is_symlink())
+        self.assertEqual("1 2 3\n", m.result_file.read_text())
+
+    def test_result_file_is_moved_if_it_cannot_be_linked(self):
+        m = self.mcerds[0]
+        logger = Mock()
+        with patch.object(os, "link", side_effect=OSError), \
+                patch.object(Path, "symlink_to", side_effect=OSError):
+            m.create_mcerd_files(logger)
+        logger.log_error.assert_called_once()
+        self.assertFalse(m.result_file.exists())
+        m.get_work_result_file().write_text("1 2 3\n")
+
+        m.delete_unneeded_files()
+        self.assertFalse(m.work_dir.exists())
+        self.assertEqual("1 2 3\n", m.result_file.read_text())
+
+    def test_existing_result_file_is_not_overwritten(self):
+        m = self.mcerds[0]
+        m.result_file.write_text("1 2 3\n")
+        self.assertRaises(FileExistsError, m.create_mcerd_files)
+        self.assertEqual("1 2 3\n", m.result_file.read_text())
+
+    def test_remove_stale_work_dirs(self):
+        linked, symlinked = self.mcerds
+        linked.create_mcerd_files()
+        linked.get_work_result_file().write_text("1 2 3\n")
+        with patch.object(os, "link", side_effect=OSError):
+            symlinked.create_mcerd_files()
+        symlinked.get_work_result_file().write_text("4 5 6\n")
+        other_dir = self.sim_dir / f"foo.101{mcerd.MCERD.WORK_DIR_SUFFIX}"
+        other_dir.mkdir()
+
+        recoil = linked._settings["recoil_element"]
+        mcerd.MCERD.remove_stale_work_dirs(self.sim_dir, recoil)
+
+        self.assertFalse(linked.work_dir.exists())
+        self.assertFalse(symlinked.work_dir.exists())
+        self.assertTrue(other_dir.exists())
+        self.assertEqual("1 2 3\n", linked.result_file.read_text())
+        self.assertFalse(symlinked.result_file.is_symlink())
+        self.assertEqual("4 5 6\n", symlinked.result_file.read_text())
+
+
+MCERD_OUTPUT = (
+    "Reading input files.",
+    "Starting simulation.",
+    "Calculated 50 of 100 ions (50%)",
+    "Presimulation finished",
+    "Calculated 100 of 100 ions (100%)",
+)
+
+
+class TestRun(unittest.TestCase):
+    """Runs Python scripts in place of MCERD.
+    """
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.mcerd = get_mcerd(101, Path(self.tmp_dir.name))
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def run_script(self, script, on_next=None, timeout=5,
+                   **kwargs) -> MockObserver:
         obs = MockObserver()
-        res.subscribe(obs)
-        time.sleep(DEFAULT_SLEEP_TIME)
-
-        self.assertEqual(0, proc.poll(), msg=FAILURE_MSG)
-        self.assertEqual([{
-            "is_running": False,
-            "msg": "Simulation timed out"
-        }],
-            obs.nexts, msg=FAILURE_MSG)
-        self.assertTrue(ct.is_cancellation_requested(), msg=FAILURE_MSG)
-
-    def test_process_is_not_killed_before_timeout(self):
-        ct = CancellationToken()
-        with subprocess.Popen(["sleep", "1"]) as proc:
-            res = mcerd.MCERD.timeout_check(proc, 0.1, ct)
-
-            obs = MockObserver()
-            res.subscribe(obs)
-
-            self.assertIsNone(proc.poll(), msg=FAILURE_MSG)
-            self.assertEqual([], obs.nexts, msg=FAILURE_MSG)
-            self.assertFalse(ct.is_cancellation_requested(), msg=FAILURE_MSG)
-
+        done = threading.Event()
+        cmd = sys.executable, "-c", script
+        with patch.object(mcerd.MCERD, "get_command", return_value=cmd):
+            self.mcerd.run(print_output=False, ct_check=0.01, **kwargs).pipe(
+                ops.do_action(on_next=on_next),
+                ops.finally_action(done.set)
+            ).subscribe(obs)
+        self.assertTrue(done.wait(timeout))
+        return obs
+
+    def test_output_is_parsed(self):
+        script = "\n".join(f"print({line!r})" for line in MCERD_OUTPUT)
+        obs = self.run_script(script)
 
-class TestCancellationCheck(unittest.TestCase):
-    def test_requesting_cancellation_kills_the_process(self):
-        ct = CancellationToken()
-        with subprocess.Popen(["sleep", "1"]) as proc:
-            res = mcerd.MCERD.cancellation_check(proc, 0.01, ct)
-
-            obs = MockObserver()
-            res.subscribe(obs)
-            ct.request_cancellation()
-
-            time.sleep(DEFAULT_SLEEP_TIME)
-            self.assertNotEqual(0, int(proc.poll()), msg=FAILURE_MSG)
-            self.assertEqual([{
-                "is_running": False,
-                "msg": "Simulation was stopped"
-                }],
-                obs.nexts, msg=FAILURE_MSG)
-
-    def test_not_requesting_cancellation_lets_the_process_finish(self):
-        ct = CancellationToken()
-        with subprocess.Popen(["sleep", "0.1"]) as proc:
-            res = mcerd.MCERD.cancellation_check(proc, 0.01, ct)
-
-            obs = MockObserver()
-            res.subscribe(obs)
-
-            time.sleep(0.2)
-            self.assertEqual(0, proc.poll(), msg=FAILURE_MSG)
-            self.assertEqual([], obs.nexts, msg=FAILURE_MSG)
-
-    def test_cancellation_check_returns_one_item_at_maximum(self):
-        ct = CancellationToken()
-        with subprocess.Popen(["sleep", "1"]) as proc:
-            res = mcerd.MCERD.cancellation_check(proc, 0.01, ct)
-
-            obs = MockObserver()
-            res.subscribe(obs)
-
-            time.sleep(0.25)
-            ct.request_cancellation()
-            time.sleep(0.25)
-
-            self.assertEqual(1, len(obs.nexts), msg=FAILURE_MSG)
+        self.assertEqual([], obs.errs)
+        self.assertEqual(
+            [True] * (len(obs.nexts) - 1) + [False],
+            [x["is_running"] for x in obs.nexts])
+        self.assertEqual({
+            "presim": False,
+            "msg": "",
+            "seed": 101,
+            "name": self.mcerd._rec_filename,
+            "calculated": 100,
+            "percentage": 100,
+            "total": 100,
+            "is_running": False
+        }, obs.nexts[-1])
+        self.assertFalse(self.mcerd.work_dir.exists())
 
-    def test_cancelling_after_process_ends_does_not_change_observed_values(
-            self):
+    def test_cancellation(self):
         ct = CancellationToken()
-        with subprocess.Popen(["echo", "hello"], stdout=subprocess.DEVNULL) as \
-                proc:
-            res = mcerd.MCERD.cancellation_check(proc, 0.01, ct)
+        script = "import time\nprint('Starting simulation.', flush=True)\n" \
+                 "time.sleep(5)"
+        obs = self.run_script(
+            script, on_next=lambda _: ct.request_cancellation(), ct=ct)
 
-        obs = MockObserver()
-        res.subscribe(obs)
-        ct.request_cancellation()
-
-        time.sleep(DEFAULT_SLEEP_TIME)
-        self.assertEqual(0, proc.poll(), msg=FAILURE_MSG)
-        self.assertEqual([{
+        self.assertEqual([], obs.errs)
+        self.assertEqual({
             "is_running": False,
             "msg": "Simulation was stopped"
-        }],
-            obs.nexts, msg=FAILURE_MSG)
+        }, {k: obs.nexts[-1][k] for k in ("is_running", "msg")})
 
-    def test_process_is_not_killed_immediately_after_cancellation(self):
+    def test_timeout(self):
         ct = CancellationToken()
-        with subprocess.Popen(["sleep", "1"]) as proc:
-            res = mcerd.MCERD.cancellation_check(proc, 0.05, ct)
-
-            obs = MockObserver()
-            res.subscribe(obs)
-            ct.request_cancellation()
-
-            self.assertIsNone(proc.poll(), msg=FAILURE_MSG)
-            self.assertEqual([], obs.nexts, msg=FAILURE_MSG)
-
+        script = "import time\nprint('Starting simulation.', flush=True)\n" \
+                 "time.sleep(5)"
+        obs = self.run_script(script, ct=ct, max_time=0.5)
 
-class TestRunningCheck(unittest.TestCase):
-    def test_running_check_produces_dicts_with_running_status(self):
-        with subprocess.Popen(["sleep", "0.1"]) as proc:
-            res = mcerd.MCERD.running_check(proc, 0.01, 0.01)
-            obs = MockObserver()
-            res.subscribe(obs)
+        self.assertEqual([], obs.errs)
+        self.assertEqual({
+            "is_running": False,
+            "msg": "Simulation timed out"
+        }, {k: obs.nexts[-1][k] for k in ("is_running", "msg")})
+        self.assertTrue(ct.is_cancellation_requested())
 
-        time.sleep(0.05)
-        self.assertLess(1, len(obs.nexts), msg=FAILURE_MSG)
-        for item in obs.nexts[:-1]:
-            self.assertEqual({
-                "is_running": True
-            }, item)
+    def test_error_code(self):
+        obs = self.run_script("print('Starting simulation.')\nexit(3)")
 
-        self.assertEqual({
-                "is_running": False
-        }, obs.nexts[-1], msg=FAILURE_MSG)
-
-
-class TestIsRunning(unittest.TestCase):
-    def test_is_running_returns_false_if_process_is_not_running(self):
-        with subprocess.Popen(
-                ["echo", "hello"], stdout=subprocess.DEVNULL) as proc:
-            pass
-        self.assertFalse(mcerd.MCERD.is_running(proc), msg=FAILURE_MSG)
-
-    def test_is_running_returns_true_if_process_is_running(self):
-        with subprocess.Popen(["sleep", "0.1"]) as proc:
-            self.assertTrue(mcerd.MCERD.is_running(proc), msg=FAILURE_MSG)
-
-    def test_is_running_raises_error_if_process_finishes_with_error(self):
-        with tempfile.TemporaryDirectory() as tmp_dir:
-            p = Path(tmp_dir, "foo")
-            with subprocess.Popen(
-                    ["ls", str(p)], stderr=subprocess.DEVNULL) as proc:
-                pass
-            self.assertRaises(
-                subprocess.SubprocessError,
-                lambda: mcerd.MCERD.is_running(proc))
+        self.assertEqual(1, len(obs.errs))
+        self.assertIsInstance(obs.errs[0], subprocess.SubprocessError)
+        self.assertEqual(
+            "MCERD stopped with an error code 3.", str(obs.errs[0]))
+        self.assertFalse(self.mcerd.work_dir.exists())
 
 
 if __name__ == '__main__':
@@ -28,13 +28,16 @@ import unittest
 import tempfile
 import copy
 import os
+import time
 
 import tests.utils as utils
 import tests.mock_objects as mo
 
 from pathlib import Path
 
+from modules.event_store import EventStore
 from modules.measurement import Measurement
+from modules.selection import Selector
 
 
 class TestFolderStructure(unittest.TestCase):
@@ -203,3 +206,92 @@ class TestMeasurement(unittest.TestCase):
     def test_measurement_has_slots(self):
         m = mo.get_measurement()
         utils.assert_has_slots(m)
+
+
+class TestSaveCuts(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        path = Path(self.tmp_dir.name, "Sample_01-s", "Measurement_01-mesu")
+        self.mesu = Measurement(
+            mo.get_request(), path / "mesu.info", name="mesu",
+            save_on_creation=False, enable_logging=False)
+        self.mesu.create_folder_structure(path)
+        self.mesu.data = EventStore.from_asc_file(
+            utils.get_sample_data_dir() / "Ecaart-11-mini" /
+            "Tof-E_65-mini.asc")
+        self.mesu.selector = Selector(
+            self.mesu, mo.get_global_settings().get_default_colors())
+        for line in (
+                "ERD    H    1    1.0        red    "
+                "4000,5000,5000,4000;200,200,700,700",
+                "ERD    H    1    1.0        red    "
+                "6000,7000,7000,6000;200,200,700,700",
+                "ERD    C    12    1.0        red    "
+                "2000,3000,3000,2000;1000,1000,2000,2000"):
+            self.mesu.selector.selection_from_string(line)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def get_cut_files(self):
+        return {
+            file.name: file.stat().st_mtime_ns
+            for file in self.mesu.get_cuts_dir().iterdir()
+        }
+
+    def test_only_changed_cuts_are_saved(self):
+        self.mesu.save_cuts()
+        cut_files = self.get_cut_files()
+        self.assertEqual(
+            ["mesu.12C.ERD.0.cut", "mesu.1H.ERD.0.cut", "mesu.1H.ERD.1.cut"],
+            sorted(cut_files))
+
+        time.sleep(0.01)
+        self.mesu.save_cuts()
+        self.assertEqual(cut_files, self.get_cut_files())
+
+        selection = self.mesu.selector.get_at(0)
+        selection.points.set_data(
+            [4000, 5000, 5000, 4000], [200, 200, 800, 800])
+        self.mesu.save_single_cut(selection)
+        new_cut_files = self.get_cut_files()
+        self.assertEqual(cut_files.keys(), new_cut_files.keys())
+        self.assertNotEqual(
+            cut_files["mesu.1H.ERD.0.cut"], new_cut_files["mesu.1H.ERD.0.cut"])
+        self.assertEqual(
+            cut_files["mesu.1H.ERD.1.cut"], new_cut_files["mesu.1H.ERD.1.cut"])
+        self.assertEqual(
+            cut_files["mesu.12C.ERD.0.cut"],
+            new_cut_files["mesu.12C.ERD.0.cut"])
+
+    def test_incremental_cuts_match_full_save(self):
+        self.mesu.save_cuts()
+        self.mesu.selector.selections.pop(0)
+        self.mesu.save_cuts()
+        incremental = {
+            file.name: file.read_text()
+            for file in self.mesu.get_cuts_dir().iterdir()
+        }
+        self.assertEqual(
+            ["mesu.12C.ERD.0.cut", "mesu.1H.ERD.0.cut"], sorted(incremental))
+
+        for file in self.mesu.get_cuts_dir().iterdir():
+            file.unlink()
+        self.mesu.save_cuts()
+        self.assertEqual(incremental, {
+            file.name: file.read_text()
+            for file in self.mesu.get_cuts_dir().iterdir()
+        })
+
+    def test_vertex_key(self):
+        selection = self.mesu.selector.get_at(0)
+        key = selection.get_vertex_key()
+        x, y = selection.points.get_data()
+        selection.points.set_data(x + [x[0], x[0]], y + [y[0], y[0]])
+        self.assertEqual(key, selection.get_vertex_key())
+        selection.points.set_data(x[:-1], y[:-1])
+        self.assertNotEqual(key, selection.get_vertex_key())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -26,14 +26,23 @@ __version__ = "2.0"
 
 import unittest
 import random
+import threading
 import tests.mock_objects as mo
 import tempfile
 
+import numpy as np
+
 from pathlib import Path
 from unittest.mock import patch
 
+from modules.concurrency import CancellationToken
+from modules.element_simulation import ElementSimulation
+from modules.enums import OptimizationType
+from modules.nsgaii import ConvergenceMonitor
 from modules.nsgaii import Nsgaii
+from modules.nsgaii import SurrogateModel
 from modules.nsgaii import pick_final_solutions
+from modules.optimization import dominates
 
 
 class TestPickFinalSolutions(unittest.TestCase):
@@ -103,5 +112,374 @@ class TestPickFinalSolutions(unittest.TestCase):
                           lambda: pick_final_solutions([], [], count=4))
 
 
+def nd_sort_legacy(pop_obj, n, r_n=np.inf):
+    """Pairwise implementation of Nsgaii.nd_sort that the vectorized
+    implementation is compared against.
+    """
+    if r_n == np.inf:
+        r_n = n
+    front_no = np.inf * np.ones(n)
+    dominated_sols = []
+    n_i = np.zeros(n)
+    current_front = []
+    for i, p in enumerate(pop_obj):
+        dominated_sols.append(
+            [h for h, q in enumerate(pop_obj) if dominates(p, q)])
+        n_i[i] = sum(dominates(q, p) for q in pop_obj)
+        if n_i[i] == 0:
+            front_no[i] = 1
+            current_front.append(i)
+    added_solutions = len(current_front)
+    fronts = 1
+    f_n = 1
+    while current_front:
+        if added_solutions >= r_n:
+            break
+        new_front = []
+        for i in current_front:
+            for h in dominated_sols[i]:
+                n_i[h] -= 1
+                if n_i[h] == 0:
+                    front_no[h] = f_n + 1
+                    new_front.append(h)
+                    added_solutions += 1
+        f_n += 1
+        current_front = new_front
+        fronts += 1
+    return front_no, fronts
+
+
+def crowding_distance_legacy(front_no, objective_values):
+    """Element-wise implementation of Nsgaii.crowding_distance that the
+    vectorized implementation is compared against.
+    """
+    pop_obj = np.array(objective_values)
+    n, m = np.shape(pop_obj)
+    crowd_dis = np.zeros(n)
+    front_unique = np.unique(front_no)
+    for f in front_unique[front_unique != np.inf]:
+        front = np.array([k for k in range(n) if front_no[k] == f])
+        f_max = pop_obj[front, :].max(0)
+        f_min = pop_obj[front, :].min(0)
+        for i in range(m):
+            rank = np.argsort(pop_obj[front, i])
+            crowd_dis[front[rank[0]]] = np.inf
+            crowd_dis[front[rank[-1]]] = np.inf
+            for j in range(1, len(front) - 1):
+                dist = pop_obj[front[rank[j + 1]], i] - \
+                    pop_obj[front[rank[j - 1]], i]
+                if dist != 0:
+                    crowd_dis[front[rank[j]]] += dist / (f_max[i] - f_min[i])
+    return crowd_dis
+
+
+class TestSorting(unittest.TestCase):
+    def get_populations(self):
+        rng = np.random.default_rng(1)
+        for n in (1, 2, 10, 50, 200):
+            # Rounding creates equal objective values
+            yield rng.random((n, 2)).round(1)
+            yield rng.random((n, 3)).round(2)
+        yield np.array([[np.inf, np.inf], [0.0, 1.0], [1.0, 0.0],
+                        [np.inf, np.inf], [0.5, 0.5]])
+
+    def test_nd_sort_matches_legacy_implementation(self):
+        for pop_obj in self.get_populations():
+            n = len(pop_obj)
+            for r_n in (np.inf, n // 2, 1):
+                expected_no, expected_fronts = nd_sort_legacy(
+                    pop_obj, n, r_n)
+                front_no, fronts = Nsgaii.nd_sort(pop_obj, n, r_n)
+                np.testing.assert_array_equal(expected_no, front_no)
+                self.assertEqual(expected_fronts, fronts)
+
+    def test_nd_sort_objective_values(self):
+        obj_vals = [(0, 3), (3, 0), (1, 1), (2, 2), (3, 3), (1, 1)]
+        front_no, fronts = Nsgaii.nd_sort(obj_vals, len(obj_vals))
+        self.assertEqual([1, 1, 1, 2, 3, 1], front_no.tolist())
+        self.assertEqual(3, fronts)
+
+    def test_crowding_distance_matches_legacy_implementation(self):
+        for pop_obj in self.get_populations():
+            front_no, _ = Nsgaii.nd_sort(pop_obj, len(pop_obj), 2)
+            np.testing.assert_array_equal(
+                crowding_distance_legacy(front_no, pop_obj),
+                Nsgaii.crowding_distance(front_no, pop_obj))
+
+
+class TestConvergenceMonitor(unittest.TestCase):
+    def test_converges_when_front_stops_improving(self):
+        monitor = ConvergenceMonitor(1e-3, 2)
+        monitor.update([(1, 2), (2, 1)])
+        self.assertFalse(monitor.has_converged())
+        monitor.update([(0.5, 2), (2, 0.5)])
+        monitor.update([(0.5, 2), (1, 1), (2, 0.5)])
+        self.assertFalse(monitor.has_converged())
+        monitor.update([(0.5, 2), (1, 1), (2, 0.5)])
+        self.assertFalse(monitor.has_converged())
+        monitor.update([(0.5, 2), (1, 1), (2, 0.5)])
+        self.assertTrue(monitor.has_converged())
+        self.assertEqual(5, len(monitor.hypervolumes))
+        self.assertTrue(all(
+            h0 <= h1 for h0, h1 in zip(monitor.hypervolumes[:-1],
+                                       monitor.hypervolumes[1:])))
+
+    def test_disabled(self):
+        monitor = ConvergenceMonitor(None, 1)
+        for _ in range(3):
+            monitor.update([(1, 1)])
+        self.assertFalse(monitor.has_converged())
+        self.assertLess(0, monitor.hypervolumes[-1])
+
+    def test_failed_evaluations(self):
+        monitor = ConvergenceMonitor(1e-3, 1)
+        monitor.update([(np.inf, np.inf)])
+        monitor.update([(np.inf, np.inf)])
+        self.assertEqual([0, 0], monitor.hypervolumes)
+        self.assertFalse(monitor.has_converged())
+        monitor.update([(1, 1), (np.inf, np.inf)])
+        self.assertLess(0, monitor.hypervolumes[-1])
+
+
+class TestSurrogateModel(unittest.TestCase):
+    @staticmethod
+    def objectives(sols):
+        return np.column_stack((
+            np.sum(sols ** 2, axis=1), np.sum((sols - 1) ** 2, axis=1)))
+
+    def test_predictions(self):
+        rng = np.random.default_rng(0)
+        sols = rng.random((60, 3)) * [1, 10, 100]
+        model = SurrogateModel()
+        model.add(sols, self.objectives(sols))
+        self.assertFalse(model.is_fitted())
+        model.fit()
+        self.assertTrue(model.is_fitted())
+
+        np.testing.assert_allclose(
+            self.objectives(sols), model.predict(sols), atol=1e-2)
+        new_sols = rng.random((20, 3)) * [1, 10, 100]
+        self.assertLess(
+            model.get_error(new_sols, self.objectives(new_sols)), 0.1)
+
+    def test_failed_and_repeated_solutions(self):
+        sols = np.repeat(np.arange(12.0).reshape(-1, 1), 2, axis=0)
+        objs = self.objectives(sols)
+        objs[0] = np.inf
+        model = SurrogateModel(max_points=20)
+        model.add(sols, objs)
+        model.fit()
+        self.assertTrue(model.is_fitted())
+        self.assertIsNone(model.get_error(sols[:1], objs[:1]))
+
+    def test_degenerate_solutions(self):
+        model = SurrogateModel()
+        # Variables are collinear and the last one is constant
+        sols = np.column_stack(
+            (np.arange(12.0), np.arange(12.0) * 2, np.ones(12)))
+        model.add(sols, self.objectives(sols))
+        model.fit()
+        self.assertFalse(model.is_fitted())
+
+    def test_too_few_solutions(self):
+        model = SurrogateModel()
+        sols = np.arange(5.0).reshape(-1, 1)
+        model.add(sols, self.objectives(sols))
+        model.fit()
+        self.assertFalse(model.is_fitted())
+        self.assertIsNone(model.get_error(sols, self.objectives(sols)))
+
+
+class TestPrescreening(unittest.TestCase):
+    def test_prescreen_offspring(self):
+        nsgaii = Nsgaii(
+            gen=1, element_simulation=mo.get_element_simulation(),
+            optimization_type=OptimizationType.FLUENCE, pop_size=12,
+            sol_size=1, cut_file=Path(tempfile.gettempdir(), "foo.cut"),
+            surrogate_factor=4)
+        rng = np.random.default_rng(0)
+        sols = rng.uniform(1e10, 1e13, size=(12, 1))
+        # Best fluence is 5e12
+        objs = np.column_stack((
+            np.abs(sols[:, 0] - 5e12), (sols[:, 0] - 5e12) ** 2))
+        nsgaii.surrogate = SurrogateModel()
+        nsgaii.surrogate.add(sols, objs)
+        nsgaii.surrogate.fit()
+
+        offspring = rng.uniform(1e10, 1e13, size=(12, 1))
+        with patch.object(
+                Nsgaii, "variation",
+                side_effect=lambda _: rng.uniform(1e10, 1e13, size=(12, 1))) \
+                as variation:
+            prescreened = nsgaii.prescreen_offspring(sols, offspring)
+        self.assertEqual(3, variation.call_count)
+        self.assertEqual(offspring.shape, prescreened.shape)
+        self.assertLess(
+            np.mean(np.abs(prescreened - 5e12)),
+            np.mean(np.abs(offspring - 5e12)))
+
+    def test_update_surrogate(self):
+        nsgaii = Nsgaii(
+            gen=1, element_simulation=mo.get_element_simulation(),
+            cut_file=Path(tempfile.gettempdir(), "foo.cut"))
+        rng = np.random.default_rng(0)
+        sols = rng.random((40, 2))
+        objs = np.column_stack((sols[:, 0], sols[:, 1] ** 2))
+        self.assertIsNone(nsgaii.update_surrogate(sols, objs))
+
+        nsgaii.surrogate = SurrogateModel()
+        self.assertIsNone(nsgaii.update_surrogate(sols, objs))
+        self.assertTrue(nsgaii.surrogate.is_fitted())
+        new_sols = rng.random((10, 2))
+        new_objs = np.column_stack((new_sols[:, 0], new_sols[:, 1] ** 2))
+        self.assertLess(nsgaii.update_surrogate(new_sols, new_objs), 0.1)
+
+
+class TestFluenceEvaluation(unittest.TestCase):
+    def setUp(self):
+        self.elem_sim = mo.get_element_simulation()
+        self.nsgaii = Nsgaii(
+            gen=1, element_simulation=self.elem_sim,
+            optimization_type=OptimizationType.FLUENCE,
+            cut_file=Path(tempfile.gettempdir(), "foo.cut"))
+        self.nsgaii.measured_espe = [(1.0, 2.0), (1.1, 4.0), (1.2, 2.0)]
+        self.espe = [(1.0, 1.0), (1.1, 2.0), (1.2, 1.0)]
+
+    def test_espe_is_calculated_once(self):
+        with patch.object(ElementSimulation, "calculate_espe",
+                          return_value=(self.espe, None)) as calc:
+            pop = self.nsgaii.evaluate_solutions([[1e12], [2e12], [3e12]])
+        calc.assert_called_once()
+        self.assertEqual(1e12, calc.call_args.kwargs["fluence"])
+        # Spectrum at the fluence 2e12 equals the measured spectrum
+        self.assertEqual((0, 0), tuple(pop.objective_values[1]))
+        self.assertLess(0, pop.objective_values[0][0])
+        self.assertLess(0, pop.objective_values[2][0])
+
+    def test_get_fluence_espe(self):
+        with patch.object(ElementSimulation, "calculate_espe",
+                          return_value=(self.espe, None)):
+            self.assertEqual(
+                self.espe, self.nsgaii.get_fluence_espe(1e12))
+            self.assertEqual(
+                [(1.0, 0.5), (1.1, 1.0), (1.2, 0.5)],
+                self.nsgaii.get_fluence_espe(5e11))
+
+    def test_empty_espe_is_not_scaled(self):
+        with patch.object(ElementSimulation, "calculate_espe",
+                          return_value=([], None)) as calc:
+            self.assertEqual([], self.nsgaii.get_fluence_espe(1e12))
+            self.assertEqual([], self.nsgaii.get_fluence_espe(2e12))
+        self.assertEqual(2, calc.call_count)
+
+
+class TestRecoilEvaluation(unittest.TestCase):
+    def setUp(self):
+        self.elem_sim = mo.get_element_simulation()
+        self.nsgaii = Nsgaii(
+            gen=1, element_simulation=self.elem_sim,
+            optimization_type=OptimizationType.RECOIL,
+            cut_file=Path(tempfile.gettempdir(), "foo.cut"), max_workers=3)
+        self.nsgaii.measured_espe = [(1.0, 2.0), (1.1, 4.0), (1.2, 2.0)]
+        self.sols = [[0.01, 1.0, 10.0 * i, 0.5, 10.0 * i + 5]
+                     for i in range(1, 10)]
+        self.lock = threading.Lock()
+        self.calls = []
+
+    def calculate_espe(self, recoil, recoil_dir=None, **kwargs):
+        with self.lock:
+            self.calls.append((threading.get_ident(), recoil_dir))
+        self.assertTrue(recoil_dir.is_dir())
+        # Spectrum is determined by the solution so that the order of
+        # results can be checked
+        height = recoil.get_points()[-1].get_x() / 10
+        return [(1.0, height), (1.1, height), (1.2, height)], None
+
+    def test_results_are_in_solution_order(self):
+        with patch.object(ElementSimulation, "calculate_espe",
+                          side_effect=self.calculate_espe):
+            pop = self.nsgaii.evaluate_solutions(self.sols)
+
+        self.assertEqual(len(self.sols), len(self.calls))
+        expected = [
+            self.nsgaii.get_objective_values(
+                self.calculate_espe(recoil, recoil_dir=Path.cwd())[0])
+            for recoil in self.elem_sim.optimization_recoils
+        ]
+        self.assertEqual(expected, pop.objective_values)
+
+    def test_each_worker_has_a_directory(self):
+        with patch.object(ElementSimulation, "calculate_espe",
+                          side_effect=self.calculate_espe):
+            self.nsgaii.evaluate_solutions(self.sols)
+
+        dirs_by_thread = {}
+        for thread, recoil_dir in self.calls:
+            dirs_by_thread.setdefault(thread, set()).add(recoil_dir)
+        self.assertLessEqual(len(dirs_by_thread), 3)
+        for dirs in dirs_by_thread.values():
+            self.assertEqual(1, len(dirs))
+        all_dirs = set.union(*dirs_by_thread.values())
+        self.assertEqual(len(dirs_by_thread), len(all_dirs))
+        # Temporary directories are removed after evaluation
+        for recoil_dir in all_dirs:
+            self.assertFalse(recoil_dir.exists())
+
+    def test_cancellation(self):
+        ct = CancellationToken()
+        ct.request_cancellation()
+        with patch.object(ElementSimulation, "calculate_espe",
+                          side_effect=self.calculate_espe):
+            pop = self.nsgaii.evaluate_solutions(
+                self.sols, cancellation_token=ct)
+        self.assertEqual([], self.calls)
+        self.assertEqual(
+            [self.nsgaii.get_objective_values([])] * len(self.sols),
+            pop.objective_values)
+
+    def evaluate(self, sols, fingerprint=()):
+        with patch.object(ElementSimulation, "calculate_espe",
+                          side_effect=self.calculate_espe), \
+                patch.object(Nsgaii, "_get_erd_fingerprint",
+                             return_value=fingerprint):
+            return self.nsgaii.evaluate_solutions(sols)
+
+    def test_repeated_solutions_are_cached(self):
+        sols = self.sols[:3]
+        pop = self.evaluate(sols + sols[:1])
+        self.assertEqual(3, len(self.calls))
+        self.assertEqual(pop.objective_values[0], pop.objective_values[3])
+        self.assertEqual((1, 3), (self.nsgaii.cache_hits,
+                                  self.nsgaii.cache_misses))
+
+        cached_pop = self.evaluate(sols)
+        self.assertEqual(3, len(self.calls))
+        self.assertEqual(pop.objective_values[:3], cached_pop.objective_values)
+        self.assertEqual((4, 3), (self.nsgaii.cache_hits,
+                                  self.nsgaii.cache_misses))
+
+    def test_changed_erd_files_are_not_cached(self):
+        self.evaluate(self.sols[:2], fingerprint=(("a.erd", 1, 1),))
+        self.evaluate(self.sols[:2], fingerprint=(("a.erd", 2, 2),))
+        self.assertEqual(4, len(self.calls))
+
+    def test_least_recently_used_values_are_removed(self):
+        self.nsgaii.cache_size = 2
+        self.evaluate(self.sols[:3])
+        self.evaluate(self.sols[1:3])
+        self.assertEqual(3, len(self.calls))
+        self.evaluate(self.sols[:1])
+        self.assertEqual(4, len(self.calls))
+
+    def test_failed_evaluations_are_not_cached(self):
+        ct = CancellationToken()
+        ct.request_cancellation()
+        with patch.object(Nsgaii, "_get_erd_fingerprint", return_value=()):
+            self.nsgaii.evaluate_solutions(
+                self.sols[:2], cancellation_token=ct)
+        self.evaluate(self.sols[:2])
+        self.assertEqual(2, len(self.calls))
+
+
 if __name__ == '__main__':
     unittest.main()
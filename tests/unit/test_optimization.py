@@ -25,10 +25,26 @@ along with this program (file named 'LICENCE').
 __author__ = "Juhani Sundell"
 __version__ = "2.0"
 
+import math
+import tempfile
 import unittest
 import itertools
 
+import numpy as np
+import reactivex
+
 import modules.optimization as optim
+import tests.mock_objects as mo
+import tests.utils as utils
+
+from pathlib import Path
+from reactivex import operators as ops
+from unittest.mock import patch
+
+from modules import file_paths as fp
+from modules.element_simulation import ElementSimulation
+from modules.enums import OptimizationType
+from modules.linear_optimization import LinearOptimization
 
 
 class TestOptimization(unittest.TestCase):
@@ -117,3 +133,158 @@ class TestOptimization(unittest.TestCase):
         for sol1, sol2 in itertools.product(set1, set2):
             self.assertFalse(optim.dominates(sol1, sol2))
 
+    def test_dominance_matrix(self):
+        sols = [self.ideal, *self.front1, *self.front2, self.nadir,
+                self.nadir]
+        matrix = optim.dominance_matrix(sols)
+        for (i, a), (j, b) in itertools.product(enumerate(sols), repeat=2):
+            self.assertEqual(optim.dominates(a, b), matrix[i, j])
+        self.assertEqual((0, 0), optim.dominance_matrix([]).shape)
+
+
+class TestHypervolume(unittest.TestCase):
+    def test_hypervolume(self):
+        self.assertEqual(0, optim.hypervolume([], (1, 1)))
+        self.assertEqual(1, optim.hypervolume([(0, 0)], (1, 1)))
+        # Overlapping rectangles are only counted once
+        self.assertEqual(
+            3, optim.hypervolume([(0, 1), (1, 0)], (2, 2)))
+        self.assertEqual(
+            3, optim.hypervolume([(1, 0), (0, 1), (1, 1)], (2, 2)))
+        # Solutions that do not dominate the reference point are ignored
+        self.assertEqual(
+            2, optim.hypervolume([(0, 1), (3, 0), (1, 2)], (2, 2)))
+
+    def test_dominated_solutions_do_not_change_hypervolume(self):
+        front = [(0, 3), (1, 1), (3, 0)]
+        self.assertEqual(
+            optim.hypervolume(front, (4, 4)),
+            optim.hypervolume(front + [(2, 2), (1, 3)], (4, 4)))
+
+
+def tournament_legacy(t, p, fit):
+    """Element-wise implementation of tournament_allow_doubles that the
+    vectorized implementation is compared against.
+    """
+    n = len(fit)
+    pool = []
+    for i in range(p):
+        candidates = []
+        j = 0
+        while j in range(t):
+            candidate = np.random.randint(n)
+            if candidate not in candidates:
+                candidates.append(candidate)
+                j += 1
+        min_front = min([fit[i, 0] for i in candidates])
+        min_candidates = [i for i in candidates if fit[i, 0] == min_front]
+        if len(min_candidates) > 1:
+            max_dist = max([fit[i, 1] for i in min_candidates])
+            max_cands = [i for i in min_candidates if fit[i, 1] == max_dist]
+            pool.append(max_cands[0])
+        else:
+            pool.append(min_candidates[0])
+    return np.array(pool)
+
+
+class TestTournament(unittest.TestCase):
+    def assert_same_as_legacy(self, t, p, fit, seed):
+        np.random.seed(seed)
+        expected = tournament_legacy(t, p, fit)
+        expected_next = np.random.rand()
+        np.random.seed(seed)
+        actual = optim.tournament_allow_doubles(t, p, fit)
+        self.assertEqual(expected.tolist(), actual.tolist())
+        # Same amount of random numbers is consumed
+        self.assertEqual(expected_next, np.random.rand())
+
+    def test_matches_legacy_implementation(self):
+        rng = np.random.default_rng(0)
+        for n, t, p in ((2, 2, 10), (5, 2, 40), (20, 3, 20), (200, 2, 200)):
+            fronts = rng.integers(1, 4, size=n).astype(float)
+            distances = rng.choice([0.0, 0.5, 1.0, np.inf], size=n)
+            fit = np.column_stack((fronts, distances))
+            for seed in range(5):
+                self.assert_same_as_legacy(t, p, fit, seed)
+
+    def test_winner(self):
+        fit = np.array([[1, 0.5], [1, 2.0], [2, np.inf]])
+        for seed in range(10):
+            np.random.seed(seed)
+            pool = optim.tournament_allow_doubles(3, 4, fit)
+            self.assertEqual([1, 1, 1, 1], pool.tolist())
+
+
+class TestAccumulatedChanges(unittest.TestCase):
+    REFERENCE = [(1.0, 0.0), (1.025, 10.0), (1.05, 0.0)]
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.elem_sim = ElementSimulation(
+            Path(self.tmp_dir.name), mo.get_request(),
+            [mo.get_recoil_element()], simulation=mo.get_simulation(),
+            save_on_creation=False)
+        self.erd_file = Path(
+            self.tmp_dir.name,
+            fp.get_erd_file_name(self.elem_sim.get_main_recoil(), 201,
+                                 optim_mode=OptimizationType.FLUENCE))
+        self.optimizer = LinearOptimization(
+            element_simulation=self.elem_sim,
+            optimization_type=OptimizationType.FLUENCE,
+            cut_file=Path(self.tmp_dir.name, "foo.cut"), check_time=0.2,
+            check_min=0, in_process_espe=True)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def write_events(self):
+        erd_file = utils.get_resource_dir() / "C-Default.9997.erd"
+        self.erd_file.write_bytes(erd_file.read_bytes())
+
+    def get_changes(self, times, reference=REFERENCE):
+        """Runs the check at the given times and returns the changes and the
+        number of get_espe runs.
+        """
+        check = self.optimizer._get_accumulated_change_check(0.05)
+        changes = []
+        with patch.object(optim, "get_optim_espe",
+                          return_value=reference) as get_optim_espe:
+            for t in times:
+                with patch.object(optim.time, "monotonic", return_value=t):
+                    changes.append(check(None))
+        return changes, get_optim_espe.call_count
+
+    def test_no_events(self):
+        changes, espe_count = self.get_changes([0.0, 0.05, 0.1])
+        self.assertEqual([math.inf] * 3, changes)
+        self.assertEqual(0, espe_count)
+
+    def test_spectra_are_compared_after_check_time(self):
+        self.write_events()
+        changes, espe_count = self.get_changes(
+            [0.0, 0.05, 0.1, 0.15, 0.2, 0.25])
+        # Spectrum is calibrated once
+        self.assertEqual(1, espe_count)
+        # Spectra are compared once check_time has passed since the first
+        # check
+        self.assertEqual([math.inf] * 4, changes[:4])
+        self.assertEqual([0.0] * 2, changes[4:])
+
+    def test_failed_calibration_is_retried_after_check_time(self):
+        self.write_events()
+        changes, espe_count = self.get_changes(
+            [0.0, 0.05, 0.1, 0.15, 0.2, 0.25, 0.3, 0.35, 0.4],
+            reference=[])
+        self.assertEqual([math.inf] * 9, changes)
+        # get_espe is run at 0.0, 0.2 and 0.4
+        self.assertEqual(3, espe_count)
+
+    def test_timer_emits_changes(self):
+        with patch.object(optim.BaseOptimizer, "ACCUMULATED_CHECK_INTERVAL",
+                          0.01):
+            changes = self.optimizer._get_accumulated_changes(
+                reactivex.empty()).pipe(
+                ops.take(2),
+                ops.to_list()
+            ).run()
+        self.assertEqual([math.inf] * 2, changes)
@@ -0,0 +1,180 @@
+# coding=utf-8
+"""
+Created on 17.10.2026
+
+Potku is a graphical user interface for analyzation and
+visualization of measurement data collected from a ToF-ERD
+telescope. For physics calculations Potku uses external
+analyzation components.
+Copyright (C) 2026 Potku developers
+
+This program is free software; you can redistribute it and/or
+modify it under the terms of the GNU General Public License
+as published by the Free Software Foundation; either version 2
+of the License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program (file named 'LICENCE').
+"""
+__version__ = "2.0"
+
+import subprocess
+import sys
+import threading
+import time
+import unittest
+
+from reactivex import operators as ops
+from unittest.mock import patch
+
+import modules.subprocess_utils as sutils
+
+from modules.concurrency import CancellationToken
+from modules.process_supervisor import ProcessCancelledError
+from modules.process_supervisor import ProcessSupervisor
+
+from tests.mock_objects import MockObserver
+
+
+SLEEP = "import time; time.sleep(5)"
+
+
+class TestProcessSupervisor(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.supervisor = ProcessSupervisor()
+
+    def run_script(self, script, timeout=5, **kwargs) -> MockObserver:
+        obs = MockObserver()
+        done = threading.Event()
+        self.supervisor.run((sys.executable, "-c", script), **kwargs).pipe(
+            ops.finally_action(done.set)
+        ).subscribe(obs)
+        self.assertTrue(done.wait(timeout))
+        return obs
+
+    def test_output_of_both_streams_is_published(self):
+        obs = self.run_script(
+            "import sys\n"
+            "print('foo', flush=True)\n"
+            "print('bar', file=sys.stderr, flush=True)")
+
+        self.assertEqual(["bar", "foo"], sorted(x.strip() for x in obs.nexts))
+        self.assertEqual([], obs.errs)
+        self.assertEqual(["done"], obs.compl)
+
+    def test_error_code_is_published_as_error(self):
+        obs = self.run_script("print('foo')\nexit(2)")
+
+        self.assertEqual(["foo"], [x.strip() for x in obs.nexts])
+        self.assertEqual(1, len(obs.errs))
+        self.assertIsInstance(obs.errs[0], subprocess.CalledProcessError)
+        self.assertEqual(2, obs.errs[0].returncode)
+        self.assertEqual([], obs.compl)
+
+    def test_missing_executable_is_published_as_error(self):
+        obs = MockObserver()
+        done = threading.Event()
+        self.supervisor.run(("potku-no-such-executable",)).pipe(
+            ops.finally_action(done.set)
+        ).subscribe(obs)
+        self.assertTrue(done.wait(5))
+        self.assertEqual(1, len(obs.errs))
+        self.assertIsInstance(obs.errs[0], OSError)
+
+    def test_process_is_killed_after_timeout(self):
+        start = time.perf_counter()
+        obs = self.run_script(SLEEP, max_time=0.1)
+
+        self.assertLess(time.perf_counter() - start, 4)
+        self.assertEqual(1, len(obs.errs))
+        self.assertIsInstance(obs.errs[0], subprocess.TimeoutExpired)
+
+    def test_process_ending_before_timeout_completes(self):
+        obs = self.run_script("pass", max_time=5)
+        self.assertEqual([], obs.errs)
+        self.assertEqual(["done"], obs.compl)
+
+    def test_requesting_cancellation_kills_the_process(self):
+        ct = CancellationToken()
+        threading.Timer(0.1, ct.request_cancellation).start()
+        start = time.perf_counter()
+        obs = self.run_script(SLEEP, ct=ct, ct_check=0.01)
+
+        self.assertLess(time.perf_counter() - start, 4)
+        self.assertEqual(1, len(obs.errs))
+        self.assertIsInstance(obs.errs[0], ProcessCancelledError)
+
+    def test_too_long_line_is_published_as_error(self):
+        start = time.perf_counter()
+        obs = self.run_script(
+            "import sys, time\n"
+            "sys.stdout.write('x' * 100000)\n"
+            "sys.stdout.flush()\n"
+            "time.sleep(5)")
+
+        # Process is killed when its output cannot be read
+        self.assertLess(time.perf_counter() - start, 4)
+        self.assertEqual(1, len(obs.errs))
+        self.assertIsInstance(obs.errs[0], ValueError)
+        self.assertEqual([], obs.compl)
+
+    def test_failing_kill_is_published_as_error(self):
+        threads = []
+
+        def kill_process(process):
+            threads.append(threading.current_thread())
+            raise OSError("kill failed")
+
+        ct = CancellationToken()
+        ct.request_cancellation()
+        with patch.object(sutils, "kill_process", side_effect=kill_process):
+            obs = self.run_script(
+                "import time; time.sleep(1)", ct=ct, ct_check=0.01)
+
+        self.assertEqual(1, len(obs.errs))
+        self.assertIsInstance(obs.errs[0], OSError)
+        self.assertEqual([], obs.compl)
+        # Killing is not done on the thread of the event loop
+        self.assertNotIn(self.supervisor._thread, threads)
+
+    def test_processes_are_observed_on_one_thread(self):
+        threads = set()
+        events = [threading.Event() for _ in range(8)]
+        for event in events:
+            self.supervisor.run(
+                (sys.executable, "-c", "import time\nfor _ in range(3):\n"
+                                       "    print(1, flush=True)\n"
+                                       "    time.sleep(0.1)")
+            ).pipe(
+                ops.do_action(
+                    on_next=lambda _: threads.add(threading.current_thread()),
+                    on_completed=event.set)
+            ).subscribe()
+
+        for event in events:
+            self.assertTrue(event.wait(5))
+        self.assertEqual(1, len(threads))
+        self.assertIsNot(threading.current_thread(), threads.pop())
+
+    def test_disposing_does_not_stop_the_process(self):
+        obs = MockObserver()
+        done = threading.Event()
+        disposable = self.supervisor.run(
+            (sys.executable, "-c", "print('foo')")
+        ).pipe(
+            ops.do_action(on_completed=done.set)
+        ).subscribe(obs)
+        disposable.dispose()
+
+        self.assertFalse(done.wait(0.5))
+        self.assertEqual([], obs.nexts)
+
+
+if __name__ == "__main__":
+    unittest.main()
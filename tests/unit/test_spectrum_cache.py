@@ -0,0 +1,89 @@
+# coding=utf-8
+"""
+Created on 17.10.2026
+
+Potku is a graphical user interface for analyzation and
+visualization of measurement data collected from a ToF-ERD
+telescope. For physics calculations Potku uses external
+analyzation components.
+Copyright (C) 2026 Potku developers
+
+This program is free software; you can redistribute it and/or
+modify it under the terms of the GNU General Public License
+as published by the Free Software Foundation; either version 2
+of the License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program (file named 'LICENCE').
+"""
+__version__ = "2.0"
+
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from pathlib import Path
+
+from modules.spectrum_cache import SpectrumCache
+
+
+class TestSpectrumCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.cache = SpectrumCache(Path(self.tmp_dir.name, "cache"))
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_get_and_put(self):
+        self.assertIsNone(self.cache.get("key"))
+        self.assertTrue(self.cache.put("key", np.arange(5.0)))
+        self.assertEqual([0, 1, 2, 3, 4], self.cache.get("key").tolist())
+        self.assertEqual(
+            [0, 1, 2, 3, 4], self.cache.get("key", mmap=True).tolist())
+
+    def test_key_depends_on_file_contents(self):
+        file = Path(self.tmp_dir.name, "mesu.1H.ERD.0.cut")
+        missing_key = SpectrumCache.get_key(file, 0.1)
+        file.write_text("1 2 3\n")
+        key = SpectrumCache.get_key(file, 0.1)
+        self.assertNotEqual(missing_key, key)
+        self.assertEqual(key, SpectrumCache.get_key(file, 0.1))
+        self.assertNotEqual(key, SpectrumCache.get_key(file, 0.2))
+        self.assertNotEqual(key, SpectrumCache.get_key(file, "0.1"))
+
+        file.write_text("1 2 4\n")
+        self.assertNotEqual(key, SpectrumCache.get_key(file, 0.1))
+
+    def test_least_recently_used_entries_are_evicted(self):
+        array = np.zeros(100)
+        self.cache.put("a", array)
+        entry_size = self.cache.get_entry_file("a").stat().st_size
+        self.cache.max_size = 2 * entry_size
+
+        self.cache.put("b", array)
+        # Make sure that modification times differ
+        for i, key in enumerate(("a", "b")):
+            os.utime(self.cache.get_entry_file(key), ns=(i, i))
+        self.assertIsNotNone(self.cache.get("a"))
+        self.cache.put("c", array)
+
+        self.assertIsNotNone(self.cache.get("a"))
+        self.assertIsNone(self.cache.get("b"))
+        self.assertIsNotNone(self.cache.get("c"))
+
+    def test_clear(self):
+        self.cache.put("a", np.zeros(1))
+        self.cache.clear()
+        self.assertIsNone(self.cache.get("a"))
+
+
+if __name__ == "__main__":
+    unittest.main()
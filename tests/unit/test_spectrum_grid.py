@@ -0,0 +1,159 @@
+# coding=utf-8
+"""
+Created on 17.10.2026
+
+Potku is a graphical user interface for analyzation and
+visualization of measurement data collected from a ToF-ERD
+telescope. For physics calculations Potku uses external
+analyzation components.
+Copyright (C) 2026 Potku developers
+
+This program is free software; you can redistribute it and/or
+modify it under the terms of the GNU General Public License
+as published by the Free Software Foundation; either version 2
+of the License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program (file named 'LICENCE').
+"""
+__version__ = "2.0"
+
+import copy
+import math
+import random
+import unittest
+
+import numpy as np
+
+import modules.math_functions as mf
+
+from modules.optimization import calculate_change
+from modules.spectrum_grid import SpectrumGrid
+
+
+def uniform_espe_lists_legacy(espe1, espe2, channel_width=0.025):
+    """List-based implementation that SpectrumGrid replaced.
+    """
+    first = espe1
+    second = espe2
+    if second[0][0] < first[0][0]:
+        x = first[0][0] - channel_width
+        while round(x, 4) >= second[0][0]:
+            first.insert(0, (round(x, 4), 0))
+            x -= channel_width
+    elif first[0][0] < second[0][0]:
+        x = second[0][0] - channel_width
+        while round(x, 4) >= first[0][0]:
+            second.insert(0, (round(x, 4), 0))
+            x -= channel_width
+
+    if second[-1][0] < first[-1][0]:
+        x = second[-1][0] + channel_width
+        while round(x, 4) <= first[-1][0]:
+            second.append((round(x, 4), 0))
+            x += channel_width
+    elif first[-1][0] < second[-1][0]:
+        x = first[-1][0] + channel_width
+        while round(x, 4) <= second[-1][0]:
+            first.append((round(x, 4), 0))
+            x += channel_width
+
+    return first, second
+
+
+def get_espe(first_channel, length, ch=0.025, origin=1.0125):
+    return [(round(origin + (first_channel + i) * ch, 4),
+             random.uniform(0, 10) if random.random() > 0.2 else 0.0)
+            for i in range(length)]
+
+
+class TestSpectrumGrid(unittest.TestCase):
+    def setUp(self):
+        random.seed(7)
+
+    def test_align(self):
+        measured = [(1.0, 1.0), (1.1, 2.0), (1.2, 3.0)]
+        grid = SpectrumGrid(measured, channel_width=0.1)
+
+        x, y1, y2 = grid.align([(0.9, 5.0), (1.0, 6.0)])
+        np.testing.assert_allclose([0.9, 1.0, 1.1, 1.2], x)
+        np.testing.assert_array_equal([0.0, 1.0, 2.0, 3.0], y1)
+        np.testing.assert_array_equal([5.0, 6.0, 0.0, 0.0], y2)
+
+        x, y1, y2 = grid.align([(1.3, 5.0), (1.4, 6.0)])
+        np.testing.assert_allclose([1.0, 1.1, 1.2, 1.3, 1.4], x)
+        np.testing.assert_array_equal([1.0, 2.0, 3.0, 0.0, 0.0], y1)
+        np.testing.assert_array_equal([0.0, 0.0, 0.0, 5.0, 6.0], y2)
+
+        # Inputs are not modified
+        self.assertEqual([(1.0, 1.0), (1.1, 2.0), (1.2, 3.0)], measured)
+
+    def test_empty_spectra(self):
+        grid = SpectrumGrid([(1.0, 1.0), (1.1, 2.0)], channel_width=0.1)
+        x, y1, y2 = grid.align([])
+        np.testing.assert_array_equal([1.0, 2.0], y1)
+        np.testing.assert_array_equal([0.0, 0.0], y2)
+
+        empty = SpectrumGrid([], channel_width=0.1)
+        x, y1, y2 = empty.align([(1.0, 1.0), (1.1, 2.0)])
+        np.testing.assert_array_equal([1.0, 1.1], x)
+        np.testing.assert_array_equal([0.0, 0.0], y1)
+        np.testing.assert_array_equal([1.0, 2.0], y2)
+
+        self.assertEqual(0.0, empty.get_area([]))
+        self.assertEqual(math.inf, empty.get_mean_squared_error([]))
+        self.assertEqual(math.inf, empty.get_mean_absolute_difference([]))
+        self.assertEqual(
+            0.0, grid.get_mean_absolute_difference([(1.0, 1.0), (1.1, 2.0)]))
+        zeros = SpectrumGrid([(1.0, 0.0), (1.1, 0.0)], channel_width=0.1)
+        self.assertEqual(
+            math.inf, zeros.get_mean_absolute_difference([(1.2, 0.0)]))
+
+    def test_metrics_match_legacy(self):
+        ch = 0.025
+        for _ in range(50):
+            measured = get_espe(random.randint(-20, 20),
+                                random.randint(1, 60))
+            simulated = get_espe(random.randint(-20, 20),
+                                 random.randint(1, 60))
+            grid = SpectrumGrid(measured, channel_width=ch)
+
+            uni_sim, uni_mes = uniform_espe_lists_legacy(
+                copy.copy(simulated), copy.copy(measured), channel_width=ch)
+            self.assertEqual(len(uni_sim), len(uni_mes))
+
+            x, y_mes, y_sim = grid.align(simulated)
+            np.testing.assert_allclose([p[0] for p in uni_sim], x)
+            np.testing.assert_array_equal([p[1] for p in uni_sim], y_sim)
+            np.testing.assert_array_equal([p[1] for p in uni_mes], y_mes)
+
+            legacy_area = mf.calculate_area(uni_sim, uni_mes)
+            legacy_mse = sum((p1[1] - p2[1]) ** 2
+                             for p1, p2 in zip(uni_sim, uni_mes)) / len(uni_sim)
+            area, mse = grid.get_differences(simulated)
+            self.assertAlmostEqual(legacy_area, area, places=6)
+            self.assertAlmostEqual(legacy_mse, mse)
+            self.assertAlmostEqual(legacy_area, grid.get_area(simulated),
+                                   places=6)
+            self.assertAlmostEqual(legacy_mse,
+                                   grid.get_mean_squared_error(simulated))
+
+    def test_calculate_change(self):
+        self.assertEqual(math.inf, calculate_change([], [(1.0, 1.0)], 0.1))
+        self.assertEqual(math.inf, calculate_change([(1.0, 1.0)], [], 0.1))
+
+        espe1 = [(1.0, 1.0), (1.1, 0.0), (1.2, 3.0)]
+        espe2 = [(1.1, 0.0), (1.2, 1.0), (1.3, 4.0)]
+        # Channel 1.1 is zero in both spectra
+        self.assertAlmostEqual(
+            (1.0 + 2.0 + 4.0) / 3, calculate_change(espe1, espe2, 0.1))
+        self.assertEqual([(1.0, 1.0), (1.1, 0.0), (1.2, 3.0)], espe1)
+
+
+if __name__ == "__main__":
+    unittest.main()
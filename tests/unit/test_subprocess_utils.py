@@ -24,6 +24,7 @@ along with this program (file named 'LICENCE').
 __author__ = "Juhani Sundell"
 __version__ = "2.0"
 
+import os
 import unittest
 import tempfile
 import subprocess
@@ -330,6 +331,52 @@ class TestProcessOutput(unittest.TestCase):
                 self.assertTrue(proc.stdout.closed)
 
 
+@unittest.skipIf(platform.system() == "Windows", "uses cat")
+class TestStdinWriter(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.files = [Path(self.tmp_dir.name, f"{i}.erd") for i in range(3)]
+        for i, file in enumerate(self.files):
+            # Large enough to fill the pipe buffers in both directions
+            file.write_text("".join(f"{i} {j}\n" for j in range(100000)))
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_files_are_written_while_output_is_read(self):
+        with subprocess.Popen(
+                ["cat"], stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                universal_newlines=True) as proc:
+            writer = sutils.StdinWriter(proc, self.files, chunk_size=1000)
+            writer.start()
+            output = sutils.process_output(proc)
+            writer.wait()
+
+        expected = [
+            line for file in self.files for line in file.open("r")]
+        self.assertEqual(expected, output)
+        self.assertTrue(proc.stdin.closed)
+
+    def test_process_that_does_not_read_input(self):
+        with subprocess.Popen(
+                ["echo", "hello"], stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE, universal_newlines=True) as proc:
+            writer = sutils.StdinWriter(proc, self.files)
+            writer.start()
+            self.assertEqual(["hello\n"], sutils.process_output(proc))
+            writer.wait()
+
+    def test_error_is_raised_by_wait(self):
+        with subprocess.Popen(
+                ["cat"], stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                universal_newlines=True) as proc:
+            writer = sutils.StdinWriter(
+                proc, [*self.files, Path(self.tmp_dir.name, "missing.erd")])
+            writer.start()
+            sutils.process_output(proc)
+            self.assertRaises(FileNotFoundError, writer.wait)
+
+
 class TestKillProcess(unittest.TestCase):
     @classmethod
     def setUpClass(cls):
@@ -353,5 +400,22 @@ class TestKillProcess(unittest.TestCase):
             self.assertEqual(0, proc.poll())
 
 
+class TestNiceness(unittest.TestCase):
+    @unittest.skipIf(platform.system() == "Windows",
+                     "niceness is set with creationflags on Windows")
+    def test_set_niceness(self):
+        self.assertEqual(0, sutils.get_priority_creationflags(5))
+        with subprocess.Popen(["sleep", "1"]) as proc:
+            before = os.getpriority(os.PRIO_PROCESS, proc.pid)
+            sutils.set_niceness(proc, 0)
+            self.assertEqual(
+                before, os.getpriority(os.PRIO_PROCESS, proc.pid))
+            sutils.set_niceness(proc, 3)
+            self.assertEqual(
+                min(before + 3, 19),
+                os.getpriority(os.PRIO_PROCESS, proc.pid))
+            sutils.kill_process(proc)
+
+
 if __name__ == '__main__':
     unittest.main()
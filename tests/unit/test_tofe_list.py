@@ -0,0 +1,198 @@
+# coding=utf-8
+"""
+Created on 17.10.2026
+
+Potku is a graphical user interface for analyzation and
+visualization of measurement data collected from a ToF-ERD
+telescope. For physics calculations Potku uses external
+analyzation components.
+Copyright (C) 2026 Potku developers
+
+This program is free software; you can redistribute it and/or
+modify it under the terms of the GNU General Public License
+as published by the Free Software Foundation; either version 2
+of the License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program (file named 'LICENCE').
+"""
+__version__ = "2.0"
+
+import platform
+import tempfile
+import unittest
+
+import numpy as np
+
+import tests.utils as utils
+import modules.general_functions as gf
+import modules.tofe_list as tl
+import tests.unit.test_energy_spectrum as test_es
+
+from pathlib import Path
+from unittest.mock import patch
+
+from modules.energy_spectrum import EnergySpectrum
+
+
+def write_tof_in(directory: Path, foil_thickness=0.0) -> Path:
+    tof_in = directory / "tof.in"
+    tof_in.write_text(
+        "Beam: 35Cl\n"
+        "Energy: 10\n"
+        "Detector angle: 41\n"
+        "Target angle: 20.5\n"
+        "Toflen: 0.623\n"
+        f"Carbon foil thickness: {foil_thickness}\n"
+        "Target density: 3.0\n"
+        "TOF calibration: 5.8e-11 -1e-09\n"
+        "Angle calibration: 0 0\n"
+        f"Efficiency directory: {directory}")
+    return tof_in
+
+
+def has_tofe_list() -> bool:
+    if platform.system() == "Windows":
+        return (gf.get_bin_dir() / "tofe_list.exe").exists()
+    return (gf.get_bin_dir() / "tofe_list").exists()
+
+
+class TestReadFiles(unittest.TestCase):
+    def test_read_tof_in(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            settings = tl.read_tof_in(write_tof_in(Path(tmp_dir)))
+        self.assertEqual("0.623", settings["Toflen"])
+        self.assertEqual("5.8e-11 -1e-09", settings["TOF calibration"])
+        self.assertEqual(tmp_dir, settings["Efficiency directory"])
+
+    def test_read_cut_file(self):
+        header, events = tl.read_cut_file(
+            utils.get_resource_dir() / "cuts.1H.ERD.0.cut")
+        self.assertEqual("ERD", header["Type"])
+        self.assertEqual("10", header["Count"])
+        self.assertEqual((10, 3), events.shape)
+        self.assertEqual([1078, 639, 764], events[0].tolist())
+
+    def test_read_cut_file_with_adc(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            cut_file = Path(tmp_dir, "mesu.1H.ERD.0.cut")
+            cut_file.write_text(
+                "Count: 2\nType: ERD\n\nToF, Energy, Event number\n"
+                "1 2 3 4\n5 6 7 8\n")
+            _, events = tl.read_cut_file(cut_file)
+        self.assertEqual([[1, 2, 3, 4], [5, 6, 7, 8]], events.tolist())
+
+    def test_read_empty_cut_file(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            cut_file = Path(tmp_dir, "mesu.1H.ERD.0.cut")
+            cut_file.write_text(
+                "Count: 0\nType: ERD\n\nToF, Energy, Event number\n")
+            _, events = tl.read_cut_file(cut_file)
+        self.assertEqual((0, 3), events.shape)
+
+
+class TestConversion(unittest.TestCase):
+    def test_calculate_energies(self):
+        energies, valid = tl.calculate_energies(
+            np.array([1078, 10, 2000]), 1.0078, 0.623, 5.8e-11, -1e-9)
+        self.assertEqual([True, False, True], valid.tolist())
+        t = 1078 * 5.8e-11 - 1e-9
+        v = 0.623 / t
+        expected = 0.5 * 1.0078 * 1.660538921e-27 * v ** 2 / 1.6021766e-13
+        self.assertAlmostEqual(expected, energies[0], places=6)
+        self.assertEqual(0, energies[1])
+        self.assertLess(energies[2], energies[0])
+
+    def test_efficiency_weights(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            eff_file = Path(tmp_dir, "1H.eff")
+            eff_file.write_text("# E eff\n0.0 0.0\n1.0 0.5\n2.0 1.0\n")
+            weights = tl.get_efficiency_weights(
+                np.array([0.0, 0.5, 1.0, 1.5, 3.0]), eff_file)
+            self.assertEqual([0, 4, 2, 4 / 3, 1], weights.tolist())
+
+            weights = tl.get_efficiency_weights(
+                np.array([1.0, 2.0]), Path(tmp_dir, "2H.eff"))
+            self.assertEqual([1, 1], weights.tolist())
+
+    def test_tofe_list_without_foil(self):
+        cut_file = utils.get_resource_dir() / "cuts.1H.ERD.0.cut"
+        _, events = tl.read_cut_file(cut_file)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            data = tl.tofe_list(cut_file, write_tof_in(Path(tmp_dir)))
+
+        energies, _ = tl.calculate_energies(
+            events[:, 0], 1.0078, 0.623, 5.8e-11, -1e-9)
+        np.testing.assert_almost_equal(
+            energies, data["energy"], decimal=3)
+        row = data.tolist()[0]
+        self.assertEqual((0.0, 0.0), row[:2])
+        self.assertEqual((1, 1.0078, "ERD", 1.0, 764), row[3:])
+        self.assertEqual(events[:, -1].tolist(), data["event_number"].tolist())
+
+
+def carbon_stopping(_element, _isotope, _energy, carbon_thickness,
+                    carbon_density, verbose=True):
+    """Stopping of protons in a carbon foil. Stopping of 0.5 MeV protons in
+    carbon is about 0.36 keV / (ug/cm^2) and nearly constant over the
+    energies of the resource cut files.
+    """
+    areal_density = carbon_thickness * carbon_density / 10  # ug/cm^2
+    return gf.convert_mev_to_joule(0.36e-3 * areal_density)
+
+
+class TestCompareToReferenceData(unittest.TestCase):
+    def setUp(self):
+        tl._get_foil_table.cache_clear()
+
+    def tearDown(self):
+        tl._get_foil_table.cache_clear()
+
+    @patch("modules.general_functions.carbon_stopping", new=carbon_stopping)
+    def test_1h_cut_file(self):
+        # Reference output of the external tofe_list program for the same
+        # cut file and tof.in settings
+        expected = list(zip(*(
+            line.split() for line in test_es.TestCalculateMeasuredSpectra(
+            ).expected_1h_0_tofe_list_content)))
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            tof_in = write_tof_in(Path(tmp_dir), foil_thickness=2.925)
+            actual = list(zip(*EnergySpectrum.tofe_list(
+                utils.get_resource_dir() / "cuts.1H.ERD.0.cut",
+                tof_in=tof_in, in_process=True)))
+
+        np.testing.assert_almost_equal(
+            np.array(expected[2], dtype=float), actual[2], decimal=3)
+        self.assertEqual([int(x) for x in expected[3]], list(actual[3]))
+        self.assertEqual([float(x) for x in expected[4]], list(actual[4]))
+        self.assertEqual(list(expected[5]), list(actual[5]))
+        self.assertEqual([float(x) for x in expected[6]], list(actual[6]))
+        self.assertEqual([int(x) for x in expected[7]], list(actual[7]))
+
+
+@unittest.skipUnless(has_tofe_list(), "tofe_list has not been compiled")
+class TestCompareToExternalProgram(unittest.TestCase):
+    def test_resource_cut_files(self):
+        resource_dir = utils.get_resource_dir()
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            tof_in = write_tof_in(Path(tmp_dir), foil_thickness=2.925)
+            for cut in ("cuts.1H.ERD.0.cut", "cuts.1H.ERD.1.cut",
+                        "cuts.35Cl.RBS_Mn.0.cut", "cuts.7Li.ERD.0.0.cut"):
+                expected = list(zip(*EnergySpectrum.tofe_list(
+                    resource_dir / cut, tof_in=tof_in.resolve(),
+                    verbose=False)))
+                actual = list(zip(*EnergySpectrum.tofe_list(
+                    resource_dir / cut, tof_in=tof_in, in_process=True)))
+
+                np.testing.assert_almost_equal(
+                    expected[2], actual[2], decimal=3)
+                self.assertEqual(expected[3:], actual[3:])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -119,13 +119,12 @@ class MatplotlibHistogramWidget(MatplotlibWidget):
         self.clipboard = QGuiApplication.clipboard()
 
         self.measurement = measurement
-        self.__x_data = [x[0] for x in self.measurement.data]
-        self.__y_data = [x[1] for x in self.measurement.data]
+        self.__x_data, self.__y_data = self.measurement.data.get_columns()
 
-        self.__x_data_max = max(self.__x_data) # max x-value of data
-        self.__y_data_max = max(self.__y_data) # max y-value of data
-        self.__x_data_min = min(self.__x_data)  # min x-value of data
-        self.__y_data_min = min(self.__y_data)  # min y-value of data
+        self.__x_data_max = self.__x_data.max() # max x-value of data
+        self.__y_data_max = self.__y_data.max() # max y-value of data
+        self.__x_data_min = self.__x_data.min()  # min x-value of data
+        self.__y_data_min = self.__y_data.min()  # min y-value of data
 
         # 2D histogram image and histogram
         self.__2d_hist_im = None # image of histogram
@@ -215,10 +214,10 @@ class MatplotlibHistogramWidget(MatplotlibWidget):
             self.__2d_hist_cy = self.compression_y
             self.__2d_hist_tr = self.transpose_axes
 
-            self.__x_data_max = max(x_data)  # max x-value of data
-            self.__y_data_max = max(y_data)  # max y-value of data
-            self.__x_data_min = min(x_data)  # min x-value of data
-            self.__y_data_min = min(y_data)  # min y-value of data
+            self.__x_data_max = x_data.max()  # max x-value of data
+            self.__y_data_max = y_data.max()  # max y-value of data
+            self.__x_data_min = x_data.min()  # min x-value of data
+            self.__y_data_min = y_data.min()  # min y-value of data
             bin_counts, msg = mf.calculate_bin_counts([x_data, y_data], self.compression_x, self.compression_y,
                                                       max_count=MatplotlibHistogramWidget.MAX_BIN_COUNT)
             if msg is not None:
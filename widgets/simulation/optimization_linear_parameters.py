@@ -158,6 +158,7 @@ class LinearOptimizationRecoilParameterWidget(LinearOptimizationParameterWidget)
                         fset=sol_size_to_combobox)
     recoil_type = bnd.bind("recoilTypeComboBox", fget=recoil_from_combobox,
                            twoway=False)
+    start_count = bnd.bind("startCountSpinBox")
 
     @property
     def optimization_type(self) -> OptimizationType:
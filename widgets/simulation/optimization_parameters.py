@@ -80,6 +80,24 @@ def sol_size_to_combobox(instance, combobox, value):
         pass
 
 
+def tolerance_from_spinbox(instance, spinbox):
+    """Returns the convergence tolerance shown in the spinbox or None if early
+    stopping is not enabled.
+    """
+    if not instance.earlyStoppingCheckBox.isChecked():
+        return None
+    return getattr(instance, spinbox).value()
+
+
+def tolerance_to_spinbox(instance, spinbox, value):
+    """Shows the convergence tolerance in the spinbox. Early stopping is
+    disabled if the value is None.
+    """
+    instance.earlyStoppingCheckBox.setChecked(value is not None)
+    if value is not None:
+        getattr(instance, spinbox).setValue(value)
+
+
 class OptimizationParameterWidget(QtWidgets.QWidget,
                                   PropertyBindingWidget,
                                   abc.ABC,
@@ -98,6 +116,10 @@ class OptimizationParameterWidget(QtWidgets.QWidget,
     check_max = bnd.bind("maxTimeEdit")
     check_min = bnd.bind("minTimeEdit")
     skip_simulation = bnd.bind("skip_sim_chk_box")
+    convergence_tolerance = bnd.bind(
+        "convergenceToleranceDoubleSpinBox", fget=tolerance_from_spinbox,
+        fset=tolerance_to_spinbox)
+    convergence_generations = bnd.bind("convergenceGenerationsSpinBox")
 
     @abc.abstractmethod
     def optimization_type(self) -> OptimizationType:
@@ -119,10 +141,14 @@ class OptimizationParameterWidget(QtWidgets.QWidget,
         self.crossoverProbDoubleSpinBox.setLocale(locale)
         self.mutationProbDoubleSpinBox.setLocale(locale)
         self.percentDoubleSpinBox.setLocale(locale)
+        self.convergenceToleranceDoubleSpinBox.setLocale(locale)
 
         self.skip_sim_chk_box.stateChanged.connect(self.enable_sim_params)
+        self.earlyStoppingCheckBox.stateChanged.connect(
+            self.enable_convergence_params)
         self.set_properties(**kwargs)
         self.enable_sim_params()
+        self.enable_convergence_params()
 
     def enable_sim_params(self, *_):
         """Either enables or disables simulation parameters depending on the
@@ -139,6 +165,18 @@ class OptimizationParameterWidget(QtWidgets.QWidget,
         self.minTimeEdit.setEnabled(enable)
         self.maxTimeEdit.setEnabled(enable)
 
+    def enable_convergence_params(self, *_):
+        """Either enables or disables convergence parameters depending on
+        whether early stopping is enabled.
+
+        Args:
+            *_: not used
+        """
+        enable = self.earlyStoppingCheckBox.isChecked()
+
+        self.convergenceToleranceDoubleSpinBox.setEnabled(enable)
+        self.convergenceGenerationsSpinBox.setEnabled(enable)
+
     # TODO: Make this work the same way as the rest of the radio buttons
     #  in Potku
     def radio_buttons(self):
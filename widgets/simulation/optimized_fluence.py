@@ -71,7 +71,8 @@ class OptimizedFluenceWidget(QtWidgets.QWidget, GUIObserver):
 
         super().closeEvent(evnt)
 
-    def update_progress(self, state, evaluations=None):
+    def update_progress(self, state, evaluations=None, cache_hits=None,
+                        cache_misses=None):
         """Show calculated solutions in the widget.
         """
         if evaluations is not None:
@@ -79,6 +80,10 @@ class OptimizedFluenceWidget(QtWidgets.QWidget, GUIObserver):
         else:
             text = f"{state}."
 
+        if cache_hits is not None and cache_misses is not None:
+            text += f" {cache_hits}/{cache_hits + cache_misses} evaluations " \
+                    f"from cache."
+
         if self.element_simulation.is_optimization_running():
             text += " Simulating."
         self.progressLabel.setText(text)
@@ -109,11 +114,10 @@ class OptimizedFluenceWidget(QtWidgets.QWidget, GUIObserver):
         self.show_fluence()
 
     def on_next_handler(self, msg):
-        if "evaluations_left" in msg:
-            self.update_progress(
-                msg["state"], evaluations=msg["evaluations_left"])
-        else:
-            self.update_progress(msg["state"])
+        self.update_progress(
+            msg["state"], evaluations=msg.get("evaluations_left"),
+            cache_hits=msg.get("cache_hits"),
+            cache_misses=msg.get("cache_misses"))
 
     def on_error_handler(self, err):
         # TODO fix the layout of the dialog show that this is shown properly.
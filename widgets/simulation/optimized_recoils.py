@@ -25,6 +25,8 @@ along with this program (file named 'LICENCE').
 __author__ = "Heta Rekilä \n Juhani Sundell"
 __version__ = "2.0"
 
+import math
+
 import widgets.gui_utils as gutils
 
 from typing import Optional
@@ -112,7 +114,8 @@ class OptimizedRecoilsWidget(QtWidgets.QWidget, GUIObserver):
             pass
         super().closeEvent(evnt)
 
-    def update_progress(self, state, evaluations=None):
+    def update_progress(self, state, evaluations=None, cache_hits=None,
+                        cache_misses=None):
         """
         Show calculated solutions in the widget.
         """
@@ -120,18 +123,31 @@ class OptimizedRecoilsWidget(QtWidgets.QWidget, GUIObserver):
             text = f"{evaluations} evaluations left. {state}."
         else:
             text = f"{state}."
+        if cache_hits is not None and cache_misses is not None:
+            text += f" {cache_hits}/{cache_hits + cache_misses} evaluations " \
+                    f"from cache."
         self.progressLabel.setText(text)
 
-    def show_results(self, evaluations=None, errors=None):
+    def show_results(self, evaluations=None, errors=None,
+                     start_objective_values=None):
         """
-        Show optimized recoils. Optionally show finished amount of evaluations
-        and/or errors.
+        Show optimized recoils. Optionally show finished amount of evaluations,
+        objective values of fitted starting solutions and/or errors.
         """
         if evaluations is not None:
             progress_text = f"{evaluations} evaluations done. Finished."
         else:
             progress_text = "Finished."
 
+        if start_objective_values:
+            fitted = [value for value in start_objective_values
+                      if math.isfinite(value)]
+            progress_text += f" {len(fitted)}/{len(start_objective_values)} " \
+                             f"starts fitted."
+            if fitted:
+                progress_text += f" Differences from measurement: best " \
+                                 f"{min(fitted):.4g}, worst {max(fitted):.4g}."
+
         if errors is not None:
             progress_text += str(errors)
 
@@ -139,11 +155,10 @@ class OptimizedRecoilsWidget(QtWidgets.QWidget, GUIObserver):
         self.recoil_atoms.show_recoils()
 
     def on_next_handler(self, msg):
-        if "evaluations_left" in msg:
-            self.update_progress(
-                msg["state"], evaluations=msg["evaluations_left"])
-        else:
-            self.update_progress(msg["state"])
+        self.update_progress(
+            msg["state"], evaluations=msg.get("evaluations_left"),
+            cache_hits=msg.get("cache_hits"),
+            cache_misses=msg.get("cache_misses"))
         if "pareto_front" in msg:
             self.pareto_front.update_pareto_front(msg["pareto_front"])
 
@@ -161,4 +176,6 @@ class OptimizedRecoilsWidget(QtWidgets.QWidget, GUIObserver):
         if msg is not None:
             evaluations_done = msg.get("evaluations_done")
             error = msg.get("error")
-            self.show_results(evaluations_done, errors=error)
+            self.show_results(
+                evaluations_done, errors=error,
+                start_objective_values=msg.get("start_objective_values"))